@@ -0,0 +1,253 @@
+import asyncio
+import contextvars
+import heapq
+import itertools
+import json
+import time
+from contextlib import asynccontextmanager
+
+from fastapi import HTTPException
+from jose import JWTError, jwt
+
+from app.auth_utils import ALGORITHM, SECRET_KEY
+from app.config import (
+    ADMISSION_BULK_CONCURRENCY,
+    ADMISSION_BULK_QUEUE,
+    ADMISSION_ENABLED,
+    ADMISSION_INTERACTIVE_CONCURRENCY,
+    ADMISSION_INTERACTIVE_QUEUE,
+    ADMISSION_QUEUE_TIMEOUT,
+    ADMISSION_REPORTING_CONCURRENCY,
+    ADMISSION_REPORTING_QUEUE,
+    ADMISSION_RETRY_AFTER,
+    ADMISSION_TRANSFER_CONCURRENCY,
+    ADMISSION_TRANSFER_QUEUE,
+)
+from app.metrics import (
+    ADMISSION_ACTIVE,
+    ADMISSION_LIMIT,
+    ADMISSION_QUEUED,
+    ADMISSION_REJECTED,
+    ADMISSION_WAIT,
+    current_endpoint,
+    current_route,
+)
+
+# Admission control. Every route belongs to a class with its own concurrency
+# limit and bounded wait queue, so a burst of reports or exports can only take
+# its share of the connection pool and cheap interactive calls keep flowing.
+# When a class is saturated, new requests wait in its queue for up to
+# ADMISSION_QUEUE_TIMEOUT; when the queue is full or the wait runs out, they
+# are shed at once with 503 + Retry-After instead of timing out on the pool.
+#
+# Attachment uploads and downloads hold their slot while the bytes stream,
+# which can take minutes on a slow client, but no connection (it is released
+# before streaming), so they get a class of their own instead of taking
+# interactive slots.
+#
+# Within a class, authenticated writes (e.g. moving a request on the Kanban)
+# are admitted before reads.
+#
+# @coalesced routes defer admission to the call that actually runs the query
+# (deferred_slot), so callers joining it never queue for a slot.
+
+INTERACTIVE, REPORTING, BULK, TRANSFER = "interactive", "reporting", "bulk", "transfer"
+
+# Route template, or (method, template), to class; unlisted routes are interactive
+ROUTE_CLASSES = {
+    "/dashboard/stats": REPORTING,
+    "/dashboard/reports": REPORTING,
+    "/dashboard/recent_requests": REPORTING,
+    "/dashboard/summary": REPORTING,
+    "/equipments/maintenance-counts": REPORTING,
+    "/admin/slow-queries": REPORTING,
+    "/admin/jobs": REPORTING,
+    "/schedule/conflicts": REPORTING,
+    "/sync/changes": BULK,
+    ("GET", "/requests/{request_id}/worksheet"): BULK,
+    "/jobs/{job_id}/output": BULK,
+    ("POST", "/requests/{request_id}/attachments"): TRANSFER,
+    "/attachments/{attachment_id}/content": TRANSFER,
+    "/attachments/{attachment_id}/thumbnail": TRANSFER,
+}
+# Probes, metrics and long-lived streams never hold a slot; neither does
+# /batch, whose calls are admitted one by one
+EXEMPT_ROUTES = {"/", "/health/live", "/health/ready", "/metrics", "/requests/stream", "/batch"}
+
+WRITE_METHODS = {"POST", "PUT", "PATCH", "DELETE"}
+WRITE_PRIORITY, READ_PRIORITY = 0, 1
+
+_deferred = contextvars.ContextVar("admission_deferred", default=None)
+
+
+class Rejected(Exception):
+    def __init__(self, reason: str):
+        super().__init__(reason)
+        self.reason = reason
+
+
+class Limiter:
+    def __init__(self, name: str, concurrency: int, queue_size: int, timeout: float = ADMISSION_QUEUE_TIMEOUT):
+        self.name = name
+        self.concurrency = concurrency
+        self.queue_size = queue_size
+        self.timeout = timeout
+        self.active = 0
+        self.queued = 0
+        # (priority, arrival, future); cancelled entries are skipped on release
+        self._waiters = []
+        self._arrivals = itertools.count()
+        ADMISSION_LIMIT.labels(name).set(concurrency)
+
+    async def acquire(self, priority: int = READ_PRIORITY):
+        if self.active < self.concurrency and not self.queued:
+            self._set_active(self.active + 1)
+            return
+        if self.queued >= self.queue_size:
+            ADMISSION_REJECTED.labels(self.name, "queue_full").inc()
+            raise Rejected("queue_full")
+
+        future = asyncio.get_running_loop().create_future()
+        heapq.heappush(self._waiters, (priority, next(self._arrivals), future))
+        self._set_queued(self.queued + 1)
+        start = time.perf_counter()
+        try:
+            await asyncio.wait_for(future, self.timeout)
+        except asyncio.TimeoutError:
+            ADMISSION_REJECTED.labels(self.name, "timeout").inc()
+            raise Rejected("timeout")
+        except asyncio.CancelledError:
+            # Granted just as the client went away: pass the slot on
+            if future.done() and not future.cancelled():
+                self.release()
+            raise
+        finally:
+            if not future.done() or future.cancelled():
+                self._set_queued(self.queued - 1)
+            ADMISSION_WAIT.labels(self.name).observe(time.perf_counter() - start)
+
+    def release(self):
+        # Hand the slot straight to the most urgent waiter, if any
+        while self._waiters:
+            _, _, future = heapq.heappop(self._waiters)
+            if not future.done():
+                self._set_queued(self.queued - 1)
+                future.set_result(None)
+                return
+        self._set_active(self.active - 1)
+
+    @asynccontextmanager
+    async def slot(self, priority: int = READ_PRIORITY):
+        await self.acquire(priority)
+        try:
+            yield
+        finally:
+            self.release()
+
+    def _set_active(self, value: int):
+        self.active = value
+        ADMISSION_ACTIVE.labels(self.name).set(value)
+
+    def _set_queued(self, value: int):
+        self.queued = value
+        ADMISSION_QUEUED.labels(self.name).set(value)
+
+
+limiters = {
+    INTERACTIVE: Limiter(INTERACTIVE, ADMISSION_INTERACTIVE_CONCURRENCY, ADMISSION_INTERACTIVE_QUEUE),
+    REPORTING: Limiter(REPORTING, ADMISSION_REPORTING_CONCURRENCY, ADMISSION_REPORTING_QUEUE),
+    BULK: Limiter(BULK, ADMISSION_BULK_CONCURRENCY, ADMISSION_BULK_QUEUE),
+    TRANSFER: Limiter(TRANSFER, ADMISSION_TRANSFER_CONCURRENCY, ADMISSION_TRANSFER_QUEUE),
+}
+
+
+def route_class(method: str, route: str):
+    if route in EXEMPT_ROUTES:
+        return None
+    return ROUTE_CLASSES.get((method, route)) or ROUTE_CLASSES.get(route, INTERACTIVE)
+
+
+def _priority(scope) -> int:
+    if scope["method"] not in WRITE_METHODS:
+        return READ_PRIORITY
+    for name, value in scope["headers"]:
+        if name == b"authorization":
+            scheme, _, token = value.decode().partition(" ")
+            if scheme.lower() != "bearer":
+                break
+            try:
+                jwt.decode(token, SECRET_KEY, algorithms=[ALGORITHM])
+            except JWTError:
+                break
+            return WRITE_PRIORITY
+    return READ_PRIORITY
+
+
+def _retry_after() -> str:
+    return str(max(1, round(ADMISSION_RETRY_AFTER)))
+
+
+@asynccontextmanager
+async def deferred_slot():
+    # Used by @coalesced: only the call that runs the endpoint takes a slot
+    pending = _deferred.get()
+    if pending is None:
+        yield
+        return
+    limiter, priority = pending
+    try:
+        await limiter.acquire(priority)
+    except Rejected:
+        raise HTTPException(status_code=503, detail="Server busy, retry later",
+                            headers={"Retry-After": _retry_after()})
+    try:
+        yield
+    finally:
+        limiter.release()
+
+
+class AdmissionMiddleware:
+    # Runs inside MetricsMiddleware (it needs the matched route) and outside
+    # everything that touches the database
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http" or not ADMISSION_ENABLED:
+            await self.app(scope, receive, send)
+            return
+        cls = route_class(scope["method"], current_route())
+        if cls is None:
+            await self.app(scope, receive, send)
+            return
+        limiter = limiters[cls]
+        priority = _priority(scope)
+
+        if getattr(current_endpoint(), "admission_deferred", False):
+            token = _deferred.set((limiter, priority))
+            try:
+                await self.app(scope, receive, send)
+            finally:
+                _deferred.reset(token)
+            return
+
+        try:
+            await limiter.acquire(priority)
+        except Rejected:
+            body = json.dumps({"detail": "Server busy, retry later"}).encode()
+            await send({
+                "type": "http.response.start",
+                "status": 503,
+                "headers": [
+                    (b"content-type", b"application/json"),
+                    (b"content-length", str(len(body)).encode()),
+                    (b"retry-after", _retry_after().encode()),
+                ],
+            })
+            await send({"type": "http.response.body", "body": body})
+            return
+        try:
+            await self.app(scope, receive, send)
+        finally:
+            limiter.release()
@@ -1,25 +1,87 @@
+import asyncio
 from contextlib import asynccontextmanager
 from fastapi import FastAPI
 from fastapi.middleware.cors import CORSMiddleware
 
-from app.database import engine, Base
-from app.routers import settings, equipment, requests, dashboard, workcenters, auth, teams
+from app.admission import AdmissionMiddleware
+from app.attachments import shutdown_thumbnail_pool
+from app.archive import run_archiver
+from app.companies import upgrade_schema
+from app.config import PROFILING_ENABLED, CREATE_TABLES_ON_STARTUP, ARCHIVE_ENABLED, JOBS_ENABLED
+from app.database import engine, Base, new_session, asyncpg_dsn, connect_args
+from app.equipment_index import equipment_index
+from app.events import request_events
+from app.health import health
+from app.history import history_writer
+from app.idempotency import IdempotencyMiddleware, run_purger as run_idempotency_purger
+from app.jobs import JobWorker
+from app.slow_queries import slow_query_log
+from app.storage import storage
+from app.tenancy import TenantMiddleware
+from app.metrics import MetricsMiddleware, metrics_response, monitor_event_loop_lag
+from app.routers import settings, equipment, requests, attachments, schedule, batch, dashboard, workcenters, auth, teams, sync, admin, jobs, health as health_router
+from app.warmup import warm_up
 
 @asynccontextmanager
 async def lifespan(app: FastAPI):
     # Establish DB connection and create tables
-    async with engine.begin() as conn:
-        await conn.run_sync(Base.metadata.create_all)
+    if CREATE_TABLES_ON_STARTUP:
+        async with engine.begin() as conn:
+            await conn.run_sync(Base.metadata.create_all)
+            await conn.run_sync(upgrade_schema)
+    # Warm the equipment typeahead index; follow the other workers' changes
+    # to it from before the load, so none falls in between
+    await equipment_index.start(asyncpg_dsn(), **connect_args)
+    async with new_session() as db:
+        await equipment_index.load(db)
+    # LISTEN for request changes made by other workers (in-process only without Postgres)
+    await request_events.start(asyncpg_dsn(), **connect_args)
+    loop_lag_monitor = asyncio.create_task(monitor_event_loop_lag())
+    await slow_query_log.start()
+    # Batched writes of request history rows
+    await history_writer.start()
+    # Move closed requests past the retention window to the cold partition
+    archiver = asyncio.create_task(run_archiver()) if ARCHIVE_ENABLED else None
+    idempotency_purger = asyncio.create_task(run_idempotency_purger())
+    # Background jobs; off when they run in their own process (python -m app.jobs)
+    job_worker = JobWorker() if JOBS_ENABLED else None
+    job_runner = asyncio.create_task(job_worker.run()) if job_worker else None
+    await warm_up(app, engine)
+    health.ready = True
     yield
+    health.ready = False
+    if job_worker is not None:
+        await job_worker.stop()
+        await job_runner
+    shutdown_thumbnail_pool()
+    await storage.close()
+    idempotency_purger.cancel()
+    await history_writer.stop()
+    if archiver is not None:
+        archiver.cancel()
+    await slow_query_log.stop()
+    loop_lag_monitor.cancel()
+    await request_events.stop()
+    await equipment_index.stop()
 
 app = FastAPI(lifespan=lifespan)
 
+if PROFILING_ENABLED:
+    from app.profiling import ProfilingMiddleware, instrument_engine as instrument_engine_for_profiles
+
+    app.add_middleware(ProfilingMiddleware)
+    instrument_engine_for_profiles(engine)
+app.add_middleware(IdempotencyMiddleware)
+app.add_middleware(TenantMiddleware)
+app.add_middleware(AdmissionMiddleware)
+app.add_middleware(MetricsMiddleware)
 app.add_middleware(
     CORSMiddleware,
     allow_origins=["*"],
     allow_credentials=True,
     allow_methods=["*"],
     allow_headers=["*"],
+    expose_headers=["X-Schedule-Conflicts"],
 )
 
 app.include_router(auth.router)
@@ -27,9 +89,20 @@ app.include_router(settings.router, tags=["Settings"])
 app.include_router(workcenters.router, tags=["Work Centers"])
 app.include_router(equipment.router, tags=["Equipment"])
 app.include_router(requests.router, tags=["Maintenance Requests"])
+app.include_router(attachments.router, tags=["Attachments"])
+app.include_router(schedule.router, tags=["Schedule"])
+app.include_router(batch.router, tags=["Batch"])
 app.include_router(teams.router, tags=["Teams"])
 app.include_router(dashboard.router, tags=["Dashboard"])
+app.include_router(sync.router, tags=["Sync"])
+app.include_router(admin.router, tags=["Admin"])
+app.include_router(jobs.router, tags=["Jobs"])
+app.include_router(health_router.router, tags=["Health"])
 
 @app.get("/")
 async def root():
     return {"message": "GearGuard API is running"}
+
+@app.get("/metrics", include_in_schema=False)
+async def metrics():
+    return metrics_response()
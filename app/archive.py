@@ -0,0 +1,82 @@
+import asyncio
+import logging
+from datetime import datetime, timedelta, timezone
+from typing import Optional
+
+from sqlalchemy import false, true, update
+from sqlalchemy.future import select
+
+from app.config import ARCHIVE_AFTER_DAYS, ARCHIVE_BATCH_SIZE, ARCHIVE_INTERVAL_SECONDS
+from app.database import new_session
+from app.models import MaintenanceRequest, RequestStage
+
+# Hot/cold storage for maintenance requests. Requests closed (Repaired, Scrap)
+# more than ARCHIVE_AFTER_DAYS ago get archived = true, which on Postgres
+# moves them from the maintenance_requests_hot partition to _cold. The clock
+# starts at closed_at, set by track_closing when a request enters a closed
+# stage, not at request_date: a request opened long ago and closed today
+# stays hot for the full retention period.
+#
+# Routing: open-work queries (Kanban, dashboard counters, recent activity) add
+# HOT_REQUESTS so the planner prunes the cold partition. History and analytics
+# (single-request lookup, reports, equipment counts, sync) leave it out and
+# read both partitions through the parent table.
+
+logger = logging.getLogger(__name__)
+
+# A literal "archived = false" lets the planner prune at plan time
+HOT_REQUESTS = MaintenanceRequest.archived == false()
+
+CLOSED_STAGES = [RequestStage.REPAIRED, RequestStage.SCRAP]
+
+
+def track_closing(request, stage_before: Optional[RequestStage]):
+    # After a stage change: stamp the first closed stage, clear on reopening
+    if request.stage not in CLOSED_STAGES:
+        request.closed_at = None
+    elif stage_before not in CLOSED_STAGES:
+        request.closed_at = datetime.now(timezone.utc)
+
+
+async def archive_batch(db, cutoff: datetime, batch_size: int = ARCHIVE_BATCH_SIZE) -> int:
+    # SKIP LOCKED: rows being edited right now wait for the next run, and
+    # archivers in several workers never block each other
+    candidates = (
+        select(MaintenanceRequest.id)
+        .filter(HOT_REQUESTS, MaintenanceRequest.stage.in_(CLOSED_STAGES), MaintenanceRequest.closed_at < cutoff)
+        .order_by(MaintenanceRequest.id)
+        .limit(batch_size)
+        .with_for_update(skip_locked=True)
+    )
+    result = await db.execute(
+        update(MaintenanceRequest)
+        .where(HOT_REQUESTS, MaintenanceRequest.id.in_(candidates.scalar_subquery()))
+        .values(archived=true())
+        .execution_options(synchronize_session=False)
+    )
+    await db.commit()
+    return result.rowcount
+
+
+async def archive_closed_requests(retention_days: int = ARCHIVE_AFTER_DAYS, batch_size: int = ARCHIVE_BATCH_SIZE) -> int:
+    # One short transaction per batch keeps locks and WAL bursts small
+    cutoff = datetime.now(timezone.utc) - timedelta(days=retention_days)
+    total = 0
+    while True:
+        async with new_session() as db:
+            moved = await archive_batch(db, cutoff, batch_size)
+        total += moved
+        if moved < batch_size:
+            return total
+        await asyncio.sleep(0)
+
+
+async def run_archiver(interval: float = ARCHIVE_INTERVAL_SECONDS):
+    while True:
+        try:
+            moved = await archive_closed_requests()
+            if moved:
+                logger.info("archived %d closed maintenance requests", moved)
+        except Exception:
+            logger.exception("request archival failed")
+        await asyncio.sleep(interval)
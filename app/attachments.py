@@ -0,0 +1,187 @@
+import asyncio
+import hashlib
+import importlib.util
+import multiprocessing
+import re
+import uuid
+from concurrent.futures import ProcessPoolExecutor
+from typing import AsyncIterator, Optional, Tuple
+from urllib.parse import quote
+
+from sqlalchemy import update
+
+from app.config import (
+    ATTACHMENT_CHUNK_SIZE,
+    ATTACHMENT_MAX_BYTES,
+    THUMBNAIL_MAX_SOURCE_BYTES,
+    THUMBNAIL_SIZE,
+    THUMBNAIL_WORKERS,
+)
+from app.database import new_session
+from app.jobs import PermanentJobError, job_handler
+from app.models import AttachmentBlob
+from app.storage import storage
+from app.thumbnails import make_thumbnail
+
+# Photos and logs attached to maintenance requests.
+#
+# Uploads are streamed from the request body to storage in fixed-size chunks
+# while being hashed, so a multi-hundred-MB file never sits in worker memory.
+# Content is stored once per SHA-256 under blobs/: a file that is already
+# stored (the same photo attached to several requests) only gets a new
+# attachments row. Downloads stream back the requested byte range.
+#
+# Image thumbnails are made by the "attachment_thumbnail" job in a process
+# pool, so decoding large photos never blocks the event loop or holds the GIL
+# of the serving process. They need Pillow; without it there are none.
+
+THUMBNAIL_TYPES = {"image/jpeg", "image/png", "image/gif", "image/webp", "image/bmp", "image/tiff"}
+THUMBNAIL_MEDIA_TYPE = "image/jpeg"
+
+# The stored Content-Type is whatever the uploader sent. Only raster images
+# are shown inline; anything else (HTML, SVG, ...) is served as a download,
+# so it never runs as a page of the API's origin. Every download also gets
+# DOWNLOAD_HEADERS, so browsers neither sniff nor execute it.
+INLINE_TYPES = {"image/jpeg", "image/png", "image/gif", "image/webp", "image/bmp"}
+DOWNLOAD_HEADERS = {
+    "X-Content-Type-Options": "nosniff",
+    "Content-Security-Policy": "default-src 'none'; sandbox",
+}
+
+RANGE = re.compile(r"bytes=(\d*)-(\d*)$")
+
+_thumbnail_pool: Optional[ProcessPoolExecutor] = None
+
+
+class TooLarge(Exception):
+    pass
+
+
+class RangeNotSatisfiable(Exception):
+    pass
+
+
+def blob_key(sha256: str) -> str:
+    return f"blobs/{sha256[:2]}/{sha256}"
+
+
+def thumbnail_key(sha256: str) -> str:
+    return f"thumbnails/{sha256[:2]}/{sha256}.jpg"
+
+
+async def _chunked(stream: AsyncIterator[bytes], digest, max_bytes: int) -> AsyncIterator[bytes]:
+    # Re-cuts the body into ATTACHMENT_CHUNK_SIZE pieces, hashing as it goes
+    buffer = bytearray()
+    total = 0
+    async for data in stream:
+        total += len(data)
+        if total > max_bytes:
+            raise TooLarge()
+        digest.update(data)
+        buffer += data
+        while len(buffer) >= ATTACHMENT_CHUNK_SIZE:
+            yield bytes(buffer[:ATTACHMENT_CHUNK_SIZE])
+            del buffer[:ATTACHMENT_CHUNK_SIZE]
+    if buffer:
+        yield bytes(buffer)
+
+
+async def store_upload(stream: AsyncIterator[bytes], max_bytes: int = ATTACHMENT_MAX_BYTES) -> Tuple[str, int]:
+    # Returns (sha256, size); the content is at blob_key(sha256) afterwards
+    digest = hashlib.sha256()
+    temp = f"tmp/{uuid.uuid4().hex}"
+    size = await storage.write(temp, _chunked(stream, digest, max_bytes))
+    sha256 = digest.hexdigest()
+    try:
+        if not await storage.exists(blob_key(sha256)):
+            # Same content, same key: concurrent identical uploads are harmless
+            await storage.move(temp, blob_key(sha256))
+    finally:
+        await storage.delete(temp)
+    return sha256, size
+
+
+def byte_range(header: Optional[str], size: int) -> Optional[Tuple[int, int]]:
+    # (start, end) inclusive for a single "Range: bytes=..." header; None means
+    # the whole object (no header, or one we don't serve, e.g. multiple ranges)
+    match = RANGE.match(header.strip()) if header else None
+    if match is None or match.group(1) == match.group(2) == "":
+        return None
+    first, last = match.groups()
+    if first == "":
+        # Suffix range: the last N bytes
+        if int(last) == 0:
+            raise RangeNotSatisfiable()
+        return max(0, size - int(last)), size - 1
+    start = int(first)
+    end = size - 1 if last == "" else min(int(last), size - 1)
+    if start >= size or end < start:
+        raise RangeNotSatisfiable()
+    return start, end
+
+
+def download_disposition(filename: str, content_type: str) -> str:
+    return content_disposition(filename, "inline" if content_type in INLINE_TYPES else "attachment")
+
+
+def content_disposition(filename: str, disposition: str = "inline") -> str:
+    ascii_name = filename.encode("ascii", "ignore").decode().replace('"', "").replace("\\", "")
+    return f"{disposition}; filename=\"{ascii_name}\"; filename*=UTF-8''{quote(filename)}"
+
+
+def thumbnails_enabled() -> bool:
+    return THUMBNAIL_WORKERS > 0 and importlib.util.find_spec("PIL") is not None
+
+
+def wants_thumbnail(content_type: str, size: int) -> bool:
+    return content_type in THUMBNAIL_TYPES and size <= THUMBNAIL_MAX_SOURCE_BYTES and thumbnails_enabled()
+
+
+def thumbnail_pool() -> ProcessPoolExecutor:
+    global _thumbnail_pool
+    if _thumbnail_pool is None:
+        # Spawned, not forked: the serving process has threads and open sockets
+        _thumbnail_pool = ProcessPoolExecutor(max(1, THUMBNAIL_WORKERS), mp_context=multiprocessing.get_context("spawn"))
+    return _thumbnail_pool
+
+
+def shutdown_thumbnail_pool():
+    global _thumbnail_pool
+    if _thumbnail_pool is not None:
+        _thumbnail_pool.shutdown(cancel_futures=True)
+        _thumbnail_pool = None
+
+
+async def _single(data: bytes):
+    yield data
+
+
+@job_handler("attachment_thumbnail", concurrency=max(1, THUMBNAIL_WORKERS), max_attempts=3, lane="low")
+async def make_thumbnail_job(payload: dict):
+    sha256 = payload["sha256"]
+    async with new_session() as db:
+        blob = await db.get(AttachmentBlob, sha256)
+    if blob is None:
+        raise PermanentJobError("Blob not found")
+    if blob.thumbnail_key is not None:
+        return {"thumbnail_key": blob.thumbnail_key}
+    if blob.size > THUMBNAIL_MAX_SOURCE_BYTES:
+        raise PermanentJobError("Image too large for a thumbnail")
+
+    # Workers read local files themselves; otherwise the image is fetched here
+    source = storage.local_path(blob_key(sha256))
+    if source is None:
+        source = b"".join([chunk async for chunk in storage.read(blob_key(sha256))])
+    try:
+        data = await asyncio.get_running_loop().run_in_executor(
+            thumbnail_pool(), make_thumbnail, source, THUMBNAIL_SIZE
+        )
+    except (ValueError, ImportError) as e:
+        raise PermanentJobError(str(e))
+
+    key = thumbnail_key(sha256)
+    await storage.write(key, _single(data))
+    async with new_session() as db:
+        await db.execute(update(AttachmentBlob).where(AttachmentBlob.sha256 == sha256).values(thumbnail_key=key))
+        await db.commit()
+    return {"thumbnail_key": key}
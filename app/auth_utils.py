@@ -30,15 +30,19 @@ def create_access_token(data: dict, expires_delta: Optional[timedelta] = None):
     return encoded_jwt
 
 from fastapi.security import OAuth2PasswordBearer
-from fastapi import Depends, HTTPException, status
+from fastapi import Depends, HTTPException, Request, status
 from sqlalchemy.ext.asyncio import AsyncSession
-from sqlalchemy.future import select
 from app.database import get_db
-from app.models import User
+from app.models import User, UserRole
+from app import queries
 
 oauth2_scheme = OAuth2PasswordBearer(tokenUrl="/auth/login")
 
-async def get_current_user(token: str = Depends(oauth2_scheme), db: AsyncSession = Depends(get_db)):
+async def get_current_user(request: Request, token: str = Depends(oauth2_scheme), db: AsyncSession = Depends(get_db)):
+    # Calls inside POST /batch reuse the user the batch authenticated
+    batch_user = request.scope.get("batch_user")
+    if batch_user is not None:
+        return batch_user
     credentials_exception = HTTPException(
         status_code=status.HTTP_401_UNAUTHORIZED,
         detail="Could not validate credentials",
@@ -52,8 +56,31 @@ async def get_current_user(token: str = Depends(oauth2_scheme), db: AsyncSession
     except JWTError:
         raise credentials_exception
     
-    result = await db.execute(select(User).where(User.email == email))
+    result = await db.execute(queries.USER_BY_EMAIL, {"email": email}, execution_options=queries.PREBUILT)
     user = result.scalars().first()
     if user is None:
         raise credentials_exception
     return user
+
+optional_oauth2_scheme = OAuth2PasswordBearer(tokenUrl="/auth/login", auto_error=False)
+
+async def get_optional_user(request: Request, token: Optional[str] = Depends(optional_oauth2_scheme), db: AsyncSession = Depends(get_db)) -> Optional[User]:
+    # The caller if a token was sent (and valid), None for anonymous calls
+    if token is None and request.scope.get("batch_user") is None:
+        return None
+    return await get_current_user(request, token, db)
+
+async def get_actor_id(token: Optional[str] = Depends(optional_oauth2_scheme)) -> Optional[int]:
+    # Caller's user id from the token alone (no lookup), for audit records;
+    # None for anonymous or invalid tokens
+    if token is None:
+        return None
+    try:
+        return jwt.decode(token, SECRET_KEY, algorithms=[ALGORITHM]).get("id")
+    except JWTError:
+        return None
+
+async def require_admin(user: User = Depends(get_current_user)):
+    if user.role != UserRole.ADMIN:
+        raise HTTPException(status_code=status.HTTP_403_FORBIDDEN, detail="Admin access required")
+    return user
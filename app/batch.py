@@ -0,0 +1,134 @@
+import asyncio
+import json
+import logging
+from typing import List, Optional, Tuple
+from urllib.parse import unquote, urlsplit
+
+from starlette.routing import Match
+
+from app.config import BATCH_CONCURRENCY
+from app.metrics import flatten_routes
+
+logger = logging.getLogger(__name__)
+
+# POST /batch: a page's independent GETs in one round trip. Each call goes
+# through the whole ASGI app in-process, so routing, tenancy, admission and
+# metrics work as if it had been sent on its own, minus the network hop and
+# TLS. The batch's user is looked up once and handed to every call in the
+# scope (get_current_user picks it up from there). At most BATCH_CONCURRENCY
+# calls of a batch run at once.
+#
+# Bodies are spliced into the combined response as-is, not parsed again.
+# Only JSON endpoints can be batched: calls answering with anything else (a
+# PDF, a download) are cut off and reported as 406. Long-lived streams are
+# refused before they start, so they never subscribe to anything.
+
+USER_SCOPE_KEY = "batch_user"
+# Not forwarded to the calls: they have no body, and replays are per request
+DROPPED_HEADERS = {b"content-length", b"content-type", b"transfer-encoding", b"idempotency-key"}
+STREAM_ROUTES = {"/requests/stream"}
+NOT_JSON = b'{"detail":"Only JSON endpoints can be batched"}'
+
+
+class NotJSON(Exception):
+    pass
+
+
+def _is_json(content_type: str) -> bool:
+    media_type = content_type.split(";")[0].strip().lower()
+    return media_type == "application/json" or media_type.endswith("+json")
+
+
+def route_path(app, scope: dict) -> Optional[str]:
+    for route in flatten_routes(app.routes):
+        match, _ = route.matches(scope)
+        if match == Match.FULL:
+            return route.path
+    return None
+
+
+def call_scope(parent: dict, path: str, user) -> dict:
+    url = urlsplit(path)
+    return {
+        "type": "http",
+        "asgi": parent.get("asgi", {"version": "3.0"}),
+        "http_version": parent.get("http_version", "1.1"),
+        "method": "GET",
+        "scheme": parent.get("scheme", "http"),
+        "server": parent.get("server"),
+        "client": parent.get("client"),
+        "root_path": parent.get("root_path", ""),
+        "path": unquote(url.path),
+        "raw_path": url.path.encode(),
+        "query_string": url.query.encode(),
+        "headers": [(name, value) for name, value in parent["headers"] if name not in DROPPED_HEADERS],
+        USER_SCOPE_KEY: user,
+    }
+
+
+async def dispatch(app, scope: dict) -> Tuple[int, bytes]:
+    # (status, JSON body) of one GET run against the app
+    status = None
+    json_body = True
+    chunks = []
+    finished = asyncio.Event()
+    request_sent = False
+
+    async def receive():
+        nonlocal request_sent
+        if not request_sent:
+            request_sent = True
+            return {"type": "http.request", "body": b"", "more_body": False}
+        # Streaming responses listen for the client going away
+        await finished.wait()
+        return {"type": "http.disconnect"}
+
+    async def send(message):
+        nonlocal status, json_body
+        if message["type"] == "http.response.start":
+            status = message["status"]
+            headers = {name.lower(): value for name, value in message.get("headers", [])}
+            json_body = _is_json(headers.get(b"content-type", b"").decode("latin-1"))
+            if not json_body and status < 400:
+                raise NotJSON()
+        elif message["type"] == "http.response.body":
+            chunks.append(message.get("body", b""))
+
+    try:
+        await app(scope, receive, send)
+    except NotJSON:
+        return 406, NOT_JSON
+    except Exception:
+        # The server error middleware has usually sent its 500 already
+        logger.exception("Batched call to %s failed", scope["path"])
+        if status is None:
+            return 500, b'{"detail":"Internal Server Error"}'
+    finally:
+        finished.set()
+
+    body = b"".join(chunks)
+    if not body:
+        return status, b"null"
+    if not json_body:
+        # Plain-text errors, e.g. the server error middleware's
+        return status, json.dumps({"detail": body.decode("utf-8", "replace")}).encode()
+    return status, body
+
+
+async def run_batch(app, parent: dict, calls: List[Tuple[Optional[str], str]], user) -> bytes:
+    # The combined {"responses": [...]} document, in the order of `calls`
+    semaphore = asyncio.Semaphore(max(1, BATCH_CONCURRENCY))
+
+    async def run(path: str):
+        scope = call_scope(parent, path, user)
+        if route_path(app, scope) in STREAM_ROUTES:
+            return 406, NOT_JSON
+        async with semaphore:
+            return await dispatch(app, scope)
+
+    results = await asyncio.gather(*(run(path) for _, path in calls))
+    parts = [
+        b'{"id":%s,"status":%d,"body":%s}' % (json.dumps(call_id).encode(), status, body)
+        for (call_id, _), (status, body) in zip(calls, results)
+    ]
+    return b'{"responses":[' + b",".join(parts) + b"]}"
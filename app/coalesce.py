@@ -0,0 +1,130 @@
+import asyncio
+import enum
+import functools
+import time
+from collections import OrderedDict
+from datetime import date, datetime
+from typing import Any, Optional
+
+from fastapi import Response
+
+from app.admission import deferred_slot
+from app.config import COALESCE_TTL_SECONDS
+from app.metrics import COALESCED_CALLS, current_route
+from app.serialization import adapter_for
+from app.tenancy import cache_key
+
+# Single-flight for read routes. When identical calls overlap (dozens of wall
+# dashboards refreshing on the same tick), the first one runs the endpoint
+# and serializes the result once; the others wait for it and get the same
+# bytes. With a TTL, calls arriving shortly after are answered from that
+# result too.
+#
+# Calls are identical when they hit the same endpoint with the same simple
+# parameter values (path/query params) in the same company (cache_key). Only
+# use it on routes whose result depends on nothing else, e.g. not on the
+# current user.
+
+MAX_RECENT = 1024
+SIMPLE_TYPES = (str, int, float, bool, type(None), date, datetime, enum.Enum)
+
+
+class SingleFlight:
+    def __init__(self, max_recent: int = MAX_RECENT):
+        self.max_recent = max_recent
+        self._inflight = {}
+        self._recent = OrderedDict()
+
+    async def do(self, key: str, fn, ttl: float = 0.0):
+        # Returns (value, outcome); outcome is "executed", "joined" or "cached"
+        while True:
+            if ttl > 0:
+                hit = self._recent.get(key)
+                if hit is not None and hit[0] > time.monotonic():
+                    return hit[1], "cached"
+            future = self._inflight.get(key)
+            if future is None:
+                break
+            try:
+                return await asyncio.shield(future), "joined"
+            except asyncio.CancelledError:
+                if future.cancelled():
+                    # The caller that ran it went away; the next one in takes over
+                    continue
+                raise
+
+        future = self._inflight[key] = asyncio.get_running_loop().create_future()
+        try:
+            value = await fn()
+        except asyncio.CancelledError:
+            future.cancel()
+            raise
+        except BaseException as e:
+            future.set_exception(e)
+            # Waiters re-raise it; don't warn when there were none
+            future.exception()
+            raise
+        else:
+            future.set_result(value)
+            if ttl > 0:
+                self._remember(key, value, ttl)
+            return value, "executed"
+        finally:
+            del self._inflight[key]
+
+    def _remember(self, key: str, value, ttl: float):
+        self._recent[key] = (time.monotonic() + ttl, value)
+        self._recent.move_to_end(key)
+        while len(self._recent) > self.max_recent:
+            self._recent.popitem(last=False)
+
+    def clear(self):
+        self._recent.clear()
+
+
+single_flight = SingleFlight()
+
+
+def _key_parts(kwargs: dict) -> list:
+    parts = []
+    for name in sorted(kwargs):
+        value = kwargs[name]
+        if isinstance(value, (set, frozenset, list, tuple)) and all(isinstance(v, SIMPLE_TYPES) for v in value):
+            # Sets from e.g. ?expand= arrive in arbitrary order
+            value = sorted(map(str, value)) if isinstance(value, (set, frozenset)) else list(map(str, value))
+        elif not isinstance(value, SIMPLE_TYPES):
+            # Sessions, injected Response objects and the like
+            continue
+        parts.append(f"{name}={value}")
+    return parts
+
+
+def coalesced(tp: Any, ttl: Optional[float] = None):
+    # Decorator for a read route returning `tp` (its response_model)
+    def decorator(endpoint):
+        name = f"{endpoint.__module__}.{endpoint.__qualname__}"
+
+        @functools.wraps(endpoint)
+        async def wrapper(*args, **kwargs):
+            async def run():
+                async with deferred_slot():
+                    result = await endpoint(*args, **kwargs)
+                adapter = adapter_for(tp)
+                body = adapter.dump_json(adapter.validate_python(result, from_attributes=True))
+                # Headers the endpoint set on an injected Response (e.g. Server-Timing)
+                headers = {}
+                for value in kwargs.values():
+                    if isinstance(value, Response):
+                        headers.update((k, v) for k, v in value.headers.items() if k != "content-length")
+                return body, headers
+
+            key = cache_key("coalesce", name, *_key_parts(kwargs))
+            (body, headers), outcome = await single_flight.do(
+                key, run, COALESCE_TTL_SECONDS if ttl is None else ttl
+            )
+            COALESCED_CALLS.labels(current_route(), outcome).inc()
+            return Response(content=body, media_type="application/json", headers=headers)
+        # Callers that join a running call need no admission slot (app/admission.py)
+        wrapper.admission_deferred = True
+        return wrapper
+    return decorator
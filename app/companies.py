@@ -0,0 +1,106 @@
+import argparse
+import asyncio
+import sys
+
+from sqlalchemy import UniqueConstraint, inspect, or_, select, text, update
+from sqlalchemy.schema import AddConstraint, CreateIndex, DropIndex
+
+from app.database import engine, new_session
+from app.models import User, UserRole
+from app.tenancy import TENANT_MODELS
+
+# Company bootstrap: python -m app.companies --company "Acme Plant" --admin admin@acme.com
+#
+# Installs from before company scoping have no companies: every user and row
+# has a NULL company (or, for categories and equipment, the free-text company
+# name they were created with). Before turning TENANCY_ENABLED on, this puts
+# those rows into one company and makes a user its admin, who can then add
+# the rest of the users with POST /auth/register.
+#
+# Rows already in a company that has users are left alone, so it can be run
+# again for each new company; only rows of no (known) company are moved.
+#
+# Tables created before company scoping lack its columns and still have the
+# global unique indexes on names, serials and codes. create_all never alters
+# existing tables, so upgrade_schema adds them; the app runs it at startup
+# right after create_all, and so does this command.
+
+
+def _company_column(model):
+    return getattr(model, model.__mapper__.synonyms["tenant_key"].name)
+
+
+def upgrade_schema(conn):
+    # Sync connection (run_sync); a no-op on tables create_all just made
+    inspector = inspect(conn)
+    for model in TENANT_MODELS:
+        table = model.__table__
+        if not inspector.has_table(table.name):
+            continue
+        column = table.c[model.__mapper__.synonyms["tenant_key"].name]
+        if column.name not in {c["name"] for c in inspector.get_columns(table.name)}:
+            conn.execute(text(f"ALTER TABLE {table.name} ADD COLUMN {column.name} {column.type.compile(conn.dialect)}"))
+        unique_indexes = {i["name"] for i in inspector.get_indexes(table.name) if i["unique"]}
+        for index in table.indexes:
+            if index.name in unique_indexes and not index.unique:
+                # The old global unique index of the same name
+                conn.execute(DropIndex(index))
+            elif column.name not in {c.name for c in index.columns}:
+                continue
+            conn.execute(CreateIndex(index, if_not_exists=True))
+        existing = {c["name"] for c in inspector.get_unique_constraints(table.name)}
+        for constraint in table.constraints:
+            if isinstance(constraint, UniqueConstraint) and constraint.name not in existing:
+                conn.execute(AddConstraint(constraint))
+
+
+async def bootstrap_company(db, company: str, admin_email: str) -> dict:
+    # Rows moved per table; the caller commits
+    admin = (await db.execute(select(User).where(User.email == admin_email))).scalars().first()
+    if admin is None:
+        raise ValueError(f"No user with email {admin_email}")
+    if admin.company_id not in (None, company):
+        raise ValueError(f"{admin_email} already belongs to {admin.company_id}")
+
+    known = select(User.company_id).where(User.company_id.is_not(None)).distinct().scalar_subquery()
+    moved = {}
+    for model in TENANT_MODELS:
+        column = _company_column(model)
+        result = await db.execute(
+            update(model)
+            .where(or_(column.is_(None), column.not_in(known)))
+            .values({column: company})
+            .execution_options(synchronize_session=False)
+        )
+        moved[model.__tablename__] = result.rowcount
+    await db.execute(
+        update(User)
+        .where(User.id == admin.id)
+        .values(company_id=company, role=UserRole.ADMIN)
+        .execution_options(synchronize_session=False)
+    )
+    return moved
+
+
+async def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(prog="python -m app.companies", description="Create a company from rows of no company")
+    parser.add_argument("--company", required=True, help="Company id, issued as the JWT tenant claim")
+    parser.add_argument("--admin", required=True, metavar="EMAIL", help="Existing user who becomes the company's admin")
+    args = parser.parse_args(argv)
+
+    async with engine.begin() as conn:
+        await conn.run_sync(upgrade_schema)
+    async with new_session() as db:
+        try:
+            moved = await bootstrap_company(db, args.company, args.admin)
+        except ValueError as e:
+            parser.error(str(e))
+        await db.commit()
+    for table, count in moved.items():
+        print(f"{table}: {count} rows moved to {args.company}")
+    print(f"{args.admin} is the admin of {args.company}; restart the app with TENANCY_ENABLED=true")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(asyncio.run(main()))
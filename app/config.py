@@ -3,4 +3,144 @@ import os
 
 dotenv.load_dotenv()
 
-POSTGRES_URL = os.getenv("POSTGRES_URL")
\ No newline at end of file
+POSTGRES_URL = os.getenv("POSTGRES_URL")
+
+# Company scoping (app/tenancy.py). On: API calls without a company claim in
+# their token see no company's rows. Off (default): single-company deployments
+# and installs from before companies, nothing is scoped. Run python -m
+# app.companies to put existing rows into a company before turning it on.
+TENANCY_ENABLED = os.getenv("TENANCY_ENABLED", "false").lower() in ("1", "true", "yes")
+
+# Max number of dashboard sections queried at once by /dashboard/summary
+DASHBOARD_SUMMARY_CONCURRENCY = int(os.getenv("DASHBOARD_SUMMARY_CONCURRENCY", "4"))
+# Dashboard reads that overlap share one execution (app/coalesce.py); for this
+# many seconds after, identical calls also reuse its result (0 = overlap only)
+COALESCE_TTL_SECONDS = float(os.getenv("COALESCE_TTL_SECONDS", "0"))
+
+# Events buffered per /requests/stream client before it is dropped as too slow
+EVENT_QUEUE_SIZE = int(os.getenv("EVENT_QUEUE_SIZE", "100"))
+# Events waiting to be sent to the other workers (NOTIFY) before new ones are dropped
+EVENT_OUTBOX_SIZE = int(os.getenv("EVENT_OUTBOX_SIZE", "10000"))
+
+# Per-request profiling (app/profiling.py). Off by default: when disabled the
+# middleware and SQL hooks are not installed at all.
+PROFILING_ENABLED = os.getenv("PROFILING_ENABLED", "false").lower() in ("1", "true", "yes")
+# Fraction of all requests profiled at random and stored (0 = admin-triggered only)
+PROFILE_SAMPLE_RATE = float(os.getenv("PROFILE_SAMPLE_RATE", "0"))
+PROFILE_INTERVAL_MS = float(os.getenv("PROFILE_INTERVAL_MS", "5"))
+PROFILE_DIR = os.getenv("PROFILE_DIR", "profiles")
+# Oldest stored profiles are deleted beyond this count
+PROFILE_MAX_FILES = int(os.getenv("PROFILE_MAX_FILES", "200"))
+
+# Slow-query log (app/slow_queries.py): statements at or above the threshold
+# are recorded; a sample of slow SELECTs also gets EXPLAIN (ANALYZE, BUFFERS)
+SLOW_QUERY_MS = float(os.getenv("SLOW_QUERY_MS", "200"))
+SLOW_QUERY_EXPLAIN_RATE = float(os.getenv("SLOW_QUERY_EXPLAIN_RATE", "0.1"))
+# JSON-lines file, one entry per slow statement ("" disables the file)
+SLOW_QUERY_LOG = os.getenv("SLOW_QUERY_LOG", "logs/slow_queries.jsonl")
+SLOW_QUERY_QUEUE_SIZE = int(os.getenv("SLOW_QUERY_QUEUE_SIZE", "1000"))
+
+# Connection pool per process. python -m app.serve derives these from a global
+# DB_CONNECTION_BUDGET split across its workers.
+DB_POOL_SIZE = int(os.getenv("DB_POOL_SIZE", "5"))
+DB_MAX_OVERFLOW = int(os.getenv("DB_MAX_OVERFLOW", "10"))
+DB_POOL_TIMEOUT = float(os.getenv("DB_POOL_TIMEOUT", "30"))
+
+# Statement caches (app/queries.py): compiled SQL per engine, and prepared
+# statements per asyncpg connection. Size them above the number of distinct
+# statements the app runs (each ?expand= combination counts) so hot paths never
+# get evicted.
+SQL_COMPILED_CACHE_SIZE = int(os.getenv("SQL_COMPILED_CACHE_SIZE", "1200"))
+ASYNCPG_STATEMENT_CACHE_SIZE = int(os.getenv("ASYNCPG_STATEMENT_CACHE_SIZE", "256"))
+
+# app.serve runs create_all once in the parent and turns this off for workers
+CREATE_TABLES_ON_STARTUP = os.getenv("CREATE_TABLES_ON_STARTUP", "true").lower() in ("1", "true", "yes")
+
+# /health/live fails once the event loop falls this far behind
+LIVENESS_MAX_LOOP_LAG = float(os.getenv("LIVENESS_MAX_LOOP_LAG", "5"))
+
+# Hot/cold archival (app/archive.py): Repaired/Scrap requests older than the
+# retention window move to the cold partition in batches
+ARCHIVE_ENABLED = os.getenv("ARCHIVE_ENABLED", "true").lower() in ("1", "true", "yes")
+ARCHIVE_AFTER_DAYS = int(os.getenv("ARCHIVE_AFTER_DAYS", "180"))
+ARCHIVE_BATCH_SIZE = int(os.getenv("ARCHIVE_BATCH_SIZE", "1000"))
+ARCHIVE_INTERVAL_SECONDS = float(os.getenv("ARCHIVE_INTERVAL_SECONDS", "3600"))
+
+# Idempotency-Key support for request and equipment writes (app/idempotency.py)
+IDEMPOTENCY_TTL_SECONDS = float(os.getenv("IDEMPOTENCY_TTL_SECONDS", "86400"))
+# A claim older than this whose request never finished (worker died) can be retried
+IDEMPOTENCY_LOCK_SECONDS = float(os.getenv("IDEMPOTENCY_LOCK_SECONDS", "60"))
+# How long a duplicate waits for the original request before getting 409
+IDEMPOTENCY_WAIT_SECONDS = float(os.getenv("IDEMPOTENCY_WAIT_SECONDS", "10"))
+# Larger responses are not stored; a retry of such a request gets 409 (it
+# still does not run again)
+IDEMPOTENCY_MAX_BODY = int(os.getenv("IDEMPOTENCY_MAX_BODY", "262144"))
+IDEMPOTENCY_PURGE_INTERVAL_SECONDS = float(os.getenv("IDEMPOTENCY_PURGE_INTERVAL_SECONDS", "600"))
+
+# Background jobs (app/jobs.py). Workers run inside every app process unless
+# JOBS_ENABLED is off, e.g. when they run separately with python -m app.jobs
+JOBS_ENABLED = os.getenv("JOBS_ENABLED", "true").lower() in ("1", "true", "yes")
+# Jobs one process runs at the same time, across all types
+JOB_WORKER_CONCURRENCY = int(os.getenv("JOB_WORKER_CONCURRENCY", "4"))
+JOB_POLL_INTERVAL = float(os.getenv("JOB_POLL_INTERVAL", "1"))
+# A running job's lease; it is failed (and retried) when it runs longer
+JOB_LEASE_SECONDS = float(os.getenv("JOB_LEASE_SECONDS", "300"))
+# Retry delay doubles per attempt from the base, with jitter, up to the max
+JOB_RETRY_BASE_SECONDS = float(os.getenv("JOB_RETRY_BASE_SECONDS", "5"))
+JOB_RETRY_MAX_SECONDS = float(os.getenv("JOB_RETRY_MAX_SECONDS", "3600"))
+
+# Request history writer (app/history.py): rows per INSERT, how long the writer
+# waits for more changes to share one, and rows buffered before record() waits
+HISTORY_BATCH_SIZE = int(os.getenv("HISTORY_BATCH_SIZE", "500"))
+HISTORY_FLUSH_INTERVAL = float(os.getenv("HISTORY_FLUSH_INTERVAL", "0.05"))
+HISTORY_QUEUE_SIZE = int(os.getenv("HISTORY_QUEUE_SIZE", "10000"))
+
+# Scheduling conflicts (app/schedule.py) on request create/update: "warn" adds
+# an X-Schedule-Conflicts header, "reject" refuses the write with 409, "off"
+SCHEDULE_CONFLICT_MODE = os.getenv("SCHEDULE_CONFLICT_MODE", "warn").lower()
+# Most conflicting pairs one /schedule/conflicts call returns
+SCHEDULE_SWEEP_LIMIT = int(os.getenv("SCHEDULE_SWEEP_LIMIT", "1000"))
+
+# Attachment storage (app/storage.py): "local" keeps files under
+# STORAGE_LOCAL_DIR, "s3" uses an S3-compatible service (MinIO works locally)
+STORAGE_BACKEND = os.getenv("STORAGE_BACKEND", "local")
+STORAGE_LOCAL_DIR = os.getenv("STORAGE_LOCAL_DIR", "storage")
+S3_ENDPOINT_URL = os.getenv("S3_ENDPOINT_URL", "http://localhost:9000")
+S3_BUCKET = os.getenv("S3_BUCKET", "gearguard")
+S3_REGION = os.getenv("S3_REGION", "us-east-1")
+S3_ACCESS_KEY = os.getenv("S3_ACCESS_KEY", "")
+S3_SECRET_KEY = os.getenv("S3_SECRET_KEY", "")
+# Multipart upload part size; also the most an S3 upload buffers in memory
+S3_PART_SIZE = int(os.getenv("S3_PART_SIZE", str(8 * 1024 * 1024)))
+
+# Attachments (app/attachments.py): bodies are streamed in chunks of this
+# size, uploads over the max get 413
+ATTACHMENT_CHUNK_SIZE = int(os.getenv("ATTACHMENT_CHUNK_SIZE", str(1024 * 1024)))
+ATTACHMENT_MAX_BYTES = int(os.getenv("ATTACHMENT_MAX_BYTES", str(1024 * 1024 * 1024)))
+# Image thumbnails are made in a process pool of this many workers (0 disables)
+THUMBNAIL_WORKERS = int(os.getenv("THUMBNAIL_WORKERS", "2"))
+THUMBNAIL_SIZE = int(os.getenv("THUMBNAIL_SIZE", "320"))
+# Larger images get no thumbnail
+THUMBNAIL_MAX_SOURCE_BYTES = int(os.getenv("THUMBNAIL_MAX_SOURCE_BYTES", str(50 * 1024 * 1024)))
+
+# Admission control (app/admission.py): requests each route class runs at once
+# per process, and how many may wait for a slot before new ones get 503.
+# Keep reporting + bulk well below the pool size so interactive calls always
+# find a connection.
+ADMISSION_ENABLED = os.getenv("ADMISSION_ENABLED", "true").lower() in ("1", "true", "yes")
+ADMISSION_INTERACTIVE_CONCURRENCY = int(os.getenv("ADMISSION_INTERACTIVE_CONCURRENCY", "64"))
+ADMISSION_INTERACTIVE_QUEUE = int(os.getenv("ADMISSION_INTERACTIVE_QUEUE", "256"))
+ADMISSION_REPORTING_CONCURRENCY = int(os.getenv("ADMISSION_REPORTING_CONCURRENCY", "4"))
+ADMISSION_REPORTING_QUEUE = int(os.getenv("ADMISSION_REPORTING_QUEUE", "32"))
+ADMISSION_BULK_CONCURRENCY = int(os.getenv("ADMISSION_BULK_CONCURRENCY", "2"))
+ADMISSION_BULK_QUEUE = int(os.getenv("ADMISSION_BULK_QUEUE", "8"))
+# Attachment uploads/downloads; they hold no DB connection while streaming
+ADMISSION_TRANSFER_CONCURRENCY = int(os.getenv("ADMISSION_TRANSFER_CONCURRENCY", "32"))
+ADMISSION_TRANSFER_QUEUE = int(os.getenv("ADMISSION_TRANSFER_QUEUE", "64"))
+# Longest wait for a slot before shedding, and the Retry-After sent with the 503
+ADMISSION_QUEUE_TIMEOUT = float(os.getenv("ADMISSION_QUEUE_TIMEOUT", "5"))
+ADMISSION_RETRY_AFTER = float(os.getenv("ADMISSION_RETRY_AFTER", "1"))
+
+# POST /batch (app/batch.py): GETs per batch, and how many of one batch run at once
+BATCH_MAX_CALLS = int(os.getenv("BATCH_MAX_CALLS", "20"))
+BATCH_CONCURRENCY = int(os.getenv("BATCH_CONCURRENCY", "4"))
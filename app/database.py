@@ -1,7 +1,12 @@
 from sqlalchemy.ext.asyncio import create_async_engine, AsyncSession, async_sessionmaker
 from sqlalchemy.orm import DeclarativeBase
 from sqlalchemy.engine.url import make_url
-from app.config import POSTGRES_URL
+from app.config import (
+    POSTGRES_URL, DB_POOL_SIZE, DB_MAX_OVERFLOW, DB_POOL_TIMEOUT,
+    SQL_COMPILED_CACHE_SIZE, ASYNCPG_STATEMENT_CACHE_SIZE,
+)
+from app.metrics import InstrumentedPool, instrument_engine
+from app.slow_queries import slow_query_log
 
 # Ensure URL uses async driver
 url = POSTGRES_URL
@@ -30,7 +35,18 @@ if url:
         # Fallback to original if parsing fails, though it might error later
         pass
 
-engine = create_async_engine(url, echo=True, connect_args=connect_args)
+engine = create_async_engine(
+    url,
+    echo=True,
+    connect_args={**connect_args, "prepared_statement_cache_size": ASYNCPG_STATEMENT_CACHE_SIZE},
+    poolclass=InstrumentedPool,
+    pool_size=DB_POOL_SIZE,
+    max_overflow=DB_MAX_OVERFLOW,
+    pool_timeout=DB_POOL_TIMEOUT,
+    query_cache_size=SQL_COMPILED_CACHE_SIZE,
+)
+instrument_engine(engine)
+slow_query_log.instrument(engine)
 
 AsyncSessionLocal = async_sessionmaker(
     bind=engine,
@@ -45,3 +61,22 @@ class Base(DeclarativeBase):
 async def get_db():
     async with AsyncSessionLocal() as session:
         yield session
+
+async def release(session: AsyncSession):
+    # get_db only closes the session after the response has been serialized.
+    # Read handlers call this once their rows are loaded so the transaction
+    # ends and the connection goes back to the pool before that CPU-bound
+    # work; loaded objects stay readable (expire_on_commit=False, and
+    # relationships are either loaded or raise). Using the session again
+    # checks out a new connection.
+    await session.close()
+
+def asyncpg_dsn():
+    # Plain asyncpg DSN for dedicated (non-pooled) connections, e.g. LISTEN
+    if url and url.startswith("postgresql+asyncpg://"):
+        return url.replace("postgresql+asyncpg://", "postgresql://", 1)
+    return None
+
+def new_session() -> AsyncSession:
+    # Standalone session (own pooled connection) for work that runs outside get_db
+    return AsyncSessionLocal()
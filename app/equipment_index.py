@@ -0,0 +1,320 @@
+import asyncio
+import heapq
+import logging
+import re
+from bisect import bisect_left, insort
+from datetime import date
+from typing import Dict, List, Optional, Tuple
+
+from sqlalchemy import func
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.future import select
+
+from app.database import new_session
+from app.events import EventBroker
+from app.models import Equipment, MaintenanceRequest
+
+logger = logging.getLogger(__name__)
+
+# Split points inside names / serials, so "SN-12345" is also found by "123"
+# and "CNC Lathe 3" by "lat".
+_WORD_BREAK = re.compile(r"[\s\-_./#:]+")
+
+# Prefix ranges up to this many keys are ranked directly. Every prefix with
+# more keys than that (short queries on a large index) has a bucket: its
+# equipment kept in suggestion order, so the answer is the bucket's head.
+MAX_CANDIDATES = 1000
+
+
+def _keys_for(text: Optional[str]) -> List[str]:
+    if not text:
+        return []
+    text = text.lower()
+    keys = {text}
+    for match in _WORD_BREAK.finditer(text):
+        rest = text[match.end():]
+        if rest:
+            keys.add(rest)
+    return list(keys)
+
+
+def _prefixes(keys: List[str]):
+    return {key[:n] for key in keys for n in range(1, len(key) + 1)}
+
+
+class EquipmentIndex:
+    # In-process prefix index over Equipment.name and serial_number.
+    # Keys live in one sorted list (with the owning equipment id in a parallel
+    # list), so a lookup is two bisects and a slice. Prefixes matching more
+    # than MAX_CANDIDATES keys each get a bucket: a sorted list of the rank
+    # keys (most recently maintained first, then by name) of every equipment
+    # they match, kept current by upsert, remove and touch.
+    # Each worker keeps its own copy; it is loaded at startup and kept current
+    # by the equipment/request handlers of that worker.
+
+    def __init__(self):
+        self._keys: List[str] = []
+        self._ids: List[int] = []
+        # id -> (name, serial_number, last maintenance date)
+        self._entries: Dict[int, Tuple[str, str, Optional[date]]] = {}
+        # id -> its keys, and its (rank, name, id) tuple as stored in buckets
+        self._keys_of: Dict[int, List[str]] = {}
+        self._rank_of: Dict[int, Tuple[int, str, int]] = {}
+        # prefix -> sorted rank tuples of the equipment it matches
+        self._buckets: Dict[str, List[Tuple[int, str, int]]] = {}
+
+    def __len__(self):
+        return len(self._entries)
+
+    async def load(self, db: AsyncSession):
+        query = (
+            select(
+                Equipment.id,
+                Equipment.name,
+                Equipment.serial_number,
+                func.max(MaintenanceRequest.request_date),
+            )
+            .outerjoin(MaintenanceRequest, MaintenanceRequest.equipment_id == Equipment.id)
+            .group_by(Equipment.id, Equipment.name, Equipment.serial_number)
+        )
+        result = await db.execute(query)
+        self.rebuild(result.all())
+
+    def rebuild(self, rows):
+        # rows: (id, name, serial_number, last_maintenance)
+        pairs = []
+        self._entries = {}
+        self._keys_of = {}
+        self._rank_of = {}
+        for equipment_id, name, serial_number, last_maintenance in rows:
+            self._set_entry(equipment_id, name or "", serial_number or "", last_maintenance)
+            for key in self._keys_of[equipment_id]:
+                pairs.append((key, equipment_id))
+        pairs.sort()
+        self._keys = [key for key, _ in pairs]
+        self._ids = [equipment_id for _, equipment_id in pairs]
+        self._buckets = {}
+        # Buckets are built by sorting positions in one global ranking, which
+        # is much cheaper than sorting each bucket's rank tuples
+        ranked = sorted(self._rank_of.values())
+        self._build_buckets("", 0, len(self._keys), ranked, {rank[2]: pos for pos, rank in enumerate(ranked)})
+
+    def _build_buckets(self, prefix: str, start: int, end: int, ranked, position: Dict[int, int]):
+        # Walk down the prefix tree of keys[start:end] (all starting with
+        # prefix), one bisect per child, into every range that is too broad
+        if prefix:
+            if end - start <= MAX_CANDIDATES:
+                return
+            self._buckets[prefix] = [ranked[p] for p in sorted({position[i] for i in self._ids[start:end]})]
+        pos = start
+        while pos < end and len(self._keys[pos]) == len(prefix):
+            pos += 1
+        while pos < end:
+            child = self._keys[pos][:len(prefix) + 1]
+            child_end = bisect_left(self._keys, child + "\uffff", pos, end)
+            self._build_buckets(child, pos, child_end, ranked, position)
+            pos = child_end
+
+    def _set_entry(self, equipment_id: int, name: str, serial_number: str, last_maintenance: Optional[date]):
+        self._entries[equipment_id] = (name, serial_number, last_maintenance)
+        # Keys only change through upsert, which removes the entry first
+        if equipment_id not in self._keys_of:
+            self._keys_of[equipment_id] = _keys_for(name) + _keys_for(serial_number)
+        self._rank_of[equipment_id] = (-(last_maintenance or date.min).toordinal(), name, equipment_id)
+
+    def _rebucket(self, equipment_id: int, add: bool):
+        rank = self._rank_of[equipment_id]
+        for prefix in _prefixes(self._keys_of[equipment_id]):
+            bucket = self._buckets.get(prefix)
+            if bucket is None:
+                continue
+            if add:
+                insort(bucket, rank)
+            else:
+                pos = bisect_left(bucket, rank)
+                if pos < len(bucket) and bucket[pos] == rank:
+                    del bucket[pos]
+
+    def upsert(self, equipment_id: int, name: Optional[str], serial_number: Optional[str]):
+        last_maintenance = None
+        if equipment_id in self._entries:
+            last_maintenance = self._entries[equipment_id][2]
+            self.remove(equipment_id)
+        self._set_entry(equipment_id, name or "", serial_number or "", last_maintenance)
+        self._rebucket(equipment_id, add=True)
+        for key in self._keys_of[equipment_id]:
+            pos = bisect_left(self._keys, key)
+            # Keep (key, id) order stable so remove() can find the exact slot
+            while pos < len(self._keys) and self._keys[pos] == key and self._ids[pos] < equipment_id:
+                pos += 1
+            self._keys.insert(pos, key)
+            self._ids.insert(pos, equipment_id)
+
+    def remove(self, equipment_id: int):
+        if equipment_id not in self._entries:
+            return
+        self._rebucket(equipment_id, add=False)
+        del self._entries[equipment_id]
+        del self._rank_of[equipment_id]
+        for key in self._keys_of.pop(equipment_id):
+            pos = bisect_left(self._keys, key)
+            while pos < len(self._keys) and self._keys[pos] == key:
+                if self._ids[pos] == equipment_id:
+                    del self._keys[pos]
+                    del self._ids[pos]
+                    break
+                pos += 1
+
+    def touch(self, equipment_id: int, maintenance_date: Optional[date]):
+        # Record a maintenance request so the equipment ranks higher
+        entry = self._entries.get(equipment_id)
+        if entry is None or maintenance_date is None:
+            return
+        name, serial_number, last_maintenance = entry
+        if last_maintenance is None or maintenance_date > last_maintenance:
+            self._rebucket(equipment_id, add=False)
+            self._set_entry(equipment_id, name, serial_number, maintenance_date)
+            self._rebucket(equipment_id, add=True)
+
+    def suggest(self, q: str, limit: int = 10) -> List[dict]:
+        q = q.strip().lower()
+        if not q:
+            return []
+        # Every key starting with q sorts between q and q + U+FFFF
+        start = bisect_left(self._keys, q)
+        end = bisect_left(self._keys, q + "\uffff", start)
+        if end - start <= MAX_CANDIDATES:
+            # Most recently maintained first, then by name
+            best = heapq.nsmallest(limit, {self._rank_of[i] for i in self._ids[start:end]})
+        else:
+            bucket = self._buckets.get(q)
+            if bucket is None:
+                # Grown past MAX_CANDIDATES through upserts since the last rebuild
+                bucket = self._buckets[q] = sorted({self._rank_of[i] for i in self._ids[start:end]})
+            best = bucket[:limit]
+        return [
+            {
+                "id": i,
+                "name": self._entries[i][0],
+                "serial_number": self._entries[i][1],
+                "last_maintenance": self._entries[i][2],
+            }
+            for _, _, i in best
+        ]
+
+
+def _rank(entry: dict):
+    return (-(entry["last_maintenance"] or date.min).toordinal(), entry["name"])
+
+
+class TenantEquipmentIndex:
+    # One EquipmentIndex per company (Equipment.company_name), so typeahead for
+    # one tenant never ranks or returns another's equipment. Callers without a
+    # tenant (single-company deployments) search across all of them.
+    #
+    # upsert/remove/touch do not change the index directly: they publish the
+    # change on an EventBroker, which applies it in every worker (over NOTIFY
+    # once started with a DSN, in-process otherwise). A worker whose LISTEN
+    # connection dropped may have missed changes and reloads from the database.
+
+    def __init__(self):
+        self._indexes: Dict[Optional[str], EquipmentIndex] = {}
+        self._tenant_of: Dict[int, Optional[str]] = {}
+        self._changes = EventBroker(channel="equipment_index_events")
+        self._changes.add_handler(self._apply)
+        self._reload: Optional[asyncio.Task] = None
+
+    async def start(self, dsn: Optional[str] = None, **connect_args):
+        await self._changes.start(dsn, **connect_args)
+
+    async def stop(self):
+        await self._changes.stop()
+        if self._reload is not None:
+            self._reload.cancel()
+
+    def __len__(self):
+        return len(self._tenant_of)
+
+    async def load(self, db: AsyncSession):
+        query = (
+            select(
+                Equipment.id,
+                Equipment.name,
+                Equipment.serial_number,
+                func.max(MaintenanceRequest.request_date),
+                Equipment.company_name,
+            )
+            .outerjoin(MaintenanceRequest, MaintenanceRequest.equipment_id == Equipment.id)
+            .group_by(Equipment.id, Equipment.name, Equipment.serial_number, Equipment.company_name)
+        )
+        result = await db.execute(query)
+        self.rebuild(result.all())
+
+    def rebuild(self, rows):
+        # rows: (id, name, serial_number, last_maintenance, tenant)
+        by_tenant: Dict[Optional[str], list] = {}
+        for equipment_id, name, serial_number, last_maintenance, tenant in rows:
+            by_tenant.setdefault(tenant, []).append((equipment_id, name, serial_number, last_maintenance))
+        indexes = {}
+        for tenant, tenant_rows in by_tenant.items():
+            indexes[tenant] = EquipmentIndex()
+            indexes[tenant].rebuild(tenant_rows)
+        self._indexes = indexes
+        self._tenant_of = {row[0]: row[4] for row in rows}
+
+    def upsert(self, equipment_id: int, name: Optional[str], serial_number: Optional[str], tenant: Optional[str] = None):
+        self._changes.publish({"type": "upsert", "id": equipment_id, "name": name, "serial_number": serial_number}, tenant)
+
+    def remove(self, equipment_id: int):
+        self._changes.publish({"type": "remove", "id": equipment_id})
+
+    def touch(self, equipment_id: int, maintenance_date: Optional[date]):
+        if maintenance_date is not None:
+            self._changes.publish({"type": "touch", "id": equipment_id, "date": maintenance_date.isoformat()})
+
+    def _apply(self, event: Optional[dict], tenant: Optional[str]):
+        if event is None:
+            if self._reload is None or self._reload.done():
+                self._reload = asyncio.get_running_loop().create_task(self._reload_from_db())
+        elif event["type"] == "upsert":
+            self._upsert(event["id"], event["name"], event["serial_number"], tenant)
+        elif event["type"] == "remove":
+            self._remove(event["id"])
+        elif event["type"] == "touch":
+            self._touch(event["id"], date.fromisoformat(event["date"]))
+
+    async def _reload_from_db(self):
+        try:
+            async with new_session() as db:
+                await self.load(db)
+        except Exception:
+            logger.exception("equipment index reload failed")
+
+    def _upsert(self, equipment_id: int, name: Optional[str], serial_number: Optional[str], tenant: Optional[str]):
+        # Moved to another company: drop it from the old namespace
+        if self._tenant_of.get(equipment_id, tenant) != tenant:
+            self._remove(equipment_id)
+        index = self._indexes.get(tenant)
+        if index is None:
+            index = self._indexes[tenant] = EquipmentIndex()
+        index.upsert(equipment_id, name, serial_number)
+        self._tenant_of[equipment_id] = tenant
+
+    def _remove(self, equipment_id: int):
+        if equipment_id not in self._tenant_of:
+            return
+        self._indexes[self._tenant_of.pop(equipment_id)].remove(equipment_id)
+
+    def _touch(self, equipment_id: int, maintenance_date: date):
+        if equipment_id in self._tenant_of:
+            self._indexes[self._tenant_of[equipment_id]].touch(equipment_id, maintenance_date)
+
+    def suggest(self, q: str, limit: int = 10, tenant: Optional[str] = None) -> List[dict]:
+        if tenant is not None:
+            index = self._indexes.get(tenant)
+            return index.suggest(q, limit) if index is not None else []
+        matches = [entry for index in self._indexes.values() for entry in index.suggest(q, limit)]
+        return heapq.nsmallest(limit, matches, key=_rank)
+
+
+equipment_index = TenantEquipmentIndex()
@@ -0,0 +1,188 @@
+import asyncio
+import json
+import logging
+from typing import Callable, List, Optional, Set
+
+from app.config import EVENT_OUTBOX_SIZE, EVENT_QUEUE_SIZE
+
+# Fan-out of compact maintenance-request change events to connected clients
+# (see GET /requests/stream).
+#
+# Without a DSN the broker is purely in-process, which is what tests use.
+# With a DSN, events go out through Postgres NOTIFY and every worker's
+# LISTEN connection delivers them to its own subscribers, so a change made on
+# one worker reaches boards connected to any other.
+#
+# publish() only queues the event (the change it describes is committed
+# already, so it must not fail the request); a background task sends the
+# queue over the broker's own connection, which also LISTENs, and reconnects
+# with backoff when it breaks. Events from other workers may have been missed
+# meanwhile, so after a reconnect every stream is ended and its client
+# reloads the board.
+#
+# An event's company travels next to it, in the envelope, and only decides
+# which subscribers get it; clients never see it.
+#
+# Besides client streams, in-process handlers can follow a broker (e.g. the
+# typeahead index of every worker, see app/equipment_index.py). Each broker
+# has its own NOTIFY channel.
+
+logger = logging.getLogger(__name__)
+
+CHANNEL = "maintenance_request_events"
+# An idle connection is checked this often, so a broken LISTEN is noticed
+PING_INTERVAL = 10.0
+RECONNECT_DELAY = 0.5
+MAX_RECONNECT_DELAY = 30.0
+
+
+class Subscriber:
+    def __init__(self, queue_size: int, tenant: Optional[str] = None):
+        self.queue: asyncio.Queue = asyncio.Queue(maxsize=queue_size)
+        self.tenant = tenant
+        self.dropped = False
+
+    async def get(self) -> Optional[dict]:
+        # None means the subscriber was dropped and should disconnect
+        return await self.queue.get()
+
+
+class EventBroker:
+    def __init__(self, queue_size: int = 100, outbox_size: int = EVENT_OUTBOX_SIZE, channel: str = CHANNEL):
+        self.queue_size = queue_size
+        self.outbox_size = outbox_size
+        self.channel = channel
+        self._subscribers: Set[Subscriber] = set()
+        self._handlers: List[Callable[[Optional[dict], Optional[str]], None]] = []
+        self._outbox: Optional[asyncio.Queue] = None
+        self._worker: Optional[asyncio.Task] = None
+
+    def __len__(self):
+        return len(self._subscribers)
+
+    async def start(self, dsn: Optional[str] = None, **connect_args):
+        if not dsn:
+            return
+        self._outbox = asyncio.Queue(maxsize=self.outbox_size)
+        self._worker = asyncio.create_task(self._run(dsn, connect_args))
+
+    async def stop(self, timeout: float = 5.0):
+        self.close_subscribers()
+        if self._worker is None:
+            return
+        try:
+            await asyncio.wait_for(self._outbox.join(), timeout)
+        except asyncio.TimeoutError:
+            logger.error("dropping %d unsent %s events on shutdown", self._outbox.qsize(), self.channel)
+        self._worker.cancel()
+        await asyncio.gather(self._worker, return_exceptions=True)
+        self._worker = None
+        self._outbox = None
+
+    def close_subscribers(self):
+        # Ends every open stream; clients reconnect (to another worker when draining)
+        for subscriber in list(self._subscribers):
+            self._drop(subscriber)
+
+    def subscribe(self, tenant: Optional[str] = None) -> Subscriber:
+        # A tenant-scoped subscriber only receives that company's events
+        subscriber = Subscriber(self.queue_size, tenant)
+        self._subscribers.add(subscriber)
+        return subscriber
+
+    def unsubscribe(self, subscriber: Subscriber):
+        self._subscribers.discard(subscriber)
+
+    def add_handler(self, handler: Callable[[Optional[dict], Optional[str]], None]):
+        # handler(event, tenant) runs for every event, from every worker;
+        # handler(None, None) after a reconnect, when events may have been missed
+        self._handlers.append(handler)
+
+    def publish(self, event: dict, tenant: Optional[str] = None):
+        envelope = {"tenant": tenant, "event": event}
+        if self._outbox is None:
+            self._deliver(envelope)
+            return
+        try:
+            self._outbox.put_nowait(envelope)
+        except asyncio.QueueFull:
+            logger.warning("%s outbox full, dropping a %s event", self.channel, event.get("type"))
+
+    async def _run(self, dsn: str, connect_args: dict):
+        import asyncpg
+
+        delay = RECONNECT_DELAY
+        connected_before = False
+        # An event whose send failed goes out first on the next connection
+        pending = None
+        while True:
+            try:
+                conn = await asyncpg.connect(dsn, **connect_args)
+            except Exception:
+                logger.warning("event broker cannot connect, retrying in %.1fs", delay, exc_info=True)
+                await asyncio.sleep(delay)
+                delay = min(delay * 2, MAX_RECONNECT_DELAY)
+                continue
+            try:
+                await conn.add_listener(self.channel, self._on_notify)
+                if connected_before:
+                    self.close_subscribers()
+                    for handler in self._handlers:
+                        handler(None, None)
+                connected_before = True
+                delay = RECONNECT_DELAY
+                while True:
+                    if pending is None:
+                        try:
+                            pending = await asyncio.wait_for(self._outbox.get(), PING_INTERVAL)
+                        except asyncio.TimeoutError:
+                            await conn.execute("SELECT 1")
+                            continue
+                    await conn.execute("SELECT pg_notify($1, $2)", self.channel, json.dumps(pending, default=str))
+                    pending = None
+                    self._outbox.task_done()
+            except asyncio.CancelledError:
+                raise
+            except Exception:
+                logger.warning("event broker connection lost, reconnecting", exc_info=True)
+            finally:
+                conn.terminate()
+
+    def _on_notify(self, connection, pid, channel, payload):
+        self._deliver(json.loads(payload))
+
+    def _deliver(self, envelope: dict):
+        for handler in self._handlers:
+            try:
+                handler(envelope["event"], envelope["tenant"])
+            except Exception:
+                logger.exception("%s handler failed", self.channel)
+        for subscriber in list(self._subscribers):
+            if subscriber.tenant is not None and subscriber.tenant != envelope["tenant"]:
+                continue
+            try:
+                subscriber.queue.put_nowait(envelope["event"])
+            except asyncio.QueueFull:
+                # Slow consumer: disconnect it rather than buffer without limit.
+                # The client reconnects and reloads the board.
+                self._drop(subscriber)
+
+    def _drop(self, subscriber: Subscriber):
+        self._subscribers.discard(subscriber)
+        subscriber.dropped = True
+        while not subscriber.queue.empty():
+            subscriber.queue.get_nowait()
+        subscriber.queue.put_nowait(None)
+
+
+def request_event(kind: str, request) -> dict:
+    return {
+        "type": kind,
+        "id": request.id,
+        "stage": request.stage.value if request.stage else None,
+        "technician_id": request.technician_id,
+        "priority": request.priority.value if request.priority else None,
+    }
+
+
+request_events = EventBroker(EVENT_QUEUE_SIZE)
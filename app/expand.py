@@ -0,0 +1,48 @@
+from typing import Dict, Optional, Set
+
+from fastapi import HTTPException, Query
+from sqlalchemy.orm import noload, selectinload
+
+
+class ExpandSpec:
+    # Maps the ?expand= paths a route accepts to relationship attributes, e.g.
+    #   {"team": MaintenanceRequest.team, "team.users": Team.users}
+    # Parents must be listed before their children.
+    # Relationships default to lazy="raise", so every relationship the response
+    # schema touches is either eagerly loaded (expanded) or noload-ed, which
+    # serializes as null / [].
+
+    def __init__(self, paths: Dict[str, object]):
+        self.paths = paths
+
+    def param(self, expand: Optional[str] = Query(
+        None, description="Comma separated relationships to include, e.g. category,team.users"
+    )) -> Set[str]:
+        requested = {p.strip() for p in expand.split(",") if p.strip()} if expand else set()
+        unknown = requested - self.paths.keys()
+        if unknown:
+            raise HTTPException(status_code=400, detail=f"Cannot expand: {', '.join(sorted(unknown))}")
+
+        # "team.users" implies "team"
+        for path in list(requested):
+            parts = path.split(".")
+            for i in range(1, len(parts)):
+                requested.add(".".join(parts[:i]))
+        return requested
+
+    def options(self, expand: Set[str]):
+        loaders = {}
+        options = []
+        for path, attr in self.paths.items():
+            parent = path.rpartition(".")[0]
+            if parent and parent not in expand:
+                # Parent is not loaded, nothing below it gets serialized
+                continue
+            base = loaders.get(parent)
+            if path in expand:
+                loader = base.selectinload(attr) if base is not None else selectinload(attr)
+                loaders[path] = loader
+            else:
+                loader = base.noload(attr) if base is not None else noload(attr)
+            options.append(loader)
+        return options
@@ -0,0 +1,32 @@
+import asyncio
+
+from app.events import request_events
+
+# Process lifecycle as seen by the readiness probe: not ready until warm-up
+# finishes, and not ready again once draining for shutdown starts.
+
+
+class HealthState:
+    def __init__(self):
+        self.ready = False
+        self.draining = False
+
+    def begin_drain(self):
+        self.draining = True
+        # SSE streams never finish on their own; end them so clients move on
+        request_events.close_subscribers()
+
+
+health = HealthState()
+
+
+async def ping_database(engine, timeout: float = 2.0) -> bool:
+    async def ping():
+        async with engine.connect() as conn:
+            await conn.exec_driver_sql("SELECT 1")
+
+    try:
+        await asyncio.wait_for(ping(), timeout)
+        return True
+    except Exception:
+        return False
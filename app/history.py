@@ -0,0 +1,149 @@
+import asyncio
+import logging
+from datetime import datetime, timezone
+from typing import List, Optional
+
+from sqlalchemy import text
+
+from app import database
+from app.config import HISTORY_BATCH_SIZE, HISTORY_FLUSH_INTERVAL, HISTORY_QUEUE_SIZE
+from app.metrics import HISTORY_BATCH_ROWS, HISTORY_EVENTS
+
+# Append-only history of maintenance request changes (request_events): every
+# stage, technician and priority change with its time and actor, so repair
+# times can be computed and audits answered.
+#
+# Handlers only put rows on a queue after their commit; one writer task per
+# process drains it and inserts whatever has accumulated as a single
+# multi-row INSERT, so a burst of Kanban moves costs one round trip instead of
+# one per change. When the queue is full, record() waits for room rather than
+# dropping history. Without a running writer (scripts, tests) rows are
+# inserted directly.
+
+logger = logging.getLogger(__name__)
+
+TRACKED_FIELDS = ("stage", "technician_id", "priority")
+WRITE_ATTEMPTS = 3
+
+COLUMNS = ("request_id", "ts", "field", "old_value", "new_value", "actor_id", "company_id")
+INSERT_EVENTS = text(
+    "INSERT INTO request_events (request_id, ts, field, old_value, new_value, actor_id, company_id) "
+    "SELECT * FROM unnest(CAST(:request_id AS integer[]), CAST(:ts AS timestamptz[]), "
+    "CAST(:field AS varchar[]), CAST(:old_value AS varchar[]), CAST(:new_value AS varchar[]), "
+    "CAST(:actor_id AS integer[]), CAST(:company_id AS varchar[]))"
+)
+
+
+def _value(value) -> Optional[str]:
+    if value is None:
+        return None
+    return str(value.value if hasattr(value, "value") else value)
+
+
+def request_changes(request, before: dict, actor_id: Optional[int]) -> List[dict]:
+    # Rows for the tracked fields whose value differs from `before`
+    # (empty `before` for a new request: every field set on it is recorded)
+    ts = datetime.now(timezone.utc)
+    rows = []
+    for field in TRACKED_FIELDS:
+        old, new = _value(before.get(field)), _value(getattr(request, field))
+        if old != new:
+            rows.append({
+                "request_id": request.id,
+                "ts": ts,
+                "field": field,
+                "old_value": old,
+                "new_value": new,
+                "actor_id": actor_id,
+                "company_id": request.company_id,
+            })
+    return rows
+
+
+def snapshot(request) -> dict:
+    return {field: getattr(request, field) for field in TRACKED_FIELDS}
+
+
+class HistoryWriter:
+    def __init__(self, batch_size: int = HISTORY_BATCH_SIZE, flush_interval: float = HISTORY_FLUSH_INTERVAL,
+                 queue_size: int = HISTORY_QUEUE_SIZE):
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.queue_size = queue_size
+        self._queue: Optional[asyncio.Queue] = None
+        self._worker: Optional[asyncio.Task] = None
+
+    async def record(self, rows: List[dict]):
+        if not rows:
+            return
+        if self._queue is None:
+            await self._write(rows)
+            return
+        for row in rows:
+            await self._queue.put(row)
+
+    async def flush(self):
+        # Waits until everything recorded so far is written (or given up on)
+        if self._queue is not None:
+            await self._queue.join()
+
+    async def start(self):
+        self._queue = asyncio.Queue(maxsize=self.queue_size)
+        self._worker = asyncio.create_task(self._run())
+
+    async def stop(self, timeout: float = 10.0):
+        if self._worker is None:
+            return
+        try:
+            await asyncio.wait_for(self.flush(), timeout)
+        except asyncio.TimeoutError:
+            logger.error("dropping %d unwritten request events on shutdown", self._queue.qsize())
+        self._worker.cancel()
+        await asyncio.gather(self._worker, return_exceptions=True)
+        self._worker = None
+        self._queue = None
+
+    async def _run(self):
+        loop = asyncio.get_running_loop()
+        while True:
+            batch = [await self._queue.get()]
+            # Linger briefly so concurrent changes share the INSERT
+            deadline = loop.time() + self.flush_interval
+            while len(batch) < self.batch_size:
+                timeout = deadline - loop.time()
+                if timeout <= 0:
+                    break
+                try:
+                    batch.append(await asyncio.wait_for(self._queue.get(), timeout))
+                except asyncio.TimeoutError:
+                    break
+            try:
+                await self._write_with_retry(batch)
+            finally:
+                for _ in batch:
+                    self._queue.task_done()
+
+    async def _write_with_retry(self, rows: List[dict]):
+        for attempt in range(1, WRITE_ATTEMPTS + 1):
+            try:
+                await self._write(rows)
+                return
+            except Exception:
+                if attempt == WRITE_ATTEMPTS:
+                    logger.exception("dropping %d request events after %d attempts", len(rows), attempt)
+                    HISTORY_EVENTS.labels("dropped").inc(len(rows))
+                    return
+                logger.warning("writing request events failed, retrying", exc_info=True)
+                await asyncio.sleep(attempt)
+
+    async def _write(self, rows: List[dict]):
+        # One column array per field: the statement text is the same for any
+        # batch size, so it is compiled and prepared once
+        columns = {column: [row[column] for row in rows] for column in COLUMNS}
+        async with database.engine.begin() as conn:
+            await conn.execute(INSERT_EVENTS, columns)
+        HISTORY_EVENTS.labels("written").inc(len(rows))
+        HISTORY_BATCH_ROWS.observe(len(rows))
+
+
+history_writer = HistoryWriter()
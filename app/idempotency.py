@@ -0,0 +1,305 @@
+import asyncio
+import hashlib
+import json
+import logging
+import time
+from datetime import datetime, timedelta, timezone
+from typing import Optional
+
+from jose import JWTError, jwt
+from sqlalchemy import and_, delete, or_, update
+from sqlalchemy.dialects.postgresql import insert
+from sqlalchemy.future import select
+
+from app.auth_utils import ALGORITHM, SECRET_KEY
+from app.config import (
+    IDEMPOTENCY_LOCK_SECONDS,
+    IDEMPOTENCY_MAX_BODY,
+    IDEMPOTENCY_PURGE_INTERVAL_SECONDS,
+    IDEMPOTENCY_TTL_SECONDS,
+    IDEMPOTENCY_WAIT_SECONDS,
+)
+from app.database import new_session
+from app.metrics import current_route
+from app.models import IdempotencyKey
+from app.tenancy import current_tenant
+
+# Idempotency-Key support for writes that clients retry (flaky mobile links,
+# double-clicked buttons). The first request with a key claims it by inserting
+# a row; when it finishes, its status and body are stored on that row for
+# IDEMPOTENCY_TTL_SECONDS and later requests with the same key get the stored
+# response back (Idempotent-Replayed: true) without running the endpoint.
+#
+# Duplicates that arrive while the first one is still running wait for it
+# (on an asyncio.Event in the same worker, by polling the row across workers)
+# and then replay its response; after IDEMPOTENCY_WAIT_SECONDS they get 409.
+# Reusing a key with a different method, path or body is a 422.
+#
+# Replays carry the stored status, body and REPLAYED_HEADERS. A response over
+# IDEMPOTENCY_MAX_BODY is not stored, but its key still counts as done:
+# retries get 409 rather than running the write again.
+#
+# Server errors (5xx, exceptions) release the key so the client can retry.
+# Keys are scoped per company and user, so callers never see each other's
+# responses. Anonymous callers have no scope to keep apart, so their keys are
+# ignored and every request runs.
+
+logger = logging.getLogger(__name__)
+
+IDEMPOTENCY_HEADER = b"idempotency-key"
+MAX_KEY_LENGTH = 255
+POLL_INTERVAL = 0.05
+
+# (method, route template) of the endpoints that honour the header
+IDEMPOTENT_ROUTES = {
+    ("POST", "/requests/"),
+    ("PUT", "/requests/{request_id}"),
+    ("POST", "/equipments/"),
+    ("PUT", "/equipments/{equipment_id}"),
+    ("DELETE", "/equipments/{equipment_id}"),
+}
+
+# Response headers stored with the body and sent again on replay
+REPLAYED_HEADERS = {b"content-type", b"location", b"x-schedule-conflicts"}
+
+CLAIMED, BUSY, DONE, MISMATCH, GONE = range(5)
+
+# Keys whose first request runs in this worker
+_inflight = {}
+
+
+def _now() -> datetime:
+    return datetime.now(timezone.utc)
+
+
+def _caller(scope) -> Optional[str]:
+    # "<company>:<user>" of a valid bearer token, None for anonymous calls
+    user = None
+    for name, value in scope["headers"]:
+        if name == b"authorization":
+            scheme, _, token = value.decode().partition(" ")
+            if scheme.lower() == "bearer":
+                try:
+                    user = jwt.decode(token, SECRET_KEY, algorithms=[ALGORITHM]).get("sub")
+                except JWTError:
+                    pass
+            break
+    if user is None:
+        return None
+    tenant = current_tenant.get()
+    return f"{tenant if isinstance(tenant, str) else '*'}:{user}"
+
+
+def fingerprint(method: str, path: str, query: bytes, body: bytes) -> str:
+    digest = hashlib.sha256()
+    for part in (method.encode(), path.encode(), query, body):
+        digest.update(part)
+        digest.update(b"\0")
+    return digest.hexdigest()
+
+
+async def claim(owner: str, key: str, request_fingerprint: str):
+    now = _now()
+    values = {
+        "fingerprint": request_fingerprint,
+        "locked_until": now + timedelta(seconds=IDEMPOTENCY_LOCK_SECONDS),
+        "expires_at": now + timedelta(seconds=IDEMPOTENCY_TTL_SECONDS),
+    }
+    this_key = and_(IdempotencyKey.scope == owner, IdempotencyKey.key == key)
+    async with new_session() as db:
+        # The primary key decides between concurrent first requests
+        claimed = (await db.execute(
+            insert(IdempotencyKey)
+            .values(scope=owner, key=key, **values)
+            .on_conflict_do_nothing()
+            .returning(IdempotencyKey.key)
+        )).first() is not None
+        if not claimed:
+            # Take over expired keys, and claims whose worker died mid-request
+            claimed = (await db.execute(
+                update(IdempotencyKey)
+                .where(this_key, or_(
+                    IdempotencyKey.expires_at <= now,
+                    and_(
+                        IdempotencyKey.status_code.is_(None),
+                        IdempotencyKey.locked_until <= now,
+                        IdempotencyKey.fingerprint == request_fingerprint,
+                    ),
+                ))
+                .values(status_code=None, headers=None, body=None, body_stored=True, **values)
+                .returning(IdempotencyKey.key)
+            )).first() is not None
+        if claimed:
+            await db.commit()
+            return CLAIMED, None
+        row = (await db.execute(select(IdempotencyKey).where(this_key))).scalar_one_or_none()
+        await db.commit()
+
+    if row is None:
+        # The first request failed and released the key in between
+        return GONE, None
+    if row.fingerprint != request_fingerprint:
+        return MISMATCH, row
+    if row.status_code is None:
+        return BUSY, row
+    return DONE, row
+
+
+async def complete(owner: str, key: str, status_code: int, headers: list, body: Optional[bytes]):
+    # body None: the response was too large to keep
+    async with new_session() as db:
+        await db.execute(
+            update(IdempotencyKey)
+            .where(IdempotencyKey.scope == owner, IdempotencyKey.key == key)
+            .values(status_code=status_code, headers=headers, body=body, body_stored=body is not None)
+        )
+        await db.commit()
+
+
+async def release(owner: str, key: str):
+    async with new_session() as db:
+        await db.execute(
+            delete(IdempotencyKey)
+            .where(IdempotencyKey.scope == owner, IdempotencyKey.key == key, IdempotencyKey.status_code.is_(None))
+        )
+        await db.commit()
+
+
+async def purge_expired() -> int:
+    async with new_session() as db:
+        result = await db.execute(delete(IdempotencyKey).where(IdempotencyKey.expires_at <= _now()))
+        await db.commit()
+    return result.rowcount
+
+
+async def run_purger(interval: float = IDEMPOTENCY_PURGE_INTERVAL_SECONDS):
+    # Expired keys are already ignored by claim(); this only reclaims space
+    while True:
+        await asyncio.sleep(interval)
+        try:
+            purged = await purge_expired()
+            if purged:
+                logger.info("purged %d expired idempotency keys", purged)
+        except Exception:
+            logger.exception("idempotency key purge failed")
+
+
+async def _respond(send, status_code: int, body: bytes, content_type=None, headers=()):
+    response_headers = [(b"content-length", str(len(body)).encode()), *headers]
+    if content_type:
+        response_headers.append((b"content-type", content_type.encode()))
+    await send({"type": "http.response.start", "status": status_code, "headers": response_headers})
+    await send({"type": "http.response.body", "body": body})
+
+
+async def _error(send, status_code: int, detail: str):
+    await _respond(send, status_code, json.dumps({"detail": detail}).encode(), "application/json")
+
+
+class IdempotencyMiddleware:
+    # Runs inside TenantMiddleware and MetricsMiddleware: it needs the tenant
+    # and the matched route template
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+        key = None
+        for name, value in scope["headers"]:
+            if name == IDEMPOTENCY_HEADER:
+                key = value.decode().strip()
+                break
+        if not key or (scope["method"], current_route()) not in IDEMPOTENT_ROUTES:
+            await self.app(scope, receive, send)
+            return
+        owner = _caller(scope)
+        if owner is None:
+            await self.app(scope, receive, send)
+            return
+        if len(key) > MAX_KEY_LENGTH:
+            await _error(send, 400, f"Idempotency-Key must be at most {MAX_KEY_LENGTH} characters")
+            return
+
+        chunks = []
+        while True:
+            message = await receive()
+            if message["type"] == "http.disconnect":
+                return
+            chunks.append(message.get("body", b""))
+            if not message.get("more_body", False):
+                break
+        body = b"".join(chunks)
+
+        request_fingerprint = fingerprint(scope["method"], scope["path"], scope.get("query_string", b""), body)
+        deadline = time.monotonic() + IDEMPOTENCY_WAIT_SECONDS
+        while True:
+            outcome, row = await claim(owner, key, request_fingerprint)
+            if outcome == CLAIMED:
+                break
+            if outcome == MISMATCH:
+                await _error(send, 422, "Idempotency-Key was already used for a different request")
+                return
+            if outcome == DONE and not row.body_stored:
+                await _error(send, 409, f"A request with this Idempotency-Key already completed with status "
+                                        f"{row.status_code}; its response was too large to replay")
+                return
+            if outcome == DONE:
+                headers = [(name.encode(), value.encode()) for name, value in row.headers or []]
+                await _respond(send, row.status_code, row.body or b"", None,
+                               [*headers, (b"idempotent-replayed", b"true")])
+                return
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                await _error(send, 409, "A request with this Idempotency-Key is still in progress")
+                return
+            running_here = _inflight.get((owner, key))
+            if running_here is not None:
+                try:
+                    await asyncio.wait_for(running_here.wait(), remaining)
+                except asyncio.TimeoutError:
+                    pass
+            else:
+                await asyncio.sleep(min(POLL_INTERVAL, remaining))
+
+        await self._run_first(scope, receive, send, owner, key, body)
+
+    async def _run_first(self, scope, receive, send, owner, key, body):
+        finished = _inflight[(owner, key)] = asyncio.Event()
+        body_sent = False
+        start = None
+        response = []
+
+        async def replay_receive():
+            nonlocal body_sent
+            if not body_sent:
+                body_sent = True
+                return {"type": "http.request", "body": body, "more_body": False}
+            return await receive()
+
+        async def send_wrapper(message):
+            nonlocal start
+            if message["type"] == "http.response.start":
+                start = message
+            elif message["type"] == "http.response.body":
+                response.append(message.get("body", b""))
+            await send(message)
+
+        try:
+            try:
+                await self.app(scope, replay_receive, send_wrapper)
+            except BaseException:
+                await release(owner, key)
+                raise
+            content = b"".join(response)
+            if start is not None and start["status"] < 500:
+                headers = [[k.decode(), v.decode()] for k, v in start.get("headers", []) if k.lower() in REPLAYED_HEADERS]
+                await complete(owner, key, start["status"], headers,
+                               content if len(content) <= IDEMPOTENCY_MAX_BODY else None)
+            else:
+                await release(owner, key)
+        finally:
+            _inflight.pop((owner, key), None)
+            finished.set()
@@ -0,0 +1,298 @@
+import asyncio
+import importlib
+import logging
+import random
+import signal
+from datetime import datetime, timedelta, timezone
+from typing import Dict, Optional
+
+from sqlalchemy import update
+from sqlalchemy.future import select
+
+from app.config import (
+    JOB_LEASE_SECONDS,
+    JOB_POLL_INTERVAL,
+    JOB_RETRY_BASE_SECONDS,
+    JOB_RETRY_MAX_SECONDS,
+    JOB_WORKER_CONCURRENCY,
+)
+from app.database import new_session
+from app.models import Job, JobStatus
+from app.tenancy import current_tenant
+
+# Durable background jobs in Postgres. A handler enqueues a job in its own
+# transaction (so it only exists if the write it belongs to commits) and
+# returns; workers claim runnable jobs with SELECT ... FOR UPDATE SKIP LOCKED,
+# so any number of processes can work the same table without blocking each
+# other.
+#
+#   - lanes: "high", "default" and "low" map to a priority; workers always
+#     take the most urgent runnable job first
+#   - concurrency: each job type caps how many of its jobs one process runs
+#     at once, on top of JOB_WORKER_CONCURRENCY for all types
+#   - retries: a failed attempt is re-queued after an exponential, jittered
+#     delay until max_attempts; PermanentJobError fails the job right away
+#   - leases: a claimed job is leased for JOB_LEASE_SECONDS. It is cancelled
+#     when it runs longer, and re-queued by any worker if its process died
+#
+# Jobs run with the company of the request that enqueued them, so their
+# queries are tenant-scoped like the request's. Handlers are registered with
+# @job_handler in the modules listed in HANDLER_MODULES.
+
+logger = logging.getLogger(__name__)
+
+LANES = {"high": 0, "default": 5, "low": 9}
+HANDLER_MODULES = ["app.worksheets", "app.attachments"]
+# How often a worker looks for jobs whose process died mid-run
+REAP_INTERVAL = 30.0
+MAX_ERROR_LENGTH = 2000
+
+
+class PermanentJobError(Exception):
+    # Raised by handlers for failures a retry cannot fix (e.g. the row is gone)
+    pass
+
+
+class JobOutput:
+    # Return value for handlers that produce a file instead of a JSON result
+    def __init__(self, content: bytes, media_type: str, filename: Optional[str] = None):
+        self.content = content
+        self.media_type = media_type
+        self.filename = filename
+
+
+class JobType:
+    def __init__(self, name: str, handler, concurrency: int, max_attempts: int, lane: str):
+        self.name = name
+        self.handler = handler
+        self.concurrency = concurrency
+        self.max_attempts = max_attempts
+        self.lane = lane
+
+
+job_types: Dict[str, JobType] = {}
+
+
+def job_handler(name: str, concurrency: int = 1, max_attempts: int = 5, lane: str = "default"):
+    if lane not in LANES:
+        raise ValueError(f"Unknown job lane {lane!r}")
+
+    def register(handler):
+        job_types[name] = JobType(name, handler, concurrency, max_attempts, lane)
+        return handler
+    return register
+
+
+def load_handlers():
+    for module in HANDLER_MODULES:
+        importlib.import_module(module)
+
+
+def _now() -> datetime:
+    return datetime.now(timezone.utc)
+
+
+def retry_delay(attempts: int) -> float:
+    delay = min(JOB_RETRY_MAX_SECONDS, JOB_RETRY_BASE_SECONDS * 2 ** (attempts - 1))
+    # Jitter keeps jobs that failed together (e.g. a DB restart) from retrying together
+    return delay * random.uniform(0.5, 1.0)
+
+
+async def enqueue(db, type: str, payload: Optional[dict] = None, lane: Optional[str] = None,
+                  delay: float = 0, max_attempts: Optional[int] = None) -> Job:
+    # Adds the job to the caller's session; it is queued when the caller commits
+    load_handlers()
+    spec = job_types.get(type)
+    if spec is None:
+        raise ValueError(f"Unknown job type {type!r}")
+    job = Job(
+        type=type,
+        payload=payload or {},
+        priority=LANES[lane or spec.lane],
+        status=JobStatus.QUEUED,
+        attempts=0,
+        max_attempts=max_attempts or spec.max_attempts,
+        run_at=_now() + timedelta(seconds=delay),
+    )
+    db.add(job)
+    await db.flush()
+    return job
+
+
+class JobWorker:
+    def __init__(self, concurrency: int = JOB_WORKER_CONCURRENCY, poll_interval: float = JOB_POLL_INTERVAL):
+        self.concurrency = concurrency
+        self.poll_interval = poll_interval
+        self._tasks: Dict[asyncio.Task, str] = {}
+        self._wake = asyncio.Event()
+        self._stopping = False
+        self._last_reap = 0.0
+
+    def _running(self, type: str) -> int:
+        return sum(1 for t in self._tasks.values() if t == type)
+
+    async def run(self):
+        load_handlers()
+        loop = asyncio.get_running_loop()
+        while not self._stopping:
+            claimed = []
+            try:
+                if loop.time() - self._last_reap >= REAP_INTERVAL:
+                    self._last_reap = loop.time()
+                    await self._reap()
+                claimed = await self._claim()
+            except Exception:
+                logger.exception("claiming jobs failed")
+            for job in claimed:
+                task = asyncio.create_task(self._execute(job))
+                self._tasks[task] = job.type
+                task.add_done_callback(self._finished)
+            if len(claimed) == 0 or len(self._tasks) >= self.concurrency:
+                # Sleep until a slot frees up or it is time to poll again
+                self._wake.clear()
+                try:
+                    await asyncio.wait_for(self._wake.wait(), self.poll_interval)
+                except asyncio.TimeoutError:
+                    pass
+
+    def _finished(self, task):
+        self._tasks.pop(task, None)
+        self._wake.set()
+
+    async def stop(self, timeout: float = 10.0):
+        # Running jobs get `timeout` to finish; the rest go back to the queue
+        self._stopping = True
+        self._wake.set()
+        tasks = list(self._tasks)
+        if tasks:
+            _, pending = await asyncio.wait(tasks, timeout=timeout)
+            for task in pending:
+                task.cancel()
+            await asyncio.gather(*pending, return_exceptions=True)
+
+    async def _claim(self):
+        free = self.concurrency - len(self._tasks)
+        capacity = {
+            name: spec.concurrency - self._running(name)
+            for name, spec in job_types.items()
+            if spec.concurrency > self._running(name)
+        }
+        if free <= 0 or not capacity:
+            return []
+        now = _now()
+        runnable = (
+            select(Job.id)
+            .filter(Job.status == JobStatus.QUEUED, Job.run_at <= now, Job.type.in_(list(capacity)))
+            .order_by(Job.priority, Job.run_at, Job.id)
+            .limit(free)
+            .with_for_update(skip_locked=True)
+        )
+        async with new_session() as db:
+            result = await db.execute(
+                update(Job)
+                .where(Job.id.in_(runnable.scalar_subquery()))
+                .values(status=JobStatus.RUNNING, attempts=Job.attempts + 1,
+                        locked_until=now + timedelta(seconds=JOB_LEASE_SECONDS))
+                .returning(Job)
+                .execution_options(synchronize_session=False)
+            )
+            claimed, excess = [], []
+            for job in sorted(result.scalars().all(), key=lambda j: (j.priority, j.run_at, j.id)):
+                if capacity[job.type] > 0:
+                    capacity[job.type] -= 1
+                    claimed.append(job)
+                else:
+                    excess.append(job.id)
+            if excess:
+                # Over a type's limit: hand them back before anyone can see the claim
+                await db.execute(
+                    update(Job)
+                    .where(Job.id.in_(excess))
+                    .values(status=JobStatus.QUEUED, attempts=Job.attempts - 1, locked_until=None)
+                    .execution_options(synchronize_session=False)
+                )
+            await db.commit()
+        return claimed
+
+    async def _reap(self):
+        # Jobs whose lease ran out without finishing: their worker is gone
+        now = _now()
+        async with new_session() as db:
+            expired = (Job.status == JobStatus.RUNNING, Job.locked_until < now)
+            await db.execute(
+                update(Job)
+                .where(*expired, Job.attempts >= Job.max_attempts)
+                .values(status=JobStatus.FAILED, finished_at=now, locked_until=None, last_error="Lease expired")
+                .execution_options(synchronize_session=False)
+            )
+            result = await db.execute(
+                update(Job)
+                .where(*expired)
+                .values(status=JobStatus.QUEUED, locked_until=None, last_error="Lease expired")
+                .execution_options(synchronize_session=False)
+            )
+            await db.commit()
+        if result.rowcount:
+            logger.warning("re-queued %d jobs with expired leases", result.rowcount)
+
+    async def _execute(self, job: Job):
+        spec = job_types[job.type]
+        token = current_tenant.set(job.company_id)
+        try:
+            outcome = await asyncio.wait_for(spec.handler(job.payload or {}), JOB_LEASE_SECONDS)
+        except asyncio.CancelledError:
+            # Shutdown: this attempt does not count
+            await self._finish(job, status=JobStatus.QUEUED, attempts=job.attempts - 1, locked_until=None)
+            raise
+        except Exception as e:
+            error = f"{type(e).__name__}: {e}"[:MAX_ERROR_LENGTH]
+            if isinstance(e, PermanentJobError) or job.attempts >= job.max_attempts:
+                logger.error("job %s (%s) failed: %s", job.id, job.type, error)
+                await self._finish(job, status=JobStatus.FAILED, finished_at=_now(), locked_until=None, last_error=error)
+            else:
+                delay = retry_delay(job.attempts)
+                logger.warning("job %s (%s) attempt %d failed, retrying in %.0fs: %s",
+                               job.id, job.type, job.attempts, delay, error)
+                await self._finish(job, status=JobStatus.QUEUED, locked_until=None, last_error=error,
+                                   run_at=_now() + timedelta(seconds=delay))
+        else:
+            values = {"result": outcome}
+            if isinstance(outcome, JobOutput):
+                values = {
+                    "result": {"filename": outcome.filename, "size": len(outcome.content)},
+                    "output": outcome.content,
+                    "output_type": outcome.media_type,
+                }
+            await self._finish(job, status=JobStatus.SUCCEEDED, finished_at=_now(), locked_until=None,
+                               last_error=None, **values)
+        finally:
+            current_tenant.reset(token)
+
+    async def _finish(self, job: Job, **values):
+        async with new_session() as db:
+            # Only while we still hold the claim; a reaped job belongs to someone else
+            await db.execute(
+                update(Job)
+                .where(Job.id == job.id, Job.status == JobStatus.RUNNING, Job.attempts == job.attempts)
+                .values(**values)
+                .execution_options(synchronize_session=False)
+            )
+            await db.commit()
+
+
+async def main():
+    # Standalone worker: python -m app.jobs (run the app with JOBS_ENABLED=false)
+    logging.basicConfig(level=logging.INFO)
+    worker = JobWorker()
+    loop = asyncio.get_running_loop()
+    stop = asyncio.Event()
+    for sig in (signal.SIGTERM, signal.SIGINT):
+        loop.add_signal_handler(sig, stop.set)
+    runner = asyncio.create_task(worker.run())
+    await stop.wait()
+    await worker.stop()
+    await runner
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,242 @@
+import asyncio
+import contextvars
+import os
+import time
+
+from prometheus_client import CONTENT_TYPE_LATEST, CollectorRegistry, Counter, Gauge, Histogram, generate_latest, multiprocess
+from sqlalchemy import event
+from sqlalchemy.pool import AsyncAdaptedQueuePool
+from starlette.responses import Response
+from starlette.routing import Match
+
+# Prometheus metrics for HTTP latency, SQL activity per route, connection
+# pool pressure and event-loop lag. Exposed on GET /metrics.
+#
+# Under python -m app.serve every worker writes its samples to
+# PROMETHEUS_MULTIPROC_DIR and /metrics sums all workers, whichever one
+# answers the scrape. Gauges say how to combine workers (multiprocess_mode);
+# they are set explicitly, since set_function is not shared across processes.
+
+HTTP_LATENCY = Histogram(
+    "http_request_duration_seconds", "HTTP request latency", ["method", "route", "status"],
+)
+HTTP_IN_PROGRESS = Gauge(
+    "http_requests_in_progress", "HTTP requests currently being handled", ["method", "route"],
+    multiprocess_mode="livesum",
+)
+# outcome is "ok" or "error" (the statement raised, e.g. statement_timeout)
+DB_STATEMENTS = Counter(
+    "db_statements_total", "SQL statements executed", ["route", "outcome"],
+)
+DB_TIME = Counter(
+    "db_statement_seconds_total", "Time spent executing SQL statements", ["route", "outcome"],
+)
+DB_STATEMENTS_PER_REQUEST = Histogram(
+    "db_statements_per_request", "SQL statements issued by one HTTP request", ["route"],
+    buckets=(0, 1, 2, 3, 4, 5, 8, 12, 20, 50, 100),
+)
+DB_TIME_PER_REQUEST = Histogram(
+    "db_seconds_per_request", "Total SQL time of one HTTP request", ["route"],
+    buckets=(0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10),
+)
+DB_POOL_WAIT = Histogram(
+    "db_pool_checkout_wait_seconds", "Time spent waiting for a pooled connection",
+    buckets=(0.0005, 0.001, 0.005, 0.01, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30),
+)
+DB_POOL_CHECKED_OUT = Gauge(
+    "db_pool_checked_out", "Pooled connections currently checked out", multiprocess_mode="livesum",
+)
+DB_POOL_CAPACITY = Gauge("db_pool_capacity", "Pool size plus max overflow", multiprocess_mode="livesum")
+ADMISSION_LIMIT = Gauge(
+    "admission_limit", "Requests a route class may run at once", ["route_class"], multiprocess_mode="livesum",
+)
+ADMISSION_ACTIVE = Gauge(
+    "admission_active", "Requests holding an admission slot", ["route_class"], multiprocess_mode="livesum",
+)
+ADMISSION_QUEUED = Gauge(
+    "admission_queued", "Requests waiting for an admission slot", ["route_class"], multiprocess_mode="livesum",
+)
+ADMISSION_WAIT = Histogram(
+    "admission_wait_seconds", "Time spent waiting for an admission slot", ["route_class"],
+    buckets=(0.001, 0.005, 0.01, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10),
+)
+ADMISSION_REJECTED = Counter(
+    "admission_rejected_total", "Requests shed with 503", ["route_class", "reason"],
+)
+COALESCED_CALLS = Counter(
+    "coalesced_calls_total", "Calls to single-flight read routes, by whether they ran the query",
+    ["route", "outcome"],
+)
+HISTORY_EVENTS = Counter(
+    "request_history_events_total", "Request history rows, by whether they were written", ["outcome"],
+)
+HISTORY_BATCH_ROWS = Histogram(
+    "request_history_batch_rows", "Rows per request history INSERT",
+    buckets=(1, 2, 5, 10, 25, 50, 100, 250, 500, 1000),
+)
+EVENT_LOOP_LAG = Histogram(
+    "event_loop_lag_seconds", "Delay between a scheduled wake-up and when it ran",
+    buckets=(0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5),
+)
+
+# Route of the HTTP request currently running, shared with the SQL hooks
+# (contextvars follow SQLAlchemy's greenlets and asyncio.gather tasks).
+_current_request = contextvars.ContextVar("metrics_request", default=None)
+
+
+class _RequestStats:
+    __slots__ = ("route", "endpoint", "statements", "db_time")
+
+    def __init__(self, route: str, endpoint=None):
+        self.route = route
+        self.endpoint = endpoint
+        self.statements = 0
+        self.db_time = 0.0
+
+
+def flatten_routes(routes):
+    for route in routes:
+        # Newer FastAPI keeps included routers nested instead of copying their routes
+        included = getattr(route, "original_router", None)
+        if included is not None:
+            yield from flatten_routes(included.routes)
+        else:
+            yield route
+
+
+def _match_route(routes, scope):
+    # Label by path template ("/requests/{request_id}") to keep cardinality bounded
+    partial = None
+    for route in routes:
+        match, _ = route.matches(scope)
+        if match == Match.FULL:
+            return route.path, getattr(route, "endpoint", None)
+        if match == Match.PARTIAL and partial is None:
+            partial = route.path
+    return partial or "unmatched", None
+
+
+class MetricsMiddleware:
+    # Plain ASGI middleware (no BaseHTTPMiddleware) so streaming responses pass through
+
+    def __init__(self, app):
+        self.app = app
+        self._routes = None
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        if self._routes is None:
+            self._routes = list(flatten_routes(scope["app"].routes))
+        method = scope["method"]
+        stats = _RequestStats(*_match_route(self._routes, scope))
+        token = _current_request.set(stats)
+        in_progress = HTTP_IN_PROGRESS.labels(method, stats.route)
+        in_progress.inc()
+        status = 500
+        start = time.perf_counter()
+
+        async def send_wrapper(message):
+            nonlocal status
+            if message["type"] == "http.response.start":
+                status = message["status"]
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_wrapper)
+        finally:
+            in_progress.dec()
+            _current_request.reset(token)
+            HTTP_LATENCY.labels(method, stats.route, f"{status // 100}xx").observe(time.perf_counter() - start)
+            DB_STATEMENTS_PER_REQUEST.labels(stats.route).observe(stats.statements)
+            DB_TIME_PER_REQUEST.labels(stats.route).observe(stats.db_time)
+
+
+def current_route() -> str:
+    stats = _current_request.get()
+    return stats.route if stats is not None else "background"
+
+
+def current_endpoint():
+    stats = _current_request.get()
+    return stats.endpoint if stats is not None else None
+
+
+class InstrumentedPool(AsyncAdaptedQueuePool):
+    # Times how long callers wait for a connection
+
+    def _do_get(self):
+        start = time.perf_counter()
+        try:
+            return super()._do_get()
+        finally:
+            DB_POOL_WAIT.observe(time.perf_counter() - start)
+
+
+def instrument_engine(engine):
+    sync_engine = engine.sync_engine
+
+    @event.listens_for(sync_engine, "before_cursor_execute")
+    def before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+        conn.info.setdefault("metrics_query_start", []).append(time.perf_counter())
+
+    def observe(started: float, outcome: str):
+        elapsed = time.perf_counter() - started
+        stats = _current_request.get()
+        route = current_route()
+        if stats is not None:
+            stats.statements += 1
+            stats.db_time += elapsed
+        DB_STATEMENTS.labels(route, outcome).inc()
+        DB_TIME.labels(route, outcome).inc(elapsed)
+
+    @event.listens_for(sync_engine, "after_cursor_execute")
+    def after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+        observe(conn.info["metrics_query_start"].pop(), "ok")
+
+    @event.listens_for(sync_engine, "handle_error")
+    def handle_error(context):
+        # after_cursor_execute never fires for a statement that raised
+        starts = context.connection.info.get("metrics_query_start") if context.connection is not None else None
+        if starts:
+            observe(starts.pop(), "error")
+
+    pool = sync_engine.pool
+    if hasattr(pool, "checkedout"):
+        DB_POOL_CAPACITY.set(pool.size() + max(pool._max_overflow, 0))
+
+        @event.listens_for(pool, "checkout")
+        def on_checkout(dbapi_connection, connection_record, connection_proxy):
+            DB_POOL_CHECKED_OUT.inc()
+
+        @event.listens_for(pool, "checkin")
+        def on_checkin(dbapi_connection, connection_record):
+            DB_POOL_CHECKED_OUT.dec()
+
+
+_last_loop_lag = 0.0
+
+
+def event_loop_lag() -> float:
+    # Most recent lag sample, for the health endpoints
+    return _last_loop_lag
+
+
+async def monitor_event_loop_lag(interval: float = 0.5):
+    global _last_loop_lag
+    loop = asyncio.get_running_loop()
+    while True:
+        start = loop.time()
+        await asyncio.sleep(interval)
+        _last_loop_lag = max(loop.time() - start - interval, 0.0)
+        EVENT_LOOP_LAG.observe(_last_loop_lag)
+
+
+def metrics_response() -> Response:
+    if "PROMETHEUS_MULTIPROC_DIR" in os.environ:
+        registry = CollectorRegistry()
+        multiprocess.MultiProcessCollector(registry)
+        return Response(generate_latest(registry), media_type=CONTENT_TYPE_LATEST)
+    return Response(generate_latest(), media_type=CONTENT_TYPE_LATEST)
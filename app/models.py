@@ -1,8 +1,41 @@
-from sqlalchemy import Column, Integer, String, ForeignKey, Date, Enum, Float, Text
-from sqlalchemy.orm import relationship
+from sqlalchemy import Column, Computed, UniqueConstraint, Integer, BigInteger, Boolean, String, ForeignKey, Date, DateTime, Enum, JSON, LargeBinary, Float, Text, Sequence, DDL, Index, PrimaryKeyConstraint, event, false, func, text
+from sqlalchemy.dialects.postgresql import TSRANGE
+from sqlalchemy.orm import deferred, relationship, synonym
 from app.database import Base
 import enum
 
+# Relationships use lazy="raise": routes load what they serialize explicitly
+# (see app/expand.py), so a forgotten eager load fails loudly instead of
+# issuing hidden queries.
+
+# Multi-company deployments scope every query by the company column (see
+# app/tenancy.py). Each scoped model exposes it as `tenant_key`, and
+# composite indexes lead with it so one company's queries never walk
+# another's rows. Names, serials and codes are unique per company (NULL, the
+# company-less install, counts as one company); emails stay global because
+# login looks users up across companies.
+
+# Global change sequence for delta sync (/sync/changes): every insert/update of a
+# synced row and every deletion tombstone takes the next value, and records the
+# id of the transaction that wrote it (txid).
+sync_version_seq = Sequence("sync_version_seq", metadata=Base.metadata)
+
+def sync_version_column():
+    return Column(
+        BigInteger,
+        server_default=sync_version_seq.next_value(),
+        onupdate=sync_version_seq.next_value(),
+        index=True,
+    )
+
+def sync_txid_column():
+    return Column(
+        BigInteger,
+        server_default=text("pg_current_xact_id()::text::bigint"),
+        onupdate=func.pg_current_xact_id().cast(Text).cast(BigInteger),
+        nullable=False,
+    )
+
 class MaintenanceType(str, enum.Enum):
     CORRECTIVE = "Corrective"
     PREVENTIVE = "Preventive"
@@ -30,49 +63,72 @@ class MaintenanceFor(str, enum.Enum):
 
 class Category(Base):
     __tablename__ = "categories"
+    __table_args__ = (
+        Index("ix_categories_company_name_name", "company_name", "name"),
+        UniqueConstraint("company_name", "name", name="uq_categories_company_name_name", postgresql_nulls_not_distinct=True),
+    )
 
     id = Column(Integer, primary_key=True, index=True)
-    name = Column(String, unique=True, index=True)
+    name = Column(String, index=True)
     responsible_id = Column(Integer, ForeignKey("users.id"), nullable=True)
     company_name = Column(String, default="My Company (San Francisco)")
+    tenant_key = synonym("company_name")
     
-    equipments = relationship("Equipment", back_populates="category")
-    responsible = relationship("User", foreign_keys=[responsible_id])
+    equipments = relationship("Equipment", back_populates="category", lazy="raise")
+    responsible = relationship("User", foreign_keys=[responsible_id], lazy="raise")
 
 
 class Team(Base):
     __tablename__ = "teams"
+    __table_args__ = (
+        Index("ix_teams_company_id_name", "company_id", "name"),
+        UniqueConstraint("company_id", "name", name="uq_teams_company_id_name", postgresql_nulls_not_distinct=True),
+    )
 
     id = Column(Integer, primary_key=True, index=True)
-    name = Column(String, unique=True, index=True)
+    name = Column(String, index=True)
+    company_id = Column(String, nullable=True)
+    tenant_key = synonym("company_id")
     
-    equipments = relationship("Equipment", back_populates="team")
-    requests = relationship("MaintenanceRequest", back_populates="team")
-    users = relationship("User", back_populates="team", lazy="selectin")
+    equipments = relationship("Equipment", back_populates="team", lazy="raise")
+    requests = relationship("MaintenanceRequest", back_populates="team", lazy="raise")
+    users = relationship("User", back_populates="team", lazy="raise")
 
 
 class WorkCenter(Base):
     __tablename__ = "workcenters"
+    __table_args__ = (
+        Index("ix_workcenters_company_id_name", "company_id", "name"),
+        UniqueConstraint("company_id", "code", name="uq_workcenters_company_id_code", postgresql_nulls_not_distinct=True),
+    )
 
     id = Column(Integer, primary_key=True, index=True)
     name = Column(String, index=True)
-    code = Column(String, unique=True, index=True)
+    code = Column(String, index=True)
+    company_id = Column(String, nullable=True)
+    tenant_key = synonym("company_id")
     resource_calendar_id = Column(Integer, nullable=True) # Placeholder ID
     capacity = Column(Float, default=1.0)
     time_efficiency = Column(Float, default=100.0)
     oee_target = Column(Float, default=85.0)
 
     # Relationships
-    equipments = relationship("Equipment", back_populates="work_center")
-    requests = relationship("MaintenanceRequest", back_populates="work_center")
+    equipments = relationship("Equipment", back_populates="work_center", lazy="raise")
+    requests = relationship("MaintenanceRequest", back_populates="work_center", lazy="raise")
 
 
 class Equipment(Base):
     __tablename__ = "equipments"
+    __table_args__ = (
+        Index("ix_equipments_company_name_name", "company_name", "name"),
+        # Delta sync: WHERE company_name = :tenant AND (txid, version) > :token ORDER BY txid, version
+        Index("ix_equipments_company_name_txid_version", "company_name", "txid", "version"),
+        UniqueConstraint("company_name", "serial_number", name="uq_equipments_company_name_serial_number", postgresql_nulls_not_distinct=True),
+    )
 
     id = Column(Integer, primary_key=True, index=True)
     name = Column(String, index=True)
-    serial_number = Column(String, unique=True, index=True)
+    serial_number = Column(String, index=True)
     department = Column(String)
     default_technician_id = Column(Integer, ForeignKey("users.id"), nullable=True) # Now Integer FK
     status = Column(Enum(EquipmentStatus, values_callable=lambda obj: [e.value for e in obj]), default=EquipmentStatus.ACTIVE)
@@ -85,25 +141,47 @@ class Equipment(Base):
     warranty_date = Column(Date, nullable=True)
     location = Column(String, nullable=True)
     company_name = Column(String, nullable=True)
+    tenant_key = synonym("company_name")
     
     category_id = Column(Integer, ForeignKey("categories.id"))
     team_id = Column(Integer, ForeignKey("teams.id"))
     work_center_id = Column(Integer, ForeignKey("workcenters.id"), nullable=True)
+    version = sync_version_column()
+    txid = sync_txid_column()
     
-    category = relationship("Category", back_populates="equipments")
-    team = relationship("Team", back_populates="equipments")
-    work_center = relationship("WorkCenter", back_populates="equipments")
-    requests = relationship("MaintenanceRequest", back_populates="equipment")
+    category = relationship("Category", back_populates="equipments", lazy="raise")
+    team = relationship("Team", back_populates="equipments", lazy="raise")
+    work_center = relationship("WorkCenter", back_populates="equipments", lazy="raise")
+    requests = relationship("MaintenanceRequest", back_populates="equipment", lazy="raise")
     
     # User Relationships
-    default_technician = relationship("User", foreign_keys=[default_technician_id])
-    employee = relationship("User", foreign_keys=[employee_id])
+    default_technician = relationship("User", foreign_keys=[default_technician_id], lazy="raise")
+    employee = relationship("User", foreign_keys=[employee_id], lazy="raise")
 
 
 class MaintenanceRequest(Base):
     __tablename__ = "maintenance_requests"
+    # Hot/cold split (see app/archive.py): on Postgres the table is LIST-partitioned
+    # on `archived`, so queries filtering archived = false only scan the hot partition.
+    # A partitioned table's primary key must include the partition key; the ORM
+    # still identifies rows by id alone.
+    __table_args__ = (
+        PrimaryKeyConstraint("id", "archived"),
+        # Kanban / dashboard counters, equipment history, delta sync
+        Index("ix_maintenance_requests_company_id_stage", "company_id", "stage"),
+        Index("ix_maintenance_requests_company_id_equipment_id", "company_id", "equipment_id"),
+        Index("ix_maintenance_requests_company_id_txid_version", "company_id", "txid", "version"),
+        # Overlapping bookings of open requests (app/schedule.py)
+        Index(
+            "ix_maintenance_requests_schedule_window", "schedule_window",
+            postgresql_using="gist",
+            postgresql_where=text("stage IN ('NEW_REQUEST', 'IN_PROGRESS')"),
+        ),
+        {"postgresql_partition_by": "LIST (archived)"},
+    )
 
-    id = Column(Integer, primary_key=True, index=True)
+    id = Column(Integer, autoincrement=True, index=True)
+    archived = Column(Boolean, nullable=False, default=False, server_default=false())
     subject = Column(String, index=True)
     request_date = Column(Date)
     scheduled_date = Column(Date)
@@ -113,6 +191,7 @@ class MaintenanceRequest(Base):
     maintenance_type = Column(Enum(MaintenanceType), default=MaintenanceType.CORRECTIVE)
     priority = Column(Enum(Priority), default=Priority.LOW)
     stage = Column(Enum(RequestStage), default=RequestStage.NEW_REQUEST)
+    closed_at = Column(DateTime(timezone=True), nullable=True)  # entered Repaired / Scrap (app/archive.py)
 
     description = Column(Text)
 
@@ -125,16 +204,38 @@ class MaintenanceRequest(Base):
     team_id = Column(Integer, ForeignKey("teams.id"))
     category_id = Column(Integer, ForeignKey("categories.id"))
     company_id = Column(String, nullable=True) # Placeholder for Company Name/ID
+    tenant_key = synonym("company_id")
 
     created_by_id = Column(Integer, ForeignKey("users.id"), nullable=True) # Creator of the request
+    version = sync_version_column()
+    txid = sync_txid_column()
+    # [scheduled_date, + duration hours); empty without a duration, NULL
+    # without a date (tsrange(NULL, NULL) would be unbounded and overlap
+    # everything). Only queried by app/schedule.py, never loaded with the row.
+    schedule_window = deferred(Column(TSRANGE, Computed(
+        "CASE WHEN scheduled_date IS NULL THEN NULL ELSE tsrange(scheduled_date::timestamp, "
+        "scheduled_date::timestamp + greatest(coalesce(duration, 0), 0) * interval '1 hour') END",
+        persisted=True,
+    )), raiseload=True)
 
-    equipment = relationship("Equipment", back_populates="requests")
-    work_center = relationship("WorkCenter", back_populates="requests")
-    team = relationship("Team", back_populates="requests")
-    category = relationship("Category") 
+    equipment = relationship("Equipment", back_populates="requests", lazy="raise")
+    work_center = relationship("WorkCenter", back_populates="requests", lazy="raise")
+    team = relationship("Team", back_populates="requests", lazy="raise")
+    category = relationship("Category", lazy="raise") 
     
-    technician = relationship("User", foreign_keys=[technician_id])
-    created_by = relationship("User", foreign_keys=[created_by_id])
+    technician = relationship("User", foreign_keys=[technician_id], lazy="raise")
+    created_by = relationship("User", foreign_keys=[created_by_id], lazy="raise")
+
+    __mapper_args__ = {"primary_key": [id]}
+
+for _partition, _archived in (("maintenance_requests_hot", "false"), ("maintenance_requests_cold", "true")):
+    event.listen(
+        MaintenanceRequest.__table__,
+        "after_create",
+        DDL(f"CREATE TABLE {_partition} PARTITION OF maintenance_requests FOR VALUES IN ({_archived})").execute_if(
+            dialect="postgresql"
+        ),
+    )
 
 
 class UserRole(str, enum.Enum):
@@ -145,14 +246,140 @@ class UserRole(str, enum.Enum):
 
 class User(Base):
     __tablename__ = "users"
+    __table_args__ = (
+        Index("ix_users_company_id_role", "company_id", "role"),
+    )
 
     id = Column(Integer, primary_key=True, index=True)
     email = Column(String, unique=True, index=True)
     name = Column(String)
     hashed_password = Column(String)
     role = Column(Enum(UserRole), default=UserRole.USER)
+    # Tenant of everything this user sees; issued as the JWT "tenant" claim
+    company_id = Column(String, nullable=True)
+    tenant_key = synonym("company_id")
     
     team_id = Column(Integer, ForeignKey("teams.id"), nullable=True)
     
-    team = relationship("Team", back_populates="users")
- 
+    team = relationship("Team", back_populates="users", lazy="raise")
+
+
+class SyncTombstone(Base):
+    # Deleted synced rows, so delta sync clients can drop them locally
+    __tablename__ = "sync_tombstones"
+    __table_args__ = (
+        Index("ix_sync_tombstones_company_id_txid_version", "company_id", "txid", "version"),
+    )
+
+    id = Column(Integer, primary_key=True)
+    entity = Column(String, nullable=False)  # "equipments" / "requests"
+    entity_id = Column(Integer, nullable=False)
+    company_id = Column(String, nullable=True)
+    tenant_key = synonym("company_id")
+    version = sync_version_column()
+    txid = sync_txid_column()
+
+
+class RequestEvent(Base):
+    # Append-only change history of maintenance requests (app/history.py).
+    # No foreign key: the partitioned requests table is keyed by (id, archived),
+    # and history outlives the request.
+    __tablename__ = "request_events"
+    __table_args__ = (
+        # A request's timeline, oldest first
+        Index("ix_request_events_request_id_ts", "request_id", "ts"),
+    )
+
+    id = Column(BigInteger, primary_key=True)
+    request_id = Column(Integer, nullable=False)
+    ts = Column(DateTime(timezone=True), nullable=False)
+    field = Column(String, nullable=False)  # "stage" / "technician_id" / "priority"
+    old_value = Column(String, nullable=True)  # None when the request was created
+    new_value = Column(String, nullable=True)
+    actor_id = Column(Integer, nullable=True)  # user who made the change, if known
+    company_id = Column(String, nullable=True)
+    tenant_key = synonym("company_id")
+
+
+class AttachmentBlob(Base):
+    # Stored attachment content, one row per distinct SHA-256 (app/attachments.py).
+    # Identical files uploaded again, by anyone, share the object.
+    __tablename__ = "attachment_blobs"
+
+    sha256 = Column(String(64), primary_key=True)
+    size = Column(BigInteger, nullable=False)
+    thumbnail_key = Column(String, nullable=True)  # set once the thumbnail job has run
+    created_at = Column(DateTime(timezone=True), nullable=False, server_default=func.now())
+
+
+class Attachment(Base):
+    # A file attached to a maintenance request (no FK, see RequestEvent)
+    __tablename__ = "attachments"
+    __table_args__ = (
+        Index("ix_attachments_company_id_request_id", "company_id", "request_id"),
+    )
+
+    id = Column(Integer, primary_key=True)
+    request_id = Column(Integer, nullable=False)
+    sha256 = Column(String(64), ForeignKey("attachment_blobs.sha256"), nullable=False)
+    filename = Column(String, nullable=False)
+    content_type = Column(String, nullable=False)
+    size = Column(BigInteger, nullable=False)
+    uploaded_by_id = Column(Integer, ForeignKey("users.id"), nullable=True)
+    created_at = Column(DateTime(timezone=True), nullable=False, server_default=func.now())
+    company_id = Column(String, nullable=True)
+    tenant_key = synonym("company_id")
+
+    blob = relationship("AttachmentBlob", lazy="raise")
+
+
+class IdempotencyKey(Base):
+    # Stored responses of writes sent with an Idempotency-Key (app/idempotency.py)
+    __tablename__ = "idempotency_keys"
+
+    scope = Column(String, primary_key=True)  # "<tenant>:<user>", keys are per caller
+    key = Column(String(255), primary_key=True)
+    fingerprint = Column(String(64), nullable=False)  # sha256 of method, path and body
+    status_code = Column(Integer, nullable=True)  # NULL while the first request runs
+    headers = Column(JSON, nullable=True)  # [[name, value], ...] of REPLAYED_HEADERS
+    body = Column(LargeBinary, nullable=True)
+    # False when the response was over IDEMPOTENCY_MAX_BODY: retries get 409
+    body_stored = Column(Boolean, nullable=False, default=True)
+    locked_until = Column(DateTime(timezone=True), nullable=False)
+    expires_at = Column(DateTime(timezone=True), nullable=False, index=True)
+
+
+class JobStatus(str, enum.Enum):
+    QUEUED = "queued"
+    RUNNING = "running"
+    SUCCEEDED = "succeeded"
+    FAILED = "failed"
+
+
+class Job(Base):
+    # Background work enqueued by request handlers (app/jobs.py)
+    __tablename__ = "jobs"
+    __table_args__ = (
+        # Workers claim the next runnable job in lane order from this index alone
+        Index("ix_jobs_runnable", "priority", "run_at", "id", postgresql_where=text("status = 'QUEUED'")),
+        Index("ix_jobs_company_id_id", "company_id", "id"),
+    )
+
+    id = Column(BigInteger, primary_key=True)
+    type = Column(String, nullable=False)
+    payload = Column(JSON, nullable=False, default=dict)
+    priority = Column(Integer, nullable=False, default=5)  # lane, lower runs first
+    status = Column(Enum(JobStatus), nullable=False, default=JobStatus.QUEUED, index=True)
+    attempts = Column(Integer, nullable=False, default=0)
+    max_attempts = Column(Integer, nullable=False, default=5)
+    run_at = Column(DateTime(timezone=True), nullable=False, server_default=func.now())
+    locked_until = Column(DateTime(timezone=True), nullable=True)  # lease of the running worker
+    last_error = Column(Text, nullable=True)
+    result = Column(JSON, nullable=True)
+    # Files produced by the job (PDFs, exports); only loaded by GET /jobs/{id}/output
+    output = deferred(Column(LargeBinary, nullable=True), raiseload=True)
+    output_type = Column(String, nullable=True)
+    created_at = Column(DateTime(timezone=True), nullable=False, server_default=func.now())
+    finished_at = Column(DateTime(timezone=True), nullable=True)
+    company_id = Column(String, nullable=True)
+    tenant_key = synonym("company_id")
@@ -0,0 +1,250 @@
+import asyncio
+import contextvars
+import json
+import os
+import random
+import re
+import signal
+import sys
+import time
+import uuid
+from collections import Counter
+from datetime import datetime
+
+from jose import JWTError, jwt
+from sqlalchemy import event
+
+from app.auth_utils import ALGORITHM, SECRET_KEY
+from app.config import PROFILE_DIR, PROFILE_INTERVAL_MS, PROFILE_MAX_FILES, PROFILE_SAMPLE_RATE
+
+# Per-request sampling profiler. Only installed when PROFILING_ENABLED is set;
+# otherwise neither the middleware nor the SQL hooks exist.
+#
+# An admin triggers it with "X-Profile: store|inline" (or ?_profile=...).
+# "store" writes the profile to PROFILE_DIR and returns its name in the
+# X-Profile-Id header; "inline" replaces the response body with the profile.
+# PROFILE_SAMPLE_RATE additionally stores a random fraction of all requests.
+#
+# Sampling uses a SIGALRM interval timer: the handler runs on the event loop
+# thread inside whatever task is executing, so the contextvar tells whether
+# the interrupted code belongs to the profiled request (including SQLAlchemy
+# greenlets). The timer is process-wide, so one request is profiled at a time.
+
+PROFILE_HEADER = b"x-profile"
+PROFILE_QUERY = re.compile(rb"(?:^|&)_profile=(store|inline)(?:&|$)")
+MAX_DEPTH = 256
+
+# Frame labels drop the sys.path prefix, longest match first
+_PATH_PREFIXES = sorted({os.getcwd() + os.sep, *(p + os.sep for p in sys.path if p)}, key=len, reverse=True)
+
+_active_profile = contextvars.ContextVar("active_profile", default=None)
+_running = None
+
+
+class RequestProfile:
+    def __init__(self, method: str, path: str, mode: str):
+        self.id = f"{datetime.utcnow():%Y%m%dT%H%M%S}-{uuid.uuid4().hex[:8]}"
+        self.method = method
+        self.path = path
+        self.mode = mode
+        self.stacks = Counter()
+        self.samples = 0
+        self.statements = []
+        self.status = None
+        self.started = time.perf_counter()
+        self.duration = 0.0
+        self._labels = {}
+
+    def _label(self, code) -> str:
+        label = self._labels.get(code)
+        if label is None:
+            filename = code.co_filename
+            for prefix in _PATH_PREFIXES:
+                if filename.startswith(prefix):
+                    filename = filename[len(prefix):]
+                    break
+            name = getattr(code, "co_qualname", code.co_name)
+            label = self._labels[code] = f"{name} ({filename}:{code.co_firstlineno})".replace(";", ":")
+        return label
+
+    def sample(self, frame):
+        stack = []
+        while frame is not None and len(stack) < MAX_DEPTH:
+            stack.append(self._label(frame.f_code))
+            frame = frame.f_back
+        stack.reverse()
+        self.stacks[tuple(stack)] += 1
+        self.samples += 1
+
+    def folded(self) -> str:
+        # Brendan Gregg's collapsed format (flamegraph.pl, speedscope, inferno).
+        # SQL time is added as synthetic "SQL;<statement>" stacks weighted in
+        # sample units, so slow queries show up next to the Python frames.
+        lines = [f"{';'.join(stack)} {count}" for stack, count in self.stacks.items()]
+        interval = PROFILE_INTERVAL_MS / 1000
+        sql = Counter()
+        for stmt in self.statements:
+            sql[" ".join(stmt["statement"].split())[:200].replace(";", ":")] += stmt["duration_ms"] / 1000
+        for statement, seconds in sql.items():
+            weight = max(1, round(seconds / interval))
+            lines.append(f"{self.method} {self.path};SQL;{statement} {weight}")
+        return "\n".join(lines) + "\n"
+
+    def to_dict(self) -> dict:
+        return {
+            "id": self.id,
+            "method": self.method,
+            "path": self.path,
+            "status": self.status,
+            "duration_ms": round(self.duration * 1000, 3),
+            "interval_ms": PROFILE_INTERVAL_MS,
+            "samples": self.samples,
+            "sql_count": len(self.statements),
+            "sql_time_ms": round(sum(s["duration_ms"] for s in self.statements), 3),
+            "sql": self.statements,
+            "folded": self.folded(),
+        }
+
+
+def _on_alarm(signum, frame):
+    profile = _active_profile.get()
+    if profile is not None:
+        profile.sample(frame)
+
+
+def _requested_mode(scope) -> str:
+    mode = None
+    for name, value in scope["headers"]:
+        if name == PROFILE_HEADER:
+            mode = value.decode().strip().lower()
+            break
+    if mode is None:
+        match = PROFILE_QUERY.search(scope.get("query_string", b""))
+        if match is None:
+            return None
+        mode = match.group(1).decode()
+    if mode not in ("store", "inline"):
+        return None
+    # Only admin tokens may turn profiling on; anyone else gets a normal response
+    for name, value in scope["headers"]:
+        if name == b"authorization":
+            scheme, _, token = value.decode().partition(" ")
+            if scheme.lower() != "bearer":
+                return None
+            try:
+                payload = jwt.decode(token, SECRET_KEY, algorithms=[ALGORITHM])
+            except JWTError:
+                return None
+            return mode if payload.get("role") == "Admin" else None
+    return None
+
+
+def _write(profile: RequestProfile):
+    os.makedirs(PROFILE_DIR, exist_ok=True)
+    with open(os.path.join(PROFILE_DIR, f"{profile.id}.json"), "w") as f:
+        json.dump(profile.to_dict(), f)
+    # Rotation: names start with a timestamp, so the oldest sort first
+    files = sorted(n for n in os.listdir(PROFILE_DIR) if n.endswith(".json"))
+    for name in files[:max(0, len(files) - PROFILE_MAX_FILES)]:
+        try:
+            os.remove(os.path.join(PROFILE_DIR, name))
+        except FileNotFoundError:
+            pass
+
+
+def list_profiles():
+    if not os.path.isdir(PROFILE_DIR):
+        return []
+    return sorted((n[:-5] for n in os.listdir(PROFILE_DIR) if n.endswith(".json")), reverse=True)
+
+
+def load_profile(profile_id: str):
+    if not re.fullmatch(r"[0-9T]+-[0-9a-f]+", profile_id):
+        return None
+    path = os.path.join(PROFILE_DIR, f"{profile_id}.json")
+    if not os.path.exists(path):
+        return None
+    with open(path) as f:
+        return json.load(f)
+
+
+class ProfilingMiddleware:
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        global _running
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        mode = _requested_mode(scope)
+        if mode is None and PROFILE_SAMPLE_RATE and random.random() < PROFILE_SAMPLE_RATE:
+            mode = "store"
+        if mode is None or _running is not None:
+            await self.app(scope, receive, send)
+            return
+
+        profile = RequestProfile(scope["method"], scope["path"], mode)
+        try:
+            previous_handler = signal.signal(signal.SIGALRM, _on_alarm)
+        except ValueError:
+            # Not on the main thread (e.g. some test harnesses): serve unprofiled
+            await self.app(scope, receive, send)
+            return
+
+        _running = profile
+        token = _active_profile.set(profile)
+
+        async def send_wrapper(message):
+            if message["type"] == "http.response.start":
+                profile.status = message["status"]
+                if mode == "store":
+                    message = {**message, "headers": [*message.get("headers", []), (b"x-profile-id", profile.id.encode())]}
+            if mode == "inline":
+                # The profile replaces the endpoint's own response
+                return
+            await send(message)
+
+        interval = PROFILE_INTERVAL_MS / 1000
+        profile.started = time.perf_counter()
+        signal.setitimer(signal.ITIMER_REAL, interval, interval)
+        try:
+            await self.app(scope, receive, send_wrapper)
+        finally:
+            signal.setitimer(signal.ITIMER_REAL, 0)
+            signal.signal(signal.SIGALRM, previous_handler)
+            profile.duration = time.perf_counter() - profile.started
+            _active_profile.reset(token)
+            _running = None
+
+        if mode == "inline":
+            body = json.dumps(profile.to_dict()).encode()
+            await send({
+                "type": "http.response.start",
+                "status": 200,
+                "headers": [(b"content-type", b"application/json"), (b"content-length", str(len(body)).encode())],
+            })
+            await send({"type": "http.response.body", "body": body})
+        else:
+            await asyncio.to_thread(_write, profile)
+
+
+def instrument_engine(engine):
+    sync_engine = engine.sync_engine
+
+    @event.listens_for(sync_engine, "before_cursor_execute")
+    def before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+        if _active_profile.get() is not None:
+            conn.info["profile_query_start"] = time.perf_counter()
+
+    @event.listens_for(sync_engine, "after_cursor_execute")
+    def after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+        profile = _active_profile.get()
+        start = conn.info.pop("profile_query_start", None)
+        if profile is not None and start is not None:
+            profile.statements.append({
+                "statement": statement,
+                "duration_ms": round((time.perf_counter() - start) * 1000, 3),
+                "offset_ms": round((start - profile.started) * 1000, 3),
+            })
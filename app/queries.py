@@ -0,0 +1,99 @@
+from functools import lru_cache
+
+from sqlalchemy import and_, bindparam, func
+from sqlalchemy.future import select
+
+from app import tenancy
+from app.archive import HOT_REQUESTS
+from app.models import Equipment, MaintenanceRequest, MaintenanceType, RequestStage, User
+
+# Prebuilt statements for the hottest queries. A select() built per call costs
+# more Python than the query itself takes in Postgres: constructing it, the
+# tenant loader criteria added in do_orm_execute, and deriving its cache key.
+# These are built once with bind parameters, so executing one reuses the
+# memoized cache key, the compiled SQL in the engine's compiled cache
+# (SQL_COMPILED_CACHE_SIZE) and asyncpg's prepared statement for the
+# connection (ASYNCPG_STATEMENT_CACHE_SIZE).
+#
+# They skip the tenant filter of app/tenancy.py; instead, the "scoped" variant
+# of each statement carries the tenant predicate itself as the :tenant
+# parameter. execute() picks the variant for the current request. Eager loads
+# (?expand=) of a scoped statement still get the regular tenant criteria.
+
+ACTIVE_STAGES = [RequestStage.NEW_REQUEST, RequestStage.IN_PROGRESS]
+PREBUILT = {"skip_tenant_filter": True}
+SCOPED = {"skip_tenant_filter": tenancy.SKIP_STATEMENT}
+
+
+def _tenant(model):
+    return model.tenant_key == bindparam("tenant")
+
+
+async def execute(db, statement, params: dict):
+    # `statement` is one of the builders below, called as statement(scoped)
+    tenant = tenancy.current_tenant.get()
+    if tenant is None:
+        return await db.execute(statement(False), params, execution_options=PREBUILT)
+    # NO_TENANT binds NULL: "company = NULL" matches nothing
+    params = {**params, "tenant": None if tenant is tenancy.NO_TENANT else tenant}
+    return await db.execute(statement(True), params, execution_options=SCOPED)
+
+
+# Login and token checks look users up across all companies; run with PREBUILT
+USER_BY_EMAIL = select(User).where(User.email == bindparam("email"))
+
+
+@lru_cache(maxsize=64)
+def request_by_id(spec, expand: frozenset):
+    # One statement per ?expand= combination of the route's ExpandSpec
+    options = spec.options(expand)
+
+    @lru_cache(maxsize=None)
+    def build(scoped: bool):
+        statement = select(MaintenanceRequest).options(*options).filter(MaintenanceRequest.id == bindparam("request_id"))
+        return statement.filter(_tenant(MaintenanceRequest)) if scoped else statement
+    return build
+
+
+@lru_cache(maxsize=None)
+def equipment_maintenance_count(scoped: bool):
+    # Single-id form of equipment._maintenance_counts
+    on = MaintenanceRequest.equipment_id == Equipment.id
+    statement = select(
+        Equipment.id,
+        func.count(MaintenanceRequest.id),
+        func.count(MaintenanceRequest.id).filter(MaintenanceRequest.stage.in_(ACTIVE_STAGES)),
+    )
+    if scoped:
+        statement = statement.outerjoin(MaintenanceRequest, and_(on, _tenant(MaintenanceRequest))).filter(_tenant(Equipment))
+    else:
+        statement = statement.outerjoin(MaintenanceRequest, on)
+    return statement.filter(Equipment.id == bindparam("equipment_id")).group_by(Equipment.id)
+
+
+def _open_requests(scoped: bool, *criteria):
+    statement = select(func.count(MaintenanceRequest.id)).filter(HOT_REQUESTS, *criteria)
+    return statement.filter(_tenant(MaintenanceRequest)) if scoped else statement
+
+
+@lru_cache(maxsize=None)
+def critical_equipment_count(scoped: bool):
+    return _open_requests(
+        scoped,
+        MaintenanceRequest.maintenance_type == MaintenanceType.CORRECTIVE,
+        MaintenanceRequest.stage.in_(ACTIVE_STAGES),
+    ).with_only_columns(func.count(func.distinct(MaintenanceRequest.equipment_id)))
+
+
+@lru_cache(maxsize=None)
+def open_request_count(scoped: bool):
+    return _open_requests(scoped, MaintenanceRequest.stage.in_(ACTIVE_STAGES))
+
+
+@lru_cache(maxsize=None)
+def overdue_request_count(scoped: bool):
+    return _open_requests(
+        scoped,
+        MaintenanceRequest.scheduled_date < bindparam("today", type_=MaintenanceRequest.scheduled_date.type),
+        MaintenanceRequest.stage.notin_([RequestStage.REPAIRED, RequestStage.SCRAP]),
+    )
@@ -0,0 +1,57 @@
+from fastapi import APIRouter, Depends, HTTPException, Query, status
+from fastapi.responses import PlainTextResponse
+from sqlalchemy import func
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.future import select
+
+from app.auth_utils import require_admin
+from app.database import get_db
+from app.models import Job, JobStatus
+from app.profiling import list_profiles, load_profile
+from app.slow_queries import slow_query_log
+
+router = APIRouter(prefix="/admin", dependencies=[Depends(require_admin)])
+
+@router.get("/profiles")
+async def read_profiles():
+    return list_profiles()
+
+@router.get("/profiles/{profile_id}")
+async def read_profile(profile_id: str, format: str = "json"):
+    profile = load_profile(profile_id)
+    if profile is None:
+        raise HTTPException(status_code=404, detail="Profile not found")
+    if format == "folded":
+        # Feed straight into flamegraph.pl or speedscope
+        return PlainTextResponse(profile["folded"])
+    return profile
+
+@router.get("/slow-queries")
+async def read_slow_queries(
+    limit: int = Query(20, ge=1, le=500),
+    order_by: str = Query("total_ms", pattern="^(total_ms|max_ms|count)$"),
+):
+    return {
+        "threshold_ms": slow_query_log.threshold_ms,
+        "queries": slow_query_log.top(limit, order_by),
+    }
+
+@router.delete("/slow-queries", status_code=status.HTTP_204_NO_CONTENT)
+async def reset_slow_queries():
+    slow_query_log.reset()
+    return None
+
+@router.get("/jobs")
+async def read_job_stats(db: AsyncSession = Depends(get_db)):
+    # Queue depth and outcomes per job type, plus how late the oldest queued job is
+    result = await db.execute(
+        select(Job.type, Job.status, func.count(), func.min(Job.run_at))
+        .group_by(Job.type, Job.status)
+    )
+    stats = {}
+    for type, job_status, count, oldest in result.all():
+        entry = stats.setdefault(type, {s.value: 0 for s in JobStatus})
+        entry[job_status.value] = count
+        if job_status == JobStatus.QUEUED:
+            entry["oldest_queued_run_at"] = oldest
+    return stats
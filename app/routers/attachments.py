@@ -0,0 +1,150 @@
+from typing import List
+
+from fastapi import APIRouter, Depends, HTTPException, Query, Request
+from fastapi.responses import Response, StreamingResponse
+from sqlalchemy.dialects.postgresql import insert
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.future import select
+
+from app.attachments import (
+    DOWNLOAD_HEADERS,
+    THUMBNAIL_MEDIA_TYPE,
+    RangeNotSatisfiable,
+    TooLarge,
+    blob_key,
+    byte_range,
+    download_disposition,
+    store_upload,
+    wants_thumbnail,
+)
+from app.auth_utils import get_current_user
+from app.config import ATTACHMENT_MAX_BYTES
+from app.database import get_db, release
+from app.jobs import enqueue
+from app.models import Attachment, AttachmentBlob, MaintenanceRequest, User
+from app.schemas import Attachment as AttachmentSchema
+from app.serialization import json_response
+from app.storage import storage
+
+router = APIRouter()
+
+# Uploads send the file itself as the request body (no multipart form), with
+# its type in Content-Type and its name in ?filename=, so it can be streamed
+# straight to storage.
+
+@router.post("/requests/{request_id}/attachments", response_model=AttachmentSchema)
+async def upload_attachment(
+    request_id: int,
+    http_request: Request,
+    filename: str = Query(..., min_length=1, max_length=255),
+    db: AsyncSession = Depends(get_db),
+    current_user: User = Depends(get_current_user)
+):
+    result = await db.execute(select(MaintenanceRequest.id).filter(MaintenanceRequest.id == request_id))
+    if result.scalar_one_or_none() is None:
+        raise HTTPException(status_code=404, detail="Request not found")
+    declared = http_request.headers.get("content-length")
+    if declared and declared.isdigit() and int(declared) > ATTACHMENT_MAX_BYTES:
+        raise HTTPException(status_code=413, detail="Attachment too large")
+    user_id = current_user.id
+    # Don't hold a pooled connection while the body trickles in
+    await db.close()
+
+    try:
+        sha256, size = await store_upload(http_request.stream())
+    except TooLarge:
+        raise HTTPException(status_code=413, detail="Attachment too large")
+
+    content_type = http_request.headers.get("content-type", "application/octet-stream").split(";")[0].strip()
+    await db.execute(insert(AttachmentBlob).values(sha256=sha256, size=size).on_conflict_do_nothing())
+    attachment = Attachment(
+        request_id=request_id,
+        sha256=sha256,
+        filename=filename,
+        content_type=content_type,
+        size=size,
+        uploaded_by_id=user_id,
+    )
+    db.add(attachment)
+    if wants_thumbnail(content_type, size):
+        blob = await db.get(AttachmentBlob, sha256)
+        if blob.thumbnail_key is None:
+            await enqueue(db, "attachment_thumbnail", {"sha256": sha256})
+    await db.commit()
+    return attachment
+
+@router.get("/requests/{request_id}/attachments", response_model=List[AttachmentSchema])
+async def read_attachments(request_id: int, db: AsyncSession = Depends(get_db)):
+    result = await db.execute(
+        select(Attachment).filter(Attachment.request_id == request_id).order_by(Attachment.id)
+    )
+    attachments = result.scalars().all()
+    await release(db)
+    return json_response(List[AttachmentSchema], attachments)
+
+async def _load(db: AsyncSession, attachment_id: int) -> Attachment:
+    result = await db.execute(select(Attachment).filter(Attachment.id == attachment_id))
+    attachment = result.scalar_one_or_none()
+    if attachment is None:
+        raise HTTPException(status_code=404, detail="Attachment not found")
+    return attachment
+
+@router.get("/attachments/{attachment_id}", response_model=AttachmentSchema)
+async def read_attachment(attachment_id: int, db: AsyncSession = Depends(get_db)):
+    return await _load(db, attachment_id)
+
+@router.get("/attachments/{attachment_id}/content")
+async def download_attachment(attachment_id: int, http_request: Request, db: AsyncSession = Depends(get_db)):
+    attachment = await _load(db, attachment_id)
+    # Streaming can take minutes; the connection goes back to the pool now
+    await db.close()
+
+    # Content-addressed: the hash is a strong validator
+    etag = f'"{attachment.sha256}"'
+    headers = {
+        "Accept-Ranges": "bytes",
+        "ETag": etag,
+        "Cache-Control": "private, max-age=31536000, immutable",
+        "Content-Disposition": download_disposition(attachment.filename, attachment.content_type),
+        **DOWNLOAD_HEADERS,
+    }
+    if http_request.headers.get("if-none-match") == etag:
+        return Response(status_code=304, headers=headers)
+
+    range_header = http_request.headers.get("range")
+    if_range = http_request.headers.get("if-range")
+    if if_range is not None and if_range != etag:
+        range_header = None
+    try:
+        selected = byte_range(range_header, attachment.size)
+    except RangeNotSatisfiable:
+        return Response(status_code=416, headers={**headers, "Content-Range": f"bytes */{attachment.size}"})
+
+    if selected is None:
+        body = storage.read(blob_key(attachment.sha256))
+        headers["Content-Length"] = str(attachment.size)
+        return StreamingResponse(body, media_type=attachment.content_type, headers=headers)
+    start, end = selected
+    body = storage.read(blob_key(attachment.sha256), start, end)
+    headers["Content-Range"] = f"bytes {start}-{end}/{attachment.size}"
+    headers["Content-Length"] = str(end - start + 1)
+    return StreamingResponse(body, status_code=206, media_type=attachment.content_type, headers=headers)
+
+@router.get("/attachments/{attachment_id}/thumbnail")
+async def download_thumbnail(attachment_id: int, db: AsyncSession = Depends(get_db)):
+    result = await db.execute(
+        select(AttachmentBlob.thumbnail_key)
+        .join(Attachment, Attachment.sha256 == AttachmentBlob.sha256)
+        .filter(Attachment.id == attachment_id)
+    )
+    row = result.first()
+    if row is None:
+        raise HTTPException(status_code=404, detail="Attachment not found")
+    if row.thumbnail_key is None:
+        raise HTTPException(status_code=404, detail="Thumbnail not available")
+    await db.close()
+    return StreamingResponse(
+        storage.read(row.thumbnail_key),
+        media_type=THUMBNAIL_MEDIA_TYPE,
+        headers={"Cache-Control": "private, max-age=31536000, immutable", **DOWNLOAD_HEADERS},
+    )
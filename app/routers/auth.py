@@ -1,31 +1,45 @@
 from fastapi import APIRouter, Depends, HTTPException, status
 from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy.future import select
-from typing import List
+from typing import List, Optional
 
-from app.database import get_db
+from app.database import get_db, release
 from app.models import User, UserRole
 from app.schemas import UserCreate, UserLogin, UserResponse, Token
-from app.auth_utils import get_password_hash, verify_password, create_access_token
+from app.auth_utils import get_password_hash, verify_password, create_access_token, get_optional_user
+from app.serialization import json_response
 
 router = APIRouter(prefix="/auth", tags=["auth"])
 
 @router.post("/register", response_model=UserResponse)
-async def register(user: UserCreate, db: AsyncSession = Depends(get_db)):
-    # Check if email exists
-    result = await db.execute(select(User).where(User.email == user.email))
+async def register(user: UserCreate, caller: Optional[User] = Depends(get_optional_user), db: AsyncSession = Depends(get_db)):
+    # Check if email exists (emails are unique across companies)
+    result = await db.execute(
+        select(User).where(User.email == user.email).execution_options(skip_tenant_filter=True)
+    )
     if result.scalars().first():
         raise HTTPException(status_code=400, detail="Email already registered")
 
-    # Create new user
+    # The company (and with it the token's tenant) is never taken from the
+    # body: an admin's new users join the admin's company, with the role and
+    # team the admin picks; self sign-ups are plain users of no company
     hashed_password = get_password_hash(user.password)
-    db_user = User(
-        email=user.email,
-        name=user.name,
-        hashed_password=hashed_password,
-        role=UserRole(user.role) if user.role else UserRole.USER,
-        team_id=user.team_id
-    )
+    if caller is not None and caller.role == UserRole.ADMIN:
+        db_user = User(
+            email=user.email,
+            name=user.name,
+            hashed_password=hashed_password,
+            role=UserRole(user.role) if user.role else UserRole.USER,
+            company_id=caller.company_id,
+            team_id=user.team_id
+        )
+    else:
+        db_user = User(
+            email=user.email,
+            name=user.name,
+            hashed_password=hashed_password,
+            role=UserRole.USER,
+        )
     db.add(db_user)
     await db.commit()
     await db.refresh(db_user)
@@ -33,7 +47,9 @@ async def register(user: UserCreate, db: AsyncSession = Depends(get_db)):
 
 @router.post("/login", response_model=Token)
 async def login(user: UserLogin, db: AsyncSession = Depends(get_db)):
-    result = await db.execute(select(User).where(User.email == user.email))
+    result = await db.execute(
+        select(User).where(User.email == user.email).execution_options(skip_tenant_filter=True)
+    )
     db_user = result.scalars().first()
 
     if not db_user or not verify_password(user.password, db_user.hashed_password):
@@ -44,11 +60,14 @@ async def login(user: UserLogin, db: AsyncSession = Depends(get_db)):
         "id": db_user.id, 
         "role": db_user.role.value,
         "name": db_user.name,
-        "team_id": db_user.team_id
+        "team_id": db_user.team_id,
+        "tenant": db_user.company_id,
     })
     return {"access_token": access_token, "token_type": "bearer"}
 
 @router.get("/members", response_model=List[UserResponse])
 async def read_members(db: AsyncSession = Depends(get_db)):
     result = await db.execute(select(User))
-    return result.scalars().all()
+    members = result.scalars().all()
+    await release(db)
+    return json_response(List[UserResponse], members)
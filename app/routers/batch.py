@@ -0,0 +1,33 @@
+from urllib.parse import urlsplit
+
+from fastapi import APIRouter, Depends, HTTPException, Request
+from fastapi.responses import Response
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app.auth_utils import get_current_user
+from app.batch import run_batch
+from app.config import BATCH_MAX_CALLS
+from app.database import get_db, release
+from app.models import User
+from app.schemas import BatchRequest, BatchResponse
+
+router = APIRouter()
+
+@router.post("/batch", response_model=BatchResponse)
+async def batch_calls(
+    batch: BatchRequest,
+    http_request: Request,
+    db: AsyncSession = Depends(get_db),
+    current_user: User = Depends(get_current_user)
+):
+    # Results come back in call order, each with its own status; a failing
+    # call does not fail the batch
+    if len(batch.requests) > BATCH_MAX_CALLS:
+        raise HTTPException(status_code=400, detail=f"At most {BATCH_MAX_CALLS} calls per batch")
+    for call in batch.requests:
+        if not call.path.startswith("/") or call.path.startswith("//") or urlsplit(call.path).path.rstrip("/") == "/batch":
+            raise HTTPException(status_code=400, detail=f"Cannot batch {call.path!r}")
+    # Every call opens its own session; don't sit on this one meanwhile
+    await release(db)
+    body = await run_batch(http_request.app, http_request.scope, [(call.id, call.path) for call in batch.requests], current_user)
+    return Response(content=body, media_type="application/json")
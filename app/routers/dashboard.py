@@ -1,18 +1,31 @@
-from fastapi import APIRouter, Depends
+import asyncio
+import time
+
+from fastapi import APIRouter, Depends, Response
 from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy.future import select
+from sqlalchemy.orm import aliased
 from sqlalchemy import func
 from datetime import date
+from typing import List
 
-from app.database import get_db
-from app.models import MaintenanceRequest, Equipment, RequestStage, MaintenanceType, Team, Category
-from app.schemas import DashboardStats, DashboardReports, ReportItem
+from app import queries
+from app.archive import HOT_REQUESTS
+from app.coalesce import coalesced
+from app.config import DASHBOARD_SUMMARY_CONCURRENCY
+from app.database import get_db, new_session
+from app.models import MaintenanceRequest, Equipment, Team, Category, User
+from app.schemas import DashboardStats, DashboardReports, DashboardSummary, ReportItem, RecentRequest
 
 router = APIRouter()
 
-@router.get("/dashboard/reports", response_model=DashboardReports)
-async def get_dashboard_reports(db: AsyncSession = Depends(get_db)):
-    # Requests per Team
+# Wall-mounted dashboards poll these in lockstep; @coalesced runs each
+# aggregate once per burst instead of once per screen.
+#
+# Counters and recent activity read the hot partition only; the per-team and
+# per-category reports are all-time and span archived requests too.
+
+async def _requests_per_team(db: AsyncSession) -> List[ReportItem]:
     # We join Team to ensure we get team names even if count is 0? SQL Group By usually gets present ones.
     team_query = (
         select(Team.name, func.count(MaintenanceRequest.id))
@@ -20,35 +33,25 @@ async def get_dashboard_reports(db: AsyncSession = Depends(get_db)):
         .group_by(Team.name)
     )
     result_team = await db.execute(team_query)
-    teams = [ReportItem(name=row[0], count=row[1]) for row in result_team]
+    return [ReportItem(name=row[0], count=row[1]) for row in result_team]
 
-    # Requests per Category
+async def _requests_per_category(db: AsyncSession) -> List[ReportItem]:
     cat_query = (
         select(Category.name, func.count(MaintenanceRequest.id))
         .join(MaintenanceRequest, Category.id == MaintenanceRequest.category_id)
         .group_by(Category.name)
     )
     result_cat = await db.execute(cat_query)
-    cats = [ReportItem(name=row[0], count=row[1]) for row in result_cat]
-    
-    return DashboardReports(requests_per_team=teams, requests_per_category=cats)
+    return [ReportItem(name=row[0], count=row[1]) for row in result_cat]
 
-@router.get("/dashboard/stats", response_model=DashboardStats)
-async def get_dashboard_stats(db: AsyncSession = Depends(get_db)):
+async def _stats(db: AsyncSession) -> DashboardStats:
     # 1. Critical Equipment: Equipment with Active Corrective Maintenance
     # Query: Count distinct equipment_id from requests where type=Corrective and stage in (New, In Progress)
-    critical_query = select(func.count(func.distinct(MaintenanceRequest.equipment_id))).filter(
-        MaintenanceRequest.maintenance_type == MaintenanceType.CORRECTIVE,
-        MaintenanceRequest.stage.in_([RequestStage.NEW_REQUEST, RequestStage.IN_PROGRESS])
-    )
-    critical_result = await db.execute(critical_query)
+    critical_result = await queries.execute(db, queries.critical_equipment_count, {})
     critical_count = critical_result.scalar() or 0
 
     # 2. Technician Load: Total active requests (assigned or unassigned)
-    load_query = select(func.count(MaintenanceRequest.id)).filter(
-        MaintenanceRequest.stage.in_([RequestStage.NEW_REQUEST, RequestStage.IN_PROGRESS])
-    )
-    load_result = await db.execute(load_query)
+    load_result = await queries.execute(db, queries.open_request_count, {})
     load_count = load_result.scalar() or 0
 
     # 3. Open Requests: Total pending (New + In Progress) - which is same as load?
@@ -58,11 +61,7 @@ async def get_dashboard_stats(db: AsyncSession = Depends(get_db)):
 
     # 4. Overdue Requests: Scheduled Date < Today AND not Repaired (not Scrap)
     # Actually, if stage is not Repaired or Scrap.
-    overdue_query = select(func.count(MaintenanceRequest.id)).filter(
-        MaintenanceRequest.scheduled_date < date.today(),
-        MaintenanceRequest.stage.notin_([RequestStage.REPAIRED, RequestStage.SCRAP])
-    )
-    overdue_result = await db.execute(overdue_query)
+    overdue_result = await queries.execute(db, queries.overdue_request_count, {"today": date.today()})
     overdue_count = overdue_result.scalar() or 0
 
     return DashboardStats(
@@ -72,30 +71,87 @@ async def get_dashboard_stats(db: AsyncSession = Depends(get_db)):
         overdue_requests_count=overdue_count
     )
 
-@router.get("/dashboard/recent_requests")
-async def get_recent_requests(db: AsyncSession = Depends(get_db)):
-    from sqlalchemy.orm import selectinload
-    
+async def _recent_requests(db: AsyncSession, limit: int = 10) -> List[RecentRequest]:
+    # Names are resolved in the same query instead of per-row lookups
+    technician = aliased(User)
+    employee = aliased(User)
     query = (
-        select(MaintenanceRequest)
-        .options(selectinload(MaintenanceRequest.category))
+        select(
+            MaintenanceRequest.id,
+            MaintenanceRequest.subject,
+            MaintenanceRequest.stage,
+            MaintenanceRequest.company_id,
+            Category.name,
+            technician.name,
+            employee.name,
+        )
+        .outerjoin(Category, Category.id == MaintenanceRequest.category_id)
+        .outerjoin(technician, technician.id == MaintenanceRequest.technician_id)
+        .outerjoin(employee, employee.id == MaintenanceRequest.created_by_id)
+        .filter(HOT_REQUESTS)
         .order_by(MaintenanceRequest.id.desc())
-        .limit(10)
+        .limit(limit)
     )
-    
     result = await db.execute(query)
-    requests = result.scalars().all()
-    
-    data = []
-    for req in requests:
-        data.append({
-            "id": req.id,
-            "subject": req.subject,
-            "employee": "Mitchell Admin", 
-            "technician": req.technician_id or "Unassigned",
-            "category": req.category.name if req.category else "Uncategorized", 
-            "stage": req.stage.value,
-            "company": "My Company"
-        })
-        
-    return data
+
+    return [
+        RecentRequest(
+            id=req_id,
+            subject=subject,
+            employee=employee_name or "Unknown",
+            technician=technician_name or "Unassigned",
+            category=category_name or "Uncategorized",
+            stage=stage.value,
+            company=company or "My Company",
+        )
+        for req_id, subject, stage, company, category_name, technician_name, employee_name in result
+    ]
+
+@router.get("/dashboard/reports", response_model=DashboardReports)
+@coalesced(DashboardReports)
+async def get_dashboard_reports(db: AsyncSession = Depends(get_db)):
+    teams = await _requests_per_team(db)
+    cats = await _requests_per_category(db)
+    return DashboardReports(requests_per_team=teams, requests_per_category=cats)
+
+@router.get("/dashboard/stats", response_model=DashboardStats)
+@coalesced(DashboardStats)
+async def get_dashboard_stats(db: AsyncSession = Depends(get_db)):
+    return await _stats(db)
+
+@router.get("/dashboard/recent_requests", response_model=List[RecentRequest])
+@coalesced(List[RecentRequest])
+async def get_recent_requests(db: AsyncSession = Depends(get_db)):
+    return await _recent_requests(db)
+
+@router.get("/dashboard/summary", response_model=DashboardSummary)
+@coalesced(DashboardSummary)
+async def get_dashboard_summary(response: Response):
+    # Each section gets its own session (and pooled connection) so the independent
+    # aggregates run concurrently; the semaphore keeps one call from draining the pool.
+    semaphore = asyncio.Semaphore(DASHBOARD_SUMMARY_CONCURRENCY)
+    timings = {}
+
+    async def run_section(name, section):
+        async with semaphore:
+            start = time.perf_counter()
+            async with new_session() as db:
+                result = await section(db)
+            timings[name] = (time.perf_counter() - start) * 1000
+            return result
+
+    stats, teams, cats, recent = await asyncio.gather(
+        run_section("stats", _stats),
+        run_section("teams", _requests_per_team),
+        run_section("categories", _requests_per_category),
+        run_section("recent", _recent_requests),
+    )
+
+    response.headers["Server-Timing"] = ", ".join(
+        f"{name};dur={duration:.1f}" for name, duration in timings.items()
+    )
+    return DashboardSummary(
+        stats=stats,
+        reports=DashboardReports(requests_per_team=teams, requests_per_category=cats),
+        recent_requests=recent,
+    )
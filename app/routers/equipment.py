@@ -1,27 +1,84 @@
-from fastapi import APIRouter, Depends, HTTPException, status
+from fastapi import APIRouter, Depends, HTTPException, Query, status
 from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy.future import select
 from sqlalchemy import func
-from typing import List
+from typing import Dict, List, Optional
 
-from app.database import get_db
-from app.models import Equipment, MaintenanceRequest, RequestStage
-from app.schemas import Equipment as EquipmentSchema, EquipmentCreate, EquipmentCount
+from app import queries
+from app.database import get_db, release
+from app.equipment_index import equipment_index
+from app.serialization import json_response
+from app.tenancy import current_tenant, orm_columns
+from app.models import Equipment, MaintenanceRequest, RequestStage, SyncTombstone
+from app.schemas import Equipment as EquipmentSchema, EquipmentCreate, EquipmentCount, EquipmentMaintenanceCount, EquipmentSuggestion
 
 router = APIRouter()
 
+MAX_COUNT_IDS = 500
+
+async def _maintenance_counts(db: AsyncSession, equipment_ids: List[int]) -> Dict[int, EquipmentCount]:
+    # One grouped query for the whole page: the outer join keeps equipment without
+    # requests (0/0) and doubles as the existence check, FILTER gives the active count.
+    if not equipment_ids:
+        return {}
+    active = MaintenanceRequest.stage.in_([RequestStage.NEW_REQUEST, RequestStage.IN_PROGRESS])
+    query = (
+        select(
+            Equipment.id,
+            func.count(MaintenanceRequest.id),
+            func.count(MaintenanceRequest.id).filter(active),
+        )
+        .outerjoin(MaintenanceRequest, MaintenanceRequest.equipment_id == Equipment.id)
+        .filter(Equipment.id.in_(equipment_ids))
+        .group_by(Equipment.id)
+    )
+    result = await db.execute(query)
+    return {
+        equipment_id: EquipmentCount(total=total, maintenance_active=active_count)
+        for equipment_id, total, active_count in result
+    }
+
 @router.post("/equipments/", response_model=EquipmentSchema)
 async def create_equipment(equipment: EquipmentCreate, db: AsyncSession = Depends(get_db)):
     db_equipment = Equipment(**equipment.model_dump())
     db.add(db_equipment)
     await db.commit()
     await db.refresh(db_equipment)
+    equipment_index.upsert(db_equipment.id, db_equipment.name, db_equipment.serial_number, db_equipment.company_name)
     return db_equipment
 
 @router.get("/equipments/", response_model=List[EquipmentSchema])
-async def read_equipments(skip: int = 0, limit: int = 100, db: AsyncSession = Depends(get_db)):
-    result = await db.execute(select(Equipment).offset(skip).limit(limit))
-    return result.scalars().all()
+async def read_equipments(
+    skip: int = 0,
+    limit: int = 100,
+    include: Optional[str] = None,
+    db: AsyncSession = Depends(get_db)
+):
+    # Plain column rows: no ORM identity map / instance state for a read-only list
+    result = await db.execute(select(*orm_columns(Equipment)).offset(skip).limit(limit))
+    rows = result.mappings().all()
+    if include == "counts":
+        counts = await _maintenance_counts(db, [row["id"] for row in rows])
+        rows = [{**row, "maintenance_count": counts.get(row["id"])} for row in rows]
+    await release(db)
+    return json_response(List[EquipmentSchema], rows)
+
+@router.get("/equipments/suggest", response_model=List[EquipmentSuggestion])
+async def suggest_equipments(q: str, limit: int = Query(10, ge=1, le=50)):
+    # Served from the in-memory prefix index, no database round trip
+    return equipment_index.suggest(q, limit, tenant=current_tenant.get())
+
+@router.get("/equipments/maintenance-counts", response_model=List[EquipmentMaintenanceCount])
+async def get_maintenance_counts(ids: List[int] = Query(...), db: AsyncSession = Depends(get_db)):
+    if len(ids) > MAX_COUNT_IDS:
+        raise HTTPException(status_code=400, detail=f"At most {MAX_COUNT_IDS} ids per call")
+
+    # Unknown ids are left out of the response
+    counts = await _maintenance_counts(db, ids)
+    return [
+        EquipmentMaintenanceCount(equipment_id=equipment_id, **count.model_dump())
+        for equipment_id, count in counts.items()
+    ]
 
 @router.get("/equipments/{equipment_id}", response_model=EquipmentSchema)
 async def read_equipment(equipment_id: int, db: AsyncSession = Depends(get_db)):
@@ -45,6 +102,7 @@ async def update_equipment(equipment_id: int, equipment_update: EquipmentCreate,
     db.add(db_equipment)
     await db.commit()
     await db.refresh(db_equipment)
+    equipment_index.upsert(db_equipment.id, db_equipment.name, db_equipment.serial_number, db_equipment.company_name)
     return db_equipment
 
 @router.delete("/equipments/{equipment_id}", status_code=status.HTTP_204_NO_CONTENT)
@@ -55,28 +113,16 @@ async def delete_equipment(equipment_id: int, db: AsyncSession = Depends(get_db)
         raise HTTPException(status_code=404, detail="Equipment not found")
     
     await db.delete(db_equipment)
+    db.add(SyncTombstone(entity="equipments", entity_id=equipment_id, company_id=db_equipment.company_name))
     await db.commit()
+    equipment_index.remove(equipment_id)
     return None
 
 # Smart Button Logic
 @router.get("/equipments/{equipment_id}/maintenance-count", response_model=EquipmentCount)
 async def get_maintenance_count(equipment_id: int, db: AsyncSession = Depends(get_db)):
-    # Verify equipment exists
-    result = await db.execute(select(Equipment).filter(Equipment.id == equipment_id))
-    if not result.scalar_one_or_none():
+    result = await queries.execute(db, queries.equipment_maintenance_count, {"equipment_id": equipment_id})
+    row = result.first()
+    if row is None:
          raise HTTPException(status_code=404, detail="Equipment not found")
-
-    # Count all requests
-    total_query = select(func.count(MaintenanceRequest.id)).filter(MaintenanceRequest.equipment_id == equipment_id)
-    total_result = await db.execute(total_query)
-    total = total_result.scalar() or 0
-
-    # Count active requests
-    active_query = select(func.count(MaintenanceRequest.id)).filter(
-        MaintenanceRequest.equipment_id == equipment_id,
-        MaintenanceRequest.stage.in_([RequestStage.NEW_REQUEST, RequestStage.IN_PROGRESS])
-    )
-    active_result = await db.execute(active_query)
-    active = active_result.scalar() or 0
-
-    return EquipmentCount(total=total, maintenance_active=active)
+    return EquipmentCount(total=row[1], maintenance_active=row[2])
@@ -0,0 +1,57 @@
+import os
+
+from fastapi import APIRouter
+from fastapi.responses import JSONResponse
+
+from app import database
+from app.config import LIVENESS_MAX_LOOP_LAG
+from app.health import health, ping_database
+from app.metrics import event_loop_lag
+
+router = APIRouter(prefix="/health")
+
+def _pool_status() -> dict:
+    pool = database.engine.sync_engine.pool
+    if not hasattr(pool, "checkedout"):
+        return {}
+    return {
+        "size": pool.size(),
+        "checked_out": pool.checkedout(),
+        "overflow": max(pool.overflow(), 0),
+        "capacity": pool.size() + max(pool._max_overflow, 0),
+    }
+
+@router.get("/live")
+async def liveness():
+    # Answering at all means the loop runs; a large lag means it is starved
+    lag = event_loop_lag()
+    body = {"status": "ok", "pid": os.getpid(), "loop_lag_ms": round(lag * 1000, 3)}
+    if lag > LIVENESS_MAX_LOOP_LAG:
+        body["status"] = "stalled"
+        return JSONResponse(body, status_code=503)
+    return body
+
+@router.get("/ready")
+async def readiness():
+    pool = _pool_status()
+    body = {
+        "status": "ready",
+        "pid": os.getpid(),
+        "warmed_up": health.ready,
+        "draining": health.draining,
+        "loop_lag_ms": round(event_loop_lag() * 1000, 3),
+        "pool": pool,
+        "database": False,
+    }
+    if health.draining:
+        body["status"] = "draining"
+    elif not health.ready:
+        body["status"] = "starting"
+    else:
+        # A saturated pool makes this wait and fail, which is the signal we want
+        body["database"] = await ping_database(database.engine)
+        if not body["database"]:
+            body["status"] = "unavailable"
+    if body["status"] != "ready":
+        return JSONResponse(body, status_code=503)
+    return body
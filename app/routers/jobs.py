@@ -0,0 +1,33 @@
+from fastapi import APIRouter, Depends, HTTPException
+from fastapi.responses import Response
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.future import select
+from sqlalchemy.orm import undefer
+
+from app.database import get_db
+from app.models import Job, JobStatus
+from app.schemas import Job as JobSchema
+
+router = APIRouter(prefix="/jobs")
+
+@router.get("/{job_id}", response_model=JobSchema)
+async def read_job(job_id: int, db: AsyncSession = Depends(get_db)):
+    result = await db.execute(select(Job).filter(Job.id == job_id))
+    job = result.scalar_one_or_none()
+    if job is None:
+        raise HTTPException(status_code=404, detail="Job not found")
+    return job
+
+@router.get("/{job_id}/output")
+async def read_job_output(job_id: int, db: AsyncSession = Depends(get_db)):
+    result = await db.execute(select(Job).options(undefer(Job.output)).filter(Job.id == job_id))
+    job = result.scalar_one_or_none()
+    if job is None:
+        raise HTTPException(status_code=404, detail="Job not found")
+    if job.status != JobStatus.SUCCEEDED or job.output is None:
+        raise HTTPException(status_code=409, detail=f"Job has no output ({job.status.value})")
+    headers = {}
+    filename = (job.result or {}).get("filename")
+    if filename:
+        headers["Content-Disposition"] = f'attachment; filename="{filename}"'
+    return Response(job.output, media_type=job.output_type, headers=headers)
@@ -1,20 +1,44 @@
+import asyncio
+import json
+
 from fastapi import APIRouter, Depends, HTTPException, status
+from fastapi.responses import Response, StreamingResponse
 from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy.future import select
-from typing import List, Optional
+from typing import List, Optional, Set
 
-from app.database import get_db
-from app.models import MaintenanceRequest, Equipment, RequestStage, EquipmentStatus, MaintenanceFor
-from app.schemas import MaintenanceRequest as MaintenanceRequestSchema, MaintenanceRequestCreate, MaintenanceRequestUpdate
+from app import queries
+from app.archive import CLOSED_STAGES, HOT_REQUESTS, track_closing
+from app.database import get_db, release
+from app.equipment_index import equipment_index
+from app.events import request_events, request_event
+from app.history import history_writer, request_changes, snapshot
+from app.expand import ExpandSpec
+from app.jobs import enqueue
+from app.schedule import booking, booking_changed, check_booking, conflicts_header
+from app.serialization import json_response
+from app.tenancy import current_tenant
+from app.worksheets import load_worksheet_request, render_worksheet, worksheet_filename
+from app.models import MaintenanceRequest, Equipment, RequestStage, EquipmentStatus, MaintenanceFor, Team
+from app.schemas import Job as JobSchema, MaintenanceRequest as MaintenanceRequestSchema, MaintenanceRequestCreate, MaintenanceRequestUpdate, RequestEvent as RequestEventSchema
 
 router = APIRouter()
 
-from app.auth_utils import get_current_user
-from app.models import User
+REQUEST_EXPAND = ExpandSpec({
+    "category": MaintenanceRequest.category,
+    "team": MaintenanceRequest.team,
+    "team.users": Team.users,
+    "equipment": MaintenanceRequest.equipment,
+})
+
+from app.auth_utils import get_actor_id, get_current_user
+from app.models import RequestEvent, User
 
 @router.post("/requests/", response_model=MaintenanceRequestSchema)
 async def create_request(
     request: MaintenanceRequestCreate, 
+    response: Response,
+    expand: Set[str] = Depends(REQUEST_EXPAND.param),
     db: AsyncSession = Depends(get_db),
     current_user: User = Depends(get_current_user)
 ):
@@ -40,24 +64,53 @@ async def create_request(
     elif request.maintenance_for == MaintenanceFor.WORK_CENTER and not request.work_center_id:
         raise HTTPException(status_code=400, detail="Work Center ID required for Work Center maintenance")
 
+    # Warns (header) or rejects (409) double bookings, per SCHEDULE_CONFLICT_MODE
+    conflicts = await check_booking(db, request.model_dump())
+    if conflicts:
+        response.headers["X-Schedule-Conflicts"] = conflicts_header(conflicts)
+
     db_request = MaintenanceRequest(**request.model_dump())
     db_request.created_by_id = current_user.id
+    track_closing(db_request, None)
     db.add(db_request)
     await db.commit()
+    if db_request.equipment_id:
+        equipment_index.touch(db_request.equipment_id, db_request.request_date)
+    request_events.publish(request_event("created", db_request), db_request.company_id)
+    await history_writer.record(request_changes(db_request, {}, current_user.id))
     
-    # Re-fetch with relationships loaded
-    from sqlalchemy.orm import selectinload
+    # Re-fetch with requested relationships loaded
     result = await db.execute(
         select(MaintenanceRequest)
-        .options(
-            selectinload(MaintenanceRequest.category), 
-            selectinload(MaintenanceRequest.team),
-            selectinload(MaintenanceRequest.equipment)
-        )
+        .options(*REQUEST_EXPAND.options(expand))
         .filter(MaintenanceRequest.id == db_request.id)
     )
     return result.scalar_one()
 
+# Live Kanban updates (Server-Sent Events)
+STREAM_KEEPALIVE_SECONDS = 15
+
+@router.get("/requests/stream")
+async def stream_requests():
+    subscriber = request_events.subscribe(current_tenant.get())
+
+    async def events():
+        try:
+            while True:
+                try:
+                    event = await asyncio.wait_for(subscriber.get(), STREAM_KEEPALIVE_SECONDS)
+                except asyncio.TimeoutError:
+                    yield ": keepalive\n\n"
+                    continue
+                if event is None:
+                    # Dropped as a slow consumer; the client reconnects and reloads
+                    return
+                yield f"event: {event['type']}\ndata: {json.dumps(event)}\n\n"
+        finally:
+            request_events.unsubscribe(subscriber)
+
+    return StreamingResponse(events(), media_type="text/event-stream", headers={"Cache-Control": "no-cache"})
+
 @router.get("/requests/", response_model=List[MaintenanceRequestSchema])
 async def read_requests(
     skip: int = 0, 
@@ -65,15 +118,14 @@ async def read_requests(
     stage: Optional[RequestStage] = None,
     equipment_id: Optional[int] = None,
     work_center_id: Optional[int] = None,
+    include_archived: bool = False,
+    expand: Set[str] = Depends(REQUEST_EXPAND.param),
     db: AsyncSession = Depends(get_db)
 ):
-    from sqlalchemy.orm import selectinload
-    
-    query = select(MaintenanceRequest).options(
-        selectinload(MaintenanceRequest.category),
-        selectinload(MaintenanceRequest.team),
-        selectinload(MaintenanceRequest.equipment)
-    )
+    query = select(MaintenanceRequest).options(*REQUEST_EXPAND.options(expand))
+    # Boards and work lists only need the hot partition; history views opt in
+    if not include_archived:
+        query = query.filter(HOT_REQUESTS)
     if stage:
         query = query.filter(MaintenanceRequest.stage == stage)
     if equipment_id:
@@ -82,33 +134,41 @@ async def read_requests(
         query = query.filter(MaintenanceRequest.work_center_id == work_center_id)
         
     result = await db.execute(query.offset(skip).limit(limit))
-    return result.scalars().all()
+    requests = result.scalars().all()
+    await release(db)
+    return json_response(List[MaintenanceRequestSchema], requests)
 
 @router.get("/requests/{request_id}", response_model=MaintenanceRequestSchema)
-async def read_request(request_id: int, db: AsyncSession = Depends(get_db)):
-    from sqlalchemy.orm import selectinload
-    result = await db.execute(
-        select(MaintenanceRequest)
-        .options(
-            selectinload(MaintenanceRequest.category), 
-            selectinload(MaintenanceRequest.team),
-            selectinload(MaintenanceRequest.equipment)
-        )
-        .filter(MaintenanceRequest.id == request_id)
-    )
+async def read_request(
+    request_id: int,
+    expand: Set[str] = Depends(REQUEST_EXPAND.param),
+    db: AsyncSession = Depends(get_db)
+):
+    result = await queries.execute(db, queries.request_by_id(REQUEST_EXPAND, frozenset(expand)), {"request_id": request_id})
     db_request = result.scalar_one_or_none()
     if db_request is None:
         raise HTTPException(status_code=404, detail="Request not found")
+    await release(db)
     return db_request
 
 @router.put("/requests/{request_id}", response_model=MaintenanceRequestSchema)
-async def update_request(request_id: int, request_update: MaintenanceRequestUpdate, db: AsyncSession = Depends(get_db)):
+async def update_request(
+    request_id: int,
+    request_update: MaintenanceRequestUpdate,
+    response: Response,
+    expand: Set[str] = Depends(REQUEST_EXPAND.param),
+    db: AsyncSession = Depends(get_db),
+    actor_id: Optional[int] = Depends(get_actor_id)
+):
     # Fetch existing
     result = await db.execute(select(MaintenanceRequest).filter(MaintenanceRequest.id == request_id))
     db_request = result.scalar_one_or_none()
     if db_request is None:
         raise HTTPException(status_code=404, detail="Request not found")
 
+    before = snapshot(db_request)
+    booked_before = booking(db_request)
+
     # Update logic
     update_data = request_update.model_dump(exclude_unset=True)
     
@@ -134,104 +194,65 @@ async def update_request(request_id: int, request_update: MaintenanceRequestUpda
     # Apply updates
     for key, value in update_data.items():
         setattr(db_request, key, value)
+    track_closing(db_request, before["stage"])
+    # Reopening an archived request moves it back to the hot partition
+    if db_request.archived and db_request.stage not in CLOSED_STAGES:
+        db_request.archived = False
+
+    booked = booking(db_request)
+    if booking_changed(booked_before, booked):
+        conflicts = await check_booking(db, booked, request_id)
+        if conflicts:
+            response.headers["X-Schedule-Conflicts"] = conflicts_header(conflicts)
     
     db.add(db_request)
     await db.commit()
+    request_events.publish(request_event("updated", db_request), db_request.company_id)
+    await history_writer.record(request_changes(db_request, before, actor_id))
     
-    # Re-fetch with relationships loaded
-    from sqlalchemy.orm import selectinload
-    result = await db.execute(
-        select(MaintenanceRequest)
-        .options(
-            selectinload(MaintenanceRequest.category), 
-            selectinload(MaintenanceRequest.team),
-            selectinload(MaintenanceRequest.equipment)
-        )
-        .filter(MaintenanceRequest.id == request_id)
-    )
+    # Re-fetch with requested relationships loaded
+    result = await queries.execute(db, queries.request_by_id(REQUEST_EXPAND, frozenset(expand)), {"request_id": request_id})
     return result.scalar_one()
 
     await db.delete(db_request)
     await db.commit()
     return None
 
-@router.get("/requests/{request_id}/worksheet")
-async def download_worksheet(request_id: int, db: AsyncSession = Depends(get_db)):
-    from fastapi.responses import StreamingResponse
-    import io
-    from reportlab.pdfgen import canvas
-    from reportlab.lib.pagesizes import letter
-    
-    # Fetch Request
-    from sqlalchemy.orm import selectinload
+@router.get("/requests/{request_id}/history", response_model=List[RequestEventSchema])
+async def read_request_history(request_id: int, db: AsyncSession = Depends(get_db)):
+    # Timeline of stage / technician / priority changes, oldest first
     result = await db.execute(
-        select(MaintenanceRequest)
-        .options(
-            selectinload(MaintenanceRequest.category), 
-            selectinload(MaintenanceRequest.team),
-            selectinload(MaintenanceRequest.equipment)
-        )
-        .filter(MaintenanceRequest.id == request_id)
+        select(RequestEvent)
+        .filter(RequestEvent.request_id == request_id)
+        .order_by(RequestEvent.ts, RequestEvent.id)
     )
-    request = result.scalar_one_or_none()
-    
+    events = result.scalars().all()
+    if not events:
+        exists = await db.execute(select(MaintenanceRequest.id).filter(MaintenanceRequest.id == request_id))
+        if exists.scalar_one_or_none() is None:
+            raise HTTPException(status_code=404, detail="Request not found")
+    await release(db)
+    return json_response(List[RequestEventSchema], events)
+
+@router.get("/requests/{request_id}/worksheet")
+async def download_worksheet(request_id: int, db: AsyncSession = Depends(get_db)):
+    request = await load_worksheet_request(db, request_id)
     if not request:
         raise HTTPException(status_code=404, detail="Request not found")
-        
-    # Generate PDF
-    buffer = io.BytesIO()
-    c = canvas.Canvas(buffer, pagesize=letter)
-    
-    # Title
-    c.setFont("Helvetica-Bold", 18)
-    c.drawString(50, 750, f"Maintenance Worksheet #{request.id}")
-    
-    # Details
-    c.setFont("Helvetica", 12)
-    y = 700
-    line_height = 20
-    
-    c.drawString(50, y, f"Subject: {request.subject}")
-    y -= line_height
-    c.drawString(50, y, f"Date: {request.request_date}")
-    y -= line_height
-    c.drawString(50, y, f"Priority: {request.priority}")
-    y -= line_height
-    c.drawString(50, y, f"Stage: {request.stage}")
-    y -= line_height * 2 # Space
-    
-    # Target
-    if request.maintenance_for == "Equipment":
-         c.drawString(50, y, f"Equipment ID: {request.equipment_id}")
-    else:
-         c.drawString(50, y, f"Work Center ID: {request.work_center_id}")
-    y -= line_height
-    
-    c.drawString(50, y, f"Category: {request.category.name if request.category else '-'}")
-    y -= line_height * 2
-    
-    # Description
-    c.drawString(50, y, "Description:")
-    y -= line_height
-    
-    desc = request.description or "No description provided."
-    # Simple word wrap simulation (very basic)
-    words = desc.split()
-    line = ""
-    for word in words:
-        if len(line + word) > 80:
-             c.drawString(70, y, line)
-             line = word + " "
-             y -= line_height
-        else:
-             line += word + " "
-    c.drawString(70, y, line)
-    
-    # Footer
-    c.save()
-    buffer.seek(0)
-    
+    # Release the connection before the CPU-bound rendering
+    await db.close()
+    pdf = await asyncio.to_thread(render_worksheet, request)
     headers = {
-        'Content-Disposition': f'attachment; filename="Worksheet_{request.id}.pdf"'
+        'Content-Disposition': f'attachment; filename="{worksheet_filename(request)}"'
     }
-    return StreamingResponse(buffer, media_type='application/pdf', headers=headers)
+    return Response(pdf, media_type='application/pdf', headers=headers)
+
+@router.post("/requests/{request_id}/worksheet", response_model=JobSchema, status_code=status.HTTP_202_ACCEPTED)
+async def queue_worksheet(request_id: int, db: AsyncSession = Depends(get_db)):
+    # Renders in the background; poll GET /jobs/{id}, then fetch /jobs/{id}/output
+    result = await db.execute(select(MaintenanceRequest.id).filter(MaintenanceRequest.id == request_id))
+    if result.scalar_one_or_none() is None:
+        raise HTTPException(status_code=404, detail="Request not found")
+    job = await enqueue(db, "render_worksheet", {"request_id": request_id})
+    await db.commit()
+    return job
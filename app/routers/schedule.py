@@ -0,0 +1,28 @@
+from datetime import date
+from typing import Optional
+
+from fastapi import APIRouter, Depends, HTTPException, Query
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app.config import SCHEDULE_SWEEP_LIMIT
+from app.database import get_db, release
+from app.schedule import sweep
+from app.schemas import ScheduleConflictReport
+from app.serialization import json_response
+
+router = APIRouter()
+
+@router.get("/schedule/conflicts", response_model=ScheduleConflictReport)
+async def get_schedule_conflicts(
+    start: date = Query(..., alias="from"),
+    end: date = Query(..., alias="to"),
+    resource: Optional[str] = Query(None, pattern="^(technician|equipment|work_center)$"),
+    limit: int = Query(SCHEDULE_SWEEP_LIMIT, ge=1, le=10000),
+    db: AsyncSession = Depends(get_db)
+):
+    # Overlapping bookings of open requests between two days (inclusive)
+    if end < start:
+        raise HTTPException(status_code=400, detail="'to' is before 'from'")
+    conflicts, truncated = await sweep(db, start, end, resource, limit)
+    await release(db)
+    return json_response(ScheduleConflictReport, {"conflicts": conflicts, "truncated": truncated})
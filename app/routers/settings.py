@@ -3,9 +3,10 @@ from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy.future import select
 from typing import List
 
-from app.database import get_db
+from app.database import get_db, release
 from app.models import Category, Team
 from app.schemas import Category as CategorySchema, CategoryCreate
+from app.serialization import json_response
 
 router = APIRouter()
 
@@ -25,6 +26,8 @@ async def create_category(category: CategoryCreate, db: AsyncSession = Depends(g
 @router.get("/categories/", response_model=List[CategorySchema])
 async def read_categories(skip: int = 0, limit: int = 100, db: AsyncSession = Depends(get_db)):
     result = await db.execute(select(Category).offset(skip).limit(limit))
-    return result.scalars().all()
+    categories = result.scalars().all()
+    await release(db)
+    return json_response(List[CategorySchema], categories)
 
 
@@ -0,0 +1,109 @@
+from fastapi import APIRouter, Depends, HTTPException, Query
+from sqlalchemy import BigInteger, Text, func, literal, tuple_
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.future import select
+from typing import Optional, Tuple
+
+from app.database import get_db, release
+from app.models import Equipment, MaintenanceRequest, SyncTombstone
+from app.schemas import SyncChanges
+from app.serialization import json_response
+from app.tenancy import orm_columns
+
+router = APIRouter()
+
+# Delta sync for offline-capable clients (plant tablets).
+# Every insert/update of an equipment or request, and every deletion
+# tombstone, draws a value from sync_version_seq and records its
+# transaction's id (txid). Changes are read in (txid, version) order and the
+# sync token is the last (txid, version) the client has seen, so a refresh is
+# one indexed range scan per table: WHERE (txid, version) > :token.
+#
+# Versions are drawn at write time but rows only show up at commit, so a
+# version alone would let a slow transaction commit rows below a token already
+# handed out. Only rows of settled transactions are sent: txid below the
+# oldest one still running (pg_snapshot_xmin). Later writers get higher ids,
+# so nothing can appear behind the token afterwards; rows of running or just
+# committed transactions wait for the next refresh.
+# Clients apply rows as upserts by id; a row can show up again in a later page
+# after it changes again.
+
+SETTLED = select(func.pg_snapshot_xmin(func.pg_current_snapshot()).cast(Text).cast(BigInteger))
+
+async def _changed_since(db: AsyncSession, columns, model, after: Tuple[int, int], settled: int, limit: int):
+    # Fetch one extra row to know whether this source has more pending
+    result = await db.execute(
+        select(*columns)
+        .filter(
+            tuple_(model.txid, model.version) > tuple_(*(literal(key, BigInteger) for key in after)),
+            model.txid < settled,
+        )
+        .order_by(model.txid, model.version)
+        .limit(limit + 1)
+    )
+    rows = result.mappings().all()
+    return rows[:limit], len(rows) > limit
+
+def _key(row) -> Tuple[int, int]:
+    return row["txid"], row["version"]
+
+def _parse_token(since: Optional[str]) -> Tuple[int, int]:
+    # "<txid>.<version>"; tokens from before txids were tracked (a bare
+    # version) start over, which upserting clients absorb
+    if not since or since.isdigit():
+        return 0, 0
+    try:
+        txid, version = map(int, since.split("."))
+    except ValueError:
+        raise HTTPException(status_code=400, detail="Invalid sync token")
+    if txid < 0 or version < 0:
+        raise HTTPException(status_code=400, detail="Invalid sync token")
+    return txid, version
+
+@router.get("/sync/changes", response_model=SyncChanges)
+async def get_changes(
+    since: Optional[str] = None,
+    limit: int = Query(500, ge=1, le=5000),
+    db: AsyncSession = Depends(get_db)
+):
+    after = _parse_token(since)
+
+    # Read before the pages: later statements' snapshots see every
+    # transaction below it
+    settled = (await db.execute(SETTLED)).scalar_one()
+    pages = {
+        "equipments": await _changed_since(db, orm_columns(Equipment), Equipment, after, settled, limit),
+        "requests": await _changed_since(db, orm_columns(MaintenanceRequest), MaintenanceRequest, after, settled, limit),
+        "deleted": await _changed_since(
+            db,
+            [SyncTombstone.entity, SyncTombstone.entity_id, SyncTombstone.txid, SyncTombstone.version],
+            SyncTombstone,
+            after,
+            settled,
+            limit,
+        ),
+    }
+    await release(db)
+
+    # If a source was cut off at `limit`, the new token can only advance to the
+    # last key of that page; rows beyond it are sent in the next call.
+    truncated = [_key(rows[-1]) for rows, has_more in pages.values() if has_more]
+    if truncated:
+        horizon = min(truncated)
+    else:
+        horizon = max((_key(rows[-1]) for rows, _ in pages.values() if rows), default=after)
+
+    def visible(name):
+        return [row for row in pages[name][0] if _key(row) <= horizon]
+
+    deleted = {"equipments": [], "requests": []}
+    for row in visible("deleted"):
+        deleted.setdefault(row["entity"], []).append(row["entity_id"])
+
+    return json_response(SyncChanges, {
+        "token": "%d.%d" % horizon,
+        "has_more": bool(truncated),
+        "equipments": visible("equipments"),
+        "requests": visible("requests"),
+        "deleted": deleted,
+    })
@@ -1,26 +1,39 @@
 from fastapi import APIRouter, Depends, HTTPException
 from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy.future import select
-from typing import List
+from typing import List, Set
 
-from app.database import get_db
+from app.database import get_db, release
+from app.expand import ExpandSpec
+from app.serialization import json_response
 from app.models import Team, User
 from app.schemas import Team as TeamSchema, TeamCreate, UserResponse
 
 router = APIRouter(prefix="/teams", tags=["teams"])
 
+TEAM_EXPAND = ExpandSpec({
+    "users": Team.users,
+})
+
 @router.post("/", response_model=TeamSchema)
 async def create_team(team: TeamCreate, db: AsyncSession = Depends(get_db)):
     db_team = Team(name=team.name)
     db.add(db_team)
     await db.commit()
-    await db.refresh(db_team)
-    return db_team
+    # A new team has no members yet
+    return TeamSchema(id=db_team.id, name=db_team.name, users=[])
 
 @router.get("/", response_model=List[TeamSchema])
-async def read_teams(skip: int = 0, limit: int = 100, db: AsyncSession = Depends(get_db)):
-    result = await db.execute(select(Team).offset(skip).limit(limit))
-    return result.scalars().all()
+async def read_teams(
+    skip: int = 0,
+    limit: int = 100,
+    expand: Set[str] = Depends(TEAM_EXPAND.param),
+    db: AsyncSession = Depends(get_db)
+):
+    result = await db.execute(select(Team).options(*TEAM_EXPAND.options(expand)).offset(skip).limit(limit))
+    teams = result.scalars().all()
+    await release(db)
+    return json_response(List[TeamSchema], teams)
 
 @router.post("/{team_id}/assign/{user_id}", response_model=UserResponse)
 async def assign_user_to_team(team_id: int, user_id: int, db: AsyncSession = Depends(get_db)):
@@ -3,9 +3,10 @@ from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy.future import select
 from typing import List
 
-from app.database import get_db
+from app.database import get_db, release
 from app.models import WorkCenter
 from app.schemas import WorkCenter as WorkCenterSchema, WorkCenterCreate
+from app.serialization import json_response
 
 router = APIRouter()
 
@@ -20,7 +21,9 @@ async def create_workcenter(workcenter: WorkCenterCreate, db: AsyncSession = Dep
 @router.get("/workcenters/", response_model=List[WorkCenterSchema])
 async def read_workcenters(skip: int = 0, limit: int = 100, db: AsyncSession = Depends(get_db)):
     result = await db.execute(select(WorkCenter).offset(skip).limit(limit))
-    return result.scalars().all()
+    workcenters = result.scalars().all()
+    await release(db)
+    return json_response(List[WorkCenterSchema], workcenters)
 
 @router.get("/workcenters/{workcenter_id}", response_model=WorkCenterSchema)
 async def read_workcenter(workcenter_id: int, db: AsyncSession = Depends(get_db)):
@@ -0,0 +1,197 @@
+import heapq
+from datetime import date, datetime, time, timedelta
+from typing import Dict, List, Optional, Tuple
+
+from fastapi import HTTPException
+from sqlalchemy import and_, func, not_, or_
+from sqlalchemy.future import select
+
+from app.archive import HOT_REQUESTS
+from app.config import SCHEDULE_CONFLICT_MODE
+from app.models import MaintenanceFor, MaintenanceRequest, RequestStage
+
+# Scheduling conflicts: two open requests booking the same technician,
+# equipment or work center for overlapping windows. A request's window is
+# [scheduled_date, + duration hours), kept by Postgres in the generated
+# schedule_window tsrange column with a partial GiST index over open requests.
+#
+# Writes look up overlapping bookings through that index (SCHEDULE_CONFLICT_MODE
+# decides whether they warn or reject). The /schedule/conflicts sweep reads
+# the open windows in the range once, ordered by start, and sweeps each
+# resource's bookings with a heap of the ones still running, so it is
+# O(n log n + conflicts) rather than a self-join.
+
+ACTIVE_STAGES = [RequestStage.NEW_REQUEST, RequestStage.IN_PROGRESS]  # the index predicate
+OPEN_REQUESTS = and_(HOT_REQUESTS, MaintenanceRequest.stage.in_(ACTIVE_STAGES))
+# Requests without a date or a duration book nothing
+BOOKED = and_(
+    MaintenanceRequest.schedule_window.isnot(None),
+    not_(func.isempty(MaintenanceRequest.schedule_window)),
+)
+
+RESOURCES = ("technician", "equipment", "work_center")
+BOOKING_FIELDS = ("scheduled_date", "duration", "stage", "maintenance_for", "technician_id", "equipment_id", "work_center_id")
+# pg_advisory_xact_lock class per resource kind, so "reject" holds under concurrency
+LOCK_CLASSES = {"technician": 4801, "equipment": 4802, "work_center": 4803}
+
+_COLUMNS = (
+    MaintenanceRequest.id,
+    MaintenanceRequest.technician_id,
+    MaintenanceRequest.equipment_id,
+    MaintenanceRequest.work_center_id,
+    MaintenanceRequest.maintenance_for,
+    func.lower(MaintenanceRequest.schedule_window).label("start"),
+    func.upper(MaintenanceRequest.schedule_window).label("end"),
+)
+
+
+class Conflict:
+    def __init__(self, resource: str, resource_id: int, request_id: Optional[int], conflicting_request_id: int,
+                 start: datetime, end: datetime):
+        self.resource = resource
+        self.resource_id = resource_id
+        self.request_id = request_id
+        self.conflicting_request_id = conflicting_request_id
+        # The overlap of the two windows
+        self.start = start
+        self.end = end
+
+    def to_dict(self) -> dict:
+        return {
+            "resource": self.resource,
+            "resource_id": self.resource_id,
+            "request_id": self.request_id,
+            "conflicting_request_id": self.conflicting_request_id,
+            "start": self.start.isoformat(),
+            "end": self.end.isoformat(),
+        }
+
+
+def window(scheduled_date: Optional[date], duration: Optional[float]) -> Optional[Tuple[datetime, datetime]]:
+    # Same bounds as the generated column
+    if scheduled_date is None or not duration or duration <= 0:
+        return None
+    start = datetime.combine(scheduled_date, time())
+    return start, start + timedelta(hours=duration)
+
+
+def booked_resources(values) -> Dict[str, int]:
+    booked = {}
+    if values.get("technician_id") is not None:
+        booked["technician"] = values["technician_id"]
+    if values.get("equipment_id") is not None:
+        booked["equipment"] = values["equipment_id"]
+    # Equipment requests carry their work center too; only work-center
+    # maintenance books the whole center
+    if values.get("maintenance_for") == MaintenanceFor.WORK_CENTER and values.get("work_center_id") is not None:
+        booked["work_center"] = values["work_center_id"]
+    return booked
+
+
+def booking(request) -> dict:
+    return {field: getattr(request, field) for field in BOOKING_FIELDS}
+
+
+def booking_changed(before: dict, after: dict) -> bool:
+    # Re-check only when the request takes on a new booking, so moving an
+    # already-booked request along the Kanban never trips over old conflicts
+    if after.get("stage") not in ACTIVE_STAGES:
+        return False
+    return before.get("stage") not in ACTIVE_STAGES or any(
+        before.get(field) != after.get(field) for field in BOOKING_FIELDS if field != "stage"
+    )
+
+
+def _on_resource(kind: str, resource_id: int):
+    if kind == "technician":
+        return MaintenanceRequest.technician_id == resource_id
+    if kind == "equipment":
+        return MaintenanceRequest.equipment_id == resource_id
+    return and_(
+        MaintenanceRequest.work_center_id == resource_id,
+        MaintenanceRequest.maintenance_for == MaintenanceFor.WORK_CENTER,
+    )
+
+
+async def find_conflicts(db, values: dict, request_id: Optional[int] = None) -> List[Conflict]:
+    span = window(values.get("scheduled_date"), values.get("duration"))
+    booked = booked_resources(values)
+    if values.get("stage") not in ACTIVE_STAGES or span is None or not booked:
+        return []
+    query = select(*_COLUMNS).filter(
+        OPEN_REQUESTS,
+        BOOKED,
+        MaintenanceRequest.schedule_window.op("&&")(func.tsrange(*span)),
+        or_(*(_on_resource(kind, resource_id) for kind, resource_id in booked.items())),
+    )
+    if request_id is not None:
+        query = query.filter(MaintenanceRequest.id != request_id)
+    result = await db.execute(query.order_by(MaintenanceRequest.id))
+
+    conflicts = []
+    for row in result:
+        for kind, resource_id in booked_resources(row._mapping).items():
+            if booked.get(kind) == resource_id:
+                conflicts.append(Conflict(
+                    kind, resource_id, request_id, row.id, max(span[0], row.start), min(span[1], row.end)
+                ))
+    return conflicts
+
+
+async def check_booking(db, values: dict, request_id: Optional[int] = None) -> List[Conflict]:
+    # Conflicts of a create/update about to be committed in `db`; raises 409
+    # in "reject" mode
+    if SCHEDULE_CONFLICT_MODE == "off":
+        return []
+    if SCHEDULE_CONFLICT_MODE == "reject":
+        # Serialize bookings of the same resources until this transaction ends
+        for kind, resource_id in sorted(booked_resources(values).items()):
+            await db.execute(select(func.pg_advisory_xact_lock(LOCK_CLASSES[kind], resource_id)))
+    conflicts = await find_conflicts(db, values, request_id)
+    if conflicts and SCHEDULE_CONFLICT_MODE == "reject":
+        raise HTTPException(status_code=409, detail={
+            "message": "Schedule conflict",
+            "conflicts": [conflict.to_dict() for conflict in conflicts],
+        })
+    return conflicts
+
+
+def conflicts_header(conflicts: List[Conflict]) -> str:
+    # X-Schedule-Conflicts: technician=12, equipment=15
+    return ", ".join(f"{c.resource}={c.conflicting_request_id}" for c in conflicts)
+
+
+async def sweep(db, start: date, end: date, resource: Optional[str] = None,
+                limit: int = 1000) -> Tuple[List[Conflict], bool]:
+    # Conflicting pairs overlapping the days start..end (inclusive); also
+    # returns whether the list was cut at `limit`
+    span_start, span_end = datetime.combine(start, time()), datetime.combine(end + timedelta(days=1), time())
+    result = await db.execute(
+        select(*_COLUMNS)
+        .filter(
+            OPEN_REQUESTS,
+            BOOKED,
+            MaintenanceRequest.schedule_window.op("&&")(func.tsrange(span_start, span_end)),
+        )
+        .order_by("start", MaintenanceRequest.id)
+    )
+
+    conflicts = []
+    # (resource, id) -> heap of (end, request id) of bookings not yet finished
+    running: Dict[Tuple[str, int], list] = {}
+    for row in result:
+        for kind, resource_id in booked_resources(row._mapping).items():
+            if resource is not None and kind != resource:
+                continue
+            active = running.setdefault((kind, resource_id), [])
+            while active and active[0][0] <= row.start:
+                heapq.heappop(active)
+            for other_end, other_id in active:
+                overlap = (max(row.start, span_start), min(row.end, other_end, span_end))
+                if overlap[0] >= overlap[1]:
+                    continue
+                if len(conflicts) == limit:
+                    return conflicts, True
+                conflicts.append(Conflict(kind, resource_id, other_id, row.id, *overlap))
+            heapq.heappush(active, (row.end, row.id))
+    return conflicts, False
@@ -1,7 +1,7 @@
 from pydantic import BaseModel
-from typing import Optional, List
-from datetime import date
-from app.models import MaintenanceType, Priority, RequestStage, EquipmentStatus, MaintenanceFor
+from typing import Any, Optional, List
+from datetime import date, datetime
+from app.models import MaintenanceType, Priority, RequestStage, EquipmentStatus, MaintenanceFor, JobStatus
 
 # Category Schemas
 class CategoryBase(BaseModel):
@@ -77,10 +77,17 @@ class EquipmentCreate(EquipmentBase):
 
 class Equipment(EquipmentBase):
     id: int
+    maintenance_count: Optional["EquipmentCount"] = None
     
     class Config:
         from_attributes = True
 
+class EquipmentSuggestion(BaseModel):
+    id: int
+    name: str
+    serial_number: str
+    last_maintenance: Optional[date] = None
+
 # Maintenance Request Schemas
 class MaintenanceRequestBase(BaseModel):
     subject: str
@@ -127,6 +134,8 @@ class MaintenanceRequestUpdate(BaseModel):
 
 class MaintenanceRequest(MaintenanceRequestBase):
     id: int
+    archived: bool = False
+    closed_at: Optional[datetime] = None
     category: Optional[Category] = None
     team: Optional[Team] = None
     equipment: Optional[Equipment] = None
@@ -139,10 +148,14 @@ class EquipmentCount(BaseModel):
     total: int
     maintenance_active: int
 
+class EquipmentMaintenanceCount(EquipmentCount):
+    equipment_id: int
+
 class DashboardStats(BaseModel):
     critical_equipment_count: int
     technician_load: int
     open_requests_count: int
+    overdue_requests_count: int = 0
 
 class ReportItem(BaseModel):
     name: str
@@ -152,6 +165,32 @@ class DashboardReports(BaseModel):
     requests_per_team: List[ReportItem]
     requests_per_category: List[ReportItem]
 
+class RecentRequest(BaseModel):
+    id: int
+    subject: str
+    employee: str
+    technician: str
+    category: str
+    stage: str
+    company: str
+
+class DashboardSummary(BaseModel):
+    stats: DashboardStats
+    reports: DashboardReports
+    recent_requests: List[RecentRequest]
+
+# Delta Sync Schemas
+class SyncDeleted(BaseModel):
+    equipments: List[int] = []
+    requests: List[int] = []
+
+class SyncChanges(BaseModel):
+    token: str
+    has_more: bool
+    equipments: List[Equipment]
+    requests: List[MaintenanceRequest]
+    deleted: SyncDeleted
+
 # User Schemas
 class UserBase(BaseModel):
     email: str
@@ -169,6 +208,7 @@ class UserLogin(BaseModel):
 class UserResponse(UserBase):
     id: int
     team_id: Optional[int] = None
+    company_id: Optional[str] = None
 
     class Config:
         from_attributes = True
@@ -176,3 +216,79 @@ class UserResponse(UserBase):
 class Token(BaseModel):
     access_token: str
     token_type: str
+
+# Job Schemas
+class Job(BaseModel):
+    id: int
+    type: str
+    status: JobStatus
+    priority: int
+    attempts: int
+    max_attempts: int
+    run_at: datetime
+    last_error: Optional[str] = None
+    result: Optional[Any] = None
+    output_type: Optional[str] = None
+    created_at: datetime
+    finished_at: Optional[datetime] = None
+
+    class Config:
+        from_attributes = True
+
+# Request history (stage/technician/priority changes)
+class RequestEvent(BaseModel):
+    id: int
+    ts: datetime
+    field: str
+    old_value: Optional[str] = None
+    new_value: Optional[str] = None
+    actor_id: Optional[int] = None
+
+    class Config:
+        from_attributes = True
+
+# Attachment Schemas
+class Attachment(BaseModel):
+    id: int
+    request_id: int
+    filename: str
+    content_type: str
+    size: int
+    sha256: str
+    uploaded_by_id: Optional[int] = None
+    created_at: datetime
+
+    class Config:
+        from_attributes = True
+
+# Scheduling Schemas
+class ScheduleConflict(BaseModel):
+    resource: str  # "technician" / "equipment" / "work_center"
+    resource_id: int
+    request_id: Optional[int] = None
+    conflicting_request_id: int
+    start: datetime
+    end: datetime
+
+    class Config:
+        from_attributes = True
+
+class ScheduleConflictReport(BaseModel):
+    conflicts: List[ScheduleConflict]
+    truncated: bool = False
+
+# Batch Schemas
+class BatchCall(BaseModel):
+    id: Optional[str] = None  # echoed back to match results to calls
+    path: str  # e.g. "/requests/?stage=New Request&expand=equipment"
+
+class BatchRequest(BaseModel):
+    requests: List[BatchCall]
+
+class BatchResult(BaseModel):
+    id: Optional[str] = None
+    status: int
+    body: Any = None
+
+class BatchResponse(BaseModel):
+    responses: List[BatchResult]
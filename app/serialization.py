@@ -0,0 +1,21 @@
+from functools import lru_cache
+from typing import Any
+
+from fastapi import Response
+from pydantic import TypeAdapter
+
+
+@lru_cache(maxsize=None)
+def adapter_for(tp: Any) -> TypeAdapter:
+    # TypeAdapters compile their validator/serializer once; cache them per type
+    return TypeAdapter(tp)
+
+
+def json_response(tp: Any, data: Any, status_code: int = 200) -> Response:
+    # Validate ORM objects / row mappings once and let pydantic-core write the
+    # JSON bytes directly. Returning a Response makes FastAPI skip its own
+    # response_model validation and jsonable_encoder pass; keep response_model
+    # on the route for the OpenAPI schema.
+    adapter = adapter_for(tp)
+    body = adapter.dump_json(adapter.validate_python(data, from_attributes=True))
+    return Response(content=body, status_code=status_code, media_type="application/json")
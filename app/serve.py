@@ -0,0 +1,166 @@
+import argparse
+import asyncio
+import glob
+import logging
+import multiprocessing
+import multiprocessing.connection
+import os
+import signal
+import sys
+import tempfile
+
+import uvicorn
+from prometheus_client import multiprocess
+
+from app.health import health
+
+# Production entry point: python -m app.serve
+#
+# The parent creates the tables once, binds the listening socket and starts
+# N worker processes that share it. Every worker gets an equal slice of the
+# global DB connection budget, warms up in its lifespan (pool, schemas, lazy
+# imports) and only then starts accepting connections.
+#
+# On SIGTERM/SIGINT a worker first drains: /health/ready turns 503, open SSE
+# streams are closed, and after --drain-delay the server stops accepting and
+# waits up to --graceful-timeout for in-flight requests. A second signal
+# skips the delay.
+#
+# Workers share Prometheus samples through PROMETHEUS_MULTIPROC_DIR (a fresh
+# temporary directory unless set), so /metrics reports all of them whichever
+# worker answers; the live gauges of a worker that exits are dropped.
+
+logger = logging.getLogger("uvicorn.error")
+
+# Dedicated connections each worker holds outside its pool (LISTEN for SSE
+# events and for typeahead index changes)
+RESERVED_CONNECTIONS_PER_WORKER = 2
+
+
+def pool_slice(budget: int, workers: int) -> int:
+    per_worker = budget // workers - RESERVED_CONNECTIONS_PER_WORKER
+    if per_worker < 1:
+        raise ValueError(
+            f"DB connection budget {budget} is too small for {workers} workers "
+            f"(each needs at least {1 + RESERVED_CONNECTIONS_PER_WORKER})"
+        )
+    return per_worker
+
+
+class DrainingServer(uvicorn.Server):
+    def __init__(self, config: uvicorn.Config, drain_delay: float):
+        super().__init__(config)
+        self.drain_delay = drain_delay
+        self._drain_task = None
+
+    def handle_exit(self, sig, frame):
+        if self._drain_task is not None or self.drain_delay <= 0 or self.should_exit:
+            super().handle_exit(sig, frame)
+            return
+        health.begin_drain()
+        # Keep serving while load balancers notice the failing readiness probe
+        loop = asyncio.get_event_loop()
+        self._drain_task = loop.create_task(self._exit_after_drain(sig))
+
+    async def _exit_after_drain(self, sig):
+        await asyncio.sleep(self.drain_delay)
+        super().handle_exit(sig, None)
+
+
+def _run_worker(config_kwargs: dict, drain_delay: float, sockets):
+    config = uvicorn.Config("app.app:app", **config_kwargs)
+    DrainingServer(config, drain_delay).run(sockets=sockets)
+
+
+def _create_tables():
+    from app.companies import upgrade_schema
+    from app.database import Base, engine
+
+    async def create():
+        async with engine.begin() as conn:
+            await conn.run_sync(Base.metadata.create_all)
+            await conn.run_sync(upgrade_schema)
+        await engine.dispose()
+
+    asyncio.run(create())
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(prog="python -m app.serve", description="Run the GearGuard API with multiple workers")
+    parser.add_argument("--host", default=os.getenv("HOST", "0.0.0.0"))
+    parser.add_argument("--port", type=int, default=int(os.getenv("PORT", "8000")))
+    parser.add_argument("--workers", type=int, default=int(os.getenv("WEB_CONCURRENCY", "0")) or os.cpu_count() or 1)
+    parser.add_argument(
+        "--db-connections", type=int, default=int(os.getenv("DB_CONNECTION_BUDGET", "50")),
+        help="Total Postgres connections all workers together may open",
+    )
+    parser.add_argument("--drain-delay", type=float, default=float(os.getenv("DRAIN_DELAY", "5")),
+                        help="Seconds to report not-ready before closing the listener")
+    parser.add_argument("--graceful-timeout", type=float, default=float(os.getenv("GRACEFUL_TIMEOUT", "30")),
+                        help="Seconds to wait for in-flight requests after the listener closes")
+    parser.add_argument("--log-level", default=os.getenv("LOG_LEVEL", "info"))
+    args = parser.parse_args(argv)
+
+    try:
+        pool_size = pool_slice(args.db_connections, args.workers)
+    except ValueError as e:
+        parser.error(str(e))
+
+    # Workers are spawned, so they read these at import time via app.config.
+    # A hard cap per worker (no overflow) keeps the sum within the budget.
+    os.environ["DB_POOL_SIZE"] = str(pool_size)
+    os.environ["DB_MAX_OVERFLOW"] = "0"
+    os.environ["CREATE_TABLES_ON_STARTUP"] = "false"
+
+    _create_tables()
+
+    metrics_dir = os.environ.get("PROMETHEUS_MULTIPROC_DIR") or tempfile.mkdtemp(prefix="gearguard-metrics-")
+    os.makedirs(metrics_dir, exist_ok=True)
+    # Samples of an earlier run would be summed into this one's
+    for path in glob.glob(os.path.join(metrics_dir, "*.db")):
+        os.remove(path)
+    os.environ["PROMETHEUS_MULTIPROC_DIR"] = metrics_dir
+
+    config_kwargs = {
+        "host": args.host,
+        "port": args.port,
+        "log_level": args.log_level,
+        "timeout_graceful_shutdown": args.graceful_timeout,
+        "proxy_headers": True,
+    }
+    config = uvicorn.Config("app.app:app", **config_kwargs)
+    logging.basicConfig(level=args.log_level.upper())
+    sock = config.bind_socket()
+    logger.info(
+        "Starting %d workers, %d pooled DB connections each (budget %d)",
+        args.workers, pool_size, args.db_connections,
+    )
+
+    ctx = multiprocessing.get_context("spawn")
+    workers = [
+        ctx.Process(target=_run_worker, args=(config_kwargs, args.drain_delay, [sock]), daemon=False)
+        for _ in range(args.workers)
+    ]
+
+    def forward(sig, frame):
+        for worker in workers:
+            if worker.is_alive():
+                os.kill(worker.pid, sig)
+
+    signal.signal(signal.SIGTERM, forward)
+    signal.signal(signal.SIGINT, forward)
+
+    for worker in workers:
+        worker.start()
+    running = {worker.sentinel: worker for worker in workers}
+    while running:
+        for sentinel in multiprocessing.connection.wait(list(running)):
+            worker = running.pop(sentinel)
+            worker.join()
+            multiprocess.mark_process_dead(worker.pid, metrics_dir)
+    sock.close()
+    return max((w.exitcode or 0) for w in workers)
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,298 @@
+import asyncio
+import contextvars
+import hashlib
+import json
+import os
+import random
+import re
+import time
+from datetime import datetime
+from typing import Dict, Optional
+
+from sqlalchemy import event, text
+
+from app.config import (
+    SLOW_QUERY_EXPLAIN_RATE,
+    SLOW_QUERY_LOG,
+    SLOW_QUERY_MS,
+    SLOW_QUERY_QUEUE_SIZE,
+)
+from app.metrics import current_route
+
+# Slow-query recorder. Statements slower than SLOW_QUERY_MS are grouped by
+# normalized SQL and kept in memory (GET /admin/slow-queries), and every
+# occurrence is appended to SLOW_QUERY_LOG as one JSON line. For a sample of
+# slow SELECTs, EXPLAIN (ANALYZE, BUFFERS) is captured in the background on a
+# separate connection, so the request that was slow is not delayed further.
+#
+# Statements that fail (e.g. cancelled by statement_timeout) are recorded with
+# their error once they ran past the threshold, but never explained: ANALYZE
+# would run them again.
+#
+# Bound values are only held in memory for the EXPLAIN; the log and the
+# endpoint show the parameter *shape* (types, list lengths), never the values.
+# Postgres prints the bound values into the plan's conditions as constants,
+# so the literals in those are replaced by "?" before the plan is kept.
+
+IN_LIST = re.compile(r"\(\s*\$\d+(?:::\w+)?(?:\s*,\s*\$\d+(?:::\w+)?)+\s*\)")
+NUMBER = re.compile(r"\b\d+(?:\.\d+)?\b")
+PLACEHOLDER = re.compile(r"\$\d+")
+WHITESPACE = re.compile(r"\s+")
+# A quoted constant ('a''b'::text, '{1,2}'::integer[]) or a number
+PLAN_LITERAL = re.compile(r"'(?:[^']|'')*'|\b\d+(?:\.\d+)?\b")
+
+# Re-explain a statement at most this often
+EXPLAIN_EVERY = 300.0
+EXPLAIN_TIMEOUT_MS = 30_000
+# Distinct statements kept in memory; the one with the least total time goes first
+MAX_FINGERPRINTS = 500
+
+# EXPLAIN ANALYZE runs the query again; never record or explain that run
+_explaining = contextvars.ContextVar("slow_query_explaining", default=False)
+
+
+def normalize(statement: str) -> str:
+    sql = WHITESPACE.sub(" ", statement).strip()
+    # "IN ($1, $2, $3)" and "IN ($1)" are the same query with different list sizes
+    sql = IN_LIST.sub("(...)", sql)
+    sql = PLACEHOLDER.sub("?", sql)
+    return NUMBER.sub("?", sql)
+
+
+def _is_expression(key: str) -> bool:
+    # "Filter", "Index Cond", "Hash Cond", "Sort Key", "Group Key", "Output", ...
+    return key.endswith(("Cond", "Filter", "Key")) or key == "Output"
+
+
+def redact_plan(plan):
+    # EXPLAIN (FORMAT JSON) output with literals in expressions masked
+    if isinstance(plan, list):
+        return [redact_plan(item) for item in plan]
+    if not isinstance(plan, dict):
+        return plan
+    redacted = {}
+    for key, value in plan.items():
+        if _is_expression(key) and isinstance(value, str):
+            value = PLAN_LITERAL.sub("?", value)
+        elif _is_expression(key) and isinstance(value, list):
+            value = [PLAN_LITERAL.sub("?", v) if isinstance(v, str) else v for v in value]
+        else:
+            value = redact_plan(value)
+        redacted[key] = value
+    return redacted
+
+
+def parameter_shape(parameters) -> list:
+    if isinstance(parameters, dict):
+        values = list(parameters.values())
+    elif isinstance(parameters, (list, tuple)):
+        values = list(parameters)
+    else:
+        return []
+    shape = []
+    for value in values:
+        if isinstance(value, (list, tuple)):
+            shape.append(f"{type(value).__name__}[{len(value)}]")
+        else:
+            shape.append(type(value).__name__)
+    return shape
+
+
+class SlowQuery:
+    def __init__(self, fingerprint: str, normalized: str, statement: str):
+        self.fingerprint = fingerprint
+        self.normalized = normalized
+        self.statement = statement
+        self.count = 0
+        self.errors = 0
+        self.last_error: Optional[str] = None
+        self.total_ms = 0.0
+        self.max_ms = 0.0
+        self.last_seen: Optional[str] = None
+        self.routes: Dict[str, int] = {}
+        self.parameter_shape: list = []
+        self.plan = None
+        self.plan_captured_at: Optional[str] = None
+        self.last_explain = 0.0
+
+    def to_dict(self) -> dict:
+        return {
+            "fingerprint": self.fingerprint,
+            "sql": self.normalized,
+            "count": self.count,
+            "errors": self.errors,
+            "last_error": self.last_error,
+            "total_ms": round(self.total_ms, 3),
+            "mean_ms": round(self.total_ms / self.count, 3) if self.count else 0.0,
+            "max_ms": round(self.max_ms, 3),
+            "last_seen": self.last_seen,
+            "routes": self.routes,
+            "parameter_shape": self.parameter_shape,
+            "plan": self.plan,
+            "plan_captured_at": self.plan_captured_at,
+        }
+
+
+class SlowQueryLog:
+    def __init__(self, threshold_ms: float, explain_rate: float, log_path: Optional[str], queue_size: int = 1000):
+        self.threshold_ms = threshold_ms
+        self.explain_rate = explain_rate
+        self.log_path = log_path
+        self.queue_size = queue_size
+        self.queries: Dict[str, SlowQuery] = {}
+        self._engine = None
+        self._queue: Optional[asyncio.Queue] = None
+        self._worker: Optional[asyncio.Task] = None
+
+    def instrument(self, engine):
+        self._engine = engine
+        sync_engine = engine.sync_engine
+
+        @event.listens_for(sync_engine, "before_cursor_execute")
+        def before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+            conn.info.setdefault("slow_query_start", []).append(time.perf_counter())
+
+        @event.listens_for(sync_engine, "after_cursor_execute")
+        def after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+            elapsed_ms = (time.perf_counter() - conn.info["slow_query_start"].pop()) * 1000
+            if elapsed_ms >= self.threshold_ms and not _explaining.get():
+                self.record(statement, parameters, elapsed_ms, executemany)
+
+        @event.listens_for(sync_engine, "handle_error")
+        def handle_error(context):
+            # after_cursor_execute never fires for a statement that raised
+            starts = context.connection.info.get("slow_query_start") if context.connection is not None else None
+            if not starts:
+                return
+            elapsed_ms = (time.perf_counter() - starts.pop()) * 1000
+            if elapsed_ms >= self.threshold_ms and context.statement and not _explaining.get():
+                executemany = bool(context.execution_context and context.execution_context.executemany)
+                error = f"{type(context.original_exception).__name__}: {context.original_exception}"
+                self.record(context.statement, context.parameters, elapsed_ms, executemany, error=error)
+
+    def record(self, statement: str, parameters, elapsed_ms: float, executemany: bool = False,
+               error: Optional[str] = None):
+        normalized = normalize(statement)
+        fingerprint = hashlib.sha1(normalized.encode()).hexdigest()[:16]
+        query = self.queries.get(fingerprint)
+        if query is None:
+            if len(self.queries) >= MAX_FINGERPRINTS:
+                del self.queries[min(self.queries, key=lambda f: self.queries[f].total_ms)]
+            query = self.queries[fingerprint] = SlowQuery(fingerprint, normalized, statement)
+        route = current_route()
+        shape = parameter_shape(parameters[0] if executemany and parameters else parameters)
+        now = datetime.utcnow().isoformat()
+
+        query.count += 1
+        query.total_ms += elapsed_ms
+        query.max_ms = max(query.max_ms, elapsed_ms)
+        query.last_seen = now
+        query.routes[route] = query.routes.get(route, 0) + 1
+        query.parameter_shape = shape
+        if error is not None:
+            query.errors += 1
+            query.last_error = error
+
+        if self._queue is None:
+            return
+        explain = (
+            error is None
+            and not executemany
+            and normalized.upper().startswith(("SELECT", "WITH"))
+            and time.monotonic() - query.last_explain >= EXPLAIN_EVERY
+            and random.random() < self.explain_rate
+        )
+        if explain:
+            query.last_explain = time.monotonic()
+        entry = {
+            "ts": now,
+            "fingerprint": fingerprint,
+            "duration_ms": round(elapsed_ms, 3),
+            "route": route,
+            "sql": normalized,
+            "parameter_shape": shape,
+        }
+        if error is not None:
+            entry["error"] = error
+        try:
+            self._queue.put_nowait((entry, statement, parameters if explain else None))
+        except asyncio.QueueFull:
+            # Never let the recorder back-pressure the queries it watches
+            pass
+
+    def top(self, limit: int = 20, order_by: str = "total_ms"):
+        key = {
+            "total_ms": lambda q: q.total_ms,
+            "max_ms": lambda q: q.max_ms,
+            "count": lambda q: q.count,
+        }[order_by]
+        return [q.to_dict() for q in sorted(self.queries.values(), key=key, reverse=True)[:limit]]
+
+    def reset(self):
+        self.queries.clear()
+
+    async def start(self):
+        self._queue = asyncio.Queue(maxsize=self.queue_size)
+        self._worker = asyncio.create_task(self._run())
+
+    async def stop(self, timeout: float = 5.0):
+        if self._worker is None:
+            return
+        # Let the worker finish what is queued, then give up on pending EXPLAINs
+        try:
+            self._queue.put_nowait(None)
+            await asyncio.wait_for(self._worker, timeout)
+        except (asyncio.QueueFull, asyncio.TimeoutError):
+            self._worker.cancel()
+        self._worker = None
+        self._queue = None
+
+    async def _run(self):
+        while True:
+            item = await self._queue.get()
+            if item is None:
+                return
+            entry, statement, parameters = item
+            if parameters is not None:
+                plan = await self._explain(statement, parameters)
+                if plan is not None:
+                    query = self.queries.get(entry["fingerprint"])
+                    if query is not None:
+                        query.plan = plan
+                        query.plan_captured_at = datetime.utcnow().isoformat()
+                    entry["plan"] = plan
+            if self.log_path:
+                await asyncio.to_thread(self._append, entry)
+
+    def _append(self, entry: dict):
+        directory = os.path.dirname(self.log_path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        with open(self.log_path, "a") as f:
+            f.write(json.dumps(entry, default=str) + "\n")
+
+    async def _explain(self, statement: str, parameters):
+        if self._engine is None or self._engine.dialect.name != "postgresql":
+            return None
+        token = _explaining.set(True)
+        try:
+            async with self._engine.connect() as conn:
+                # ANALYZE executes the statement: keep it read-only, bounded and rolled back
+                trans = await conn.begin()
+                try:
+                    await conn.execute(text("SET TRANSACTION READ ONLY"))
+                    await conn.execute(text(f"SET LOCAL statement_timeout = {EXPLAIN_TIMEOUT_MS}"))
+                    result = await conn.exec_driver_sql(
+                        "EXPLAIN (ANALYZE, BUFFERS, FORMAT JSON) " + statement, parameters
+                    )
+                    plan = result.scalar()
+                finally:
+                    await trans.rollback()
+            return redact_plan(json.loads(plan) if isinstance(plan, str) else plan)
+        except Exception as e:
+            return {"error": f"{type(e).__name__}: {e}"}
+        finally:
+            _explaining.reset(token)
+
+
+slow_query_log = SlowQueryLog(SLOW_QUERY_MS, SLOW_QUERY_EXPLAIN_RATE, SLOW_QUERY_LOG, SLOW_QUERY_QUEUE_SIZE)
@@ -0,0 +1,257 @@
+import asyncio
+import hashlib
+import hmac
+import os
+import re
+from datetime import datetime, timezone
+from typing import AsyncIterator, Optional
+from urllib.parse import quote
+
+import httpx
+
+from app.config import (
+    ATTACHMENT_CHUNK_SIZE,
+    S3_ACCESS_KEY,
+    S3_BUCKET,
+    S3_ENDPOINT_URL,
+    S3_PART_SIZE,
+    S3_REGION,
+    S3_SECRET_KEY,
+    STORAGE_BACKEND,
+    STORAGE_LOCAL_DIR,
+)
+
+# Object storage for attachments. Backends store opaque objects under keys
+# chosen by the app ("blobs/<sha256>", "tmp/<uuid>") and move data in chunks,
+# so no object is ever held in memory whole:
+#
+#   LocalStorage - files under STORAGE_LOCAL_DIR (single machine / dev)
+#   S3Storage    - any S3-compatible service: AWS, or MinIO locally
+#                  (STORAGE_BACKEND=s3, S3_ENDPOINT_URL=http://localhost:9000)
+
+
+class ObjectNotFound(Exception):
+    pass
+
+
+class LocalStorage:
+    def __init__(self, root: str, chunk_size: int = ATTACHMENT_CHUNK_SIZE):
+        self.root = os.path.abspath(root)
+        self.chunk_size = chunk_size
+
+    def path(self, key: str) -> str:
+        # Keys are app-generated; still never resolve outside the root
+        path = os.path.abspath(os.path.join(self.root, key))
+        if not path.startswith(self.root + os.sep):
+            raise ValueError(f"Invalid storage key {key!r}")
+        return path
+
+    async def write(self, key: str, chunks: AsyncIterator[bytes]) -> int:
+        path = self.path(key)
+        await asyncio.to_thread(os.makedirs, os.path.dirname(path), exist_ok=True)
+        f = await asyncio.to_thread(open, path, "wb")
+        size = 0
+        try:
+            async for chunk in chunks:
+                await asyncio.to_thread(f.write, chunk)
+                size += len(chunk)
+        except BaseException:
+            await asyncio.to_thread(f.close)
+            await asyncio.to_thread(_remove, path)
+            raise
+        await asyncio.to_thread(f.close)
+        return size
+
+    async def read(self, key: str, start: int = 0, end: Optional[int] = None) -> AsyncIterator[bytes]:
+        # Bytes start..end inclusive (to the end of the object without `end`)
+        path = self.path(key)
+        try:
+            f = await asyncio.to_thread(open, path, "rb")
+        except FileNotFoundError:
+            raise ObjectNotFound(key)
+        try:
+            await asyncio.to_thread(f.seek, start)
+            remaining = None if end is None else end - start + 1
+            while remaining is None or remaining > 0:
+                size = self.chunk_size if remaining is None else min(self.chunk_size, remaining)
+                chunk = await asyncio.to_thread(f.read, size)
+                if not chunk:
+                    return
+                if remaining is not None:
+                    remaining -= len(chunk)
+                yield chunk
+        finally:
+            await asyncio.to_thread(f.close)
+
+    async def exists(self, key: str) -> bool:
+        return await asyncio.to_thread(os.path.exists, self.path(key))
+
+    async def move(self, src: str, dst: str):
+        dst_path = self.path(dst)
+        await asyncio.to_thread(os.makedirs, os.path.dirname(dst_path), exist_ok=True)
+        await asyncio.to_thread(os.replace, self.path(src), dst_path)
+
+    async def delete(self, key: str):
+        await asyncio.to_thread(_remove, self.path(key))
+
+    def local_path(self, key: str) -> Optional[str]:
+        # Lets CPU work in other processes read the file directly
+        return self.path(key)
+
+    async def close(self):
+        pass
+
+
+def _remove(path: str):
+    try:
+        os.remove(path)
+    except FileNotFoundError:
+        pass
+
+
+class S3Storage:
+    # Path-style requests signed with SigV4, so MinIO and other stand-ins work
+    # without DNS per bucket. Objects larger than one part are sent as a
+    # multipart upload; memory per upload stays at one part (S3_PART_SIZE).
+
+    def __init__(self, endpoint: str, bucket: str, region: str, access_key: str, secret_key: str,
+                 part_size: int = S3_PART_SIZE, chunk_size: int = ATTACHMENT_CHUNK_SIZE):
+        self.endpoint = endpoint.rstrip("/")
+        self.bucket = bucket
+        self.region = region
+        self.access_key = access_key
+        self.secret_key = secret_key
+        # S3 rejects parts under 5 MiB (except the last)
+        self.part_size = max(part_size, 5 * 1024 * 1024)
+        self.chunk_size = chunk_size
+        self.host = httpx.URL(self.endpoint).netloc.decode()
+        self._client = httpx.AsyncClient(timeout=httpx.Timeout(60.0, connect=10.0))
+
+    async def write(self, key: str, chunks: AsyncIterator[bytes]) -> int:
+        buffer = bytearray()
+        upload_id = None
+        parts = []
+        size = 0
+        try:
+            async for chunk in chunks:
+                buffer += chunk
+                size += len(chunk)
+                while len(buffer) >= self.part_size:
+                    if upload_id is None:
+                        upload_id = await self._create_multipart(key)
+                    part, buffer = bytes(buffer[:self.part_size]), buffer[self.part_size:]
+                    parts.append(await self._upload_part(key, upload_id, len(parts) + 1, part))
+            if upload_id is None:
+                await self._request("PUT", key, content=bytes(buffer))
+                return size
+            if buffer:
+                parts.append(await self._upload_part(key, upload_id, len(parts) + 1, bytes(buffer)))
+            await self._complete_multipart(key, upload_id, parts)
+        except BaseException:
+            if upload_id is not None:
+                await self._request("DELETE", key, params={"uploadId": upload_id}, ok=(204, 404))
+            raise
+        return size
+
+    async def read(self, key: str, start: int = 0, end: Optional[int] = None) -> AsyncIterator[bytes]:
+        headers = {}
+        if start or end is not None:
+            headers["Range"] = f"bytes={start}-{'' if end is None else end}"
+        request = self._signed("GET", key, {}, headers, b"")
+        response = await self._client.send(request, stream=True)
+        try:
+            if response.status_code == 404:
+                raise ObjectNotFound(key)
+            response.raise_for_status()
+            async for chunk in response.aiter_bytes(self.chunk_size):
+                yield chunk
+        finally:
+            await response.aclose()
+
+    async def exists(self, key: str) -> bool:
+        response = await self._request("HEAD", key, ok=(200, 404))
+        return response.status_code == 200
+
+    async def move(self, src: str, dst: str):
+        # Server-side copy (single request up to 5 GB, above ATTACHMENT_MAX_BYTES)
+        await self._request("PUT", dst, headers={"x-amz-copy-source": f"/{self.bucket}/{quote(src)}"})
+        await self.delete(src)
+
+    async def delete(self, key: str):
+        await self._request("DELETE", key, ok=(204, 200, 404))
+
+    def local_path(self, key: str) -> Optional[str]:
+        return None
+
+    async def close(self):
+        await self._client.aclose()
+
+    async def _create_multipart(self, key: str) -> str:
+        response = await self._request("POST", key, params={"uploads": ""})
+        return _xml_value(response.text, "UploadId")
+
+    async def _upload_part(self, key: str, upload_id: str, number: int, data: bytes) -> str:
+        response = await self._request("PUT", key, params={"partNumber": str(number), "uploadId": upload_id}, content=data)
+        return response.headers["etag"]
+
+    async def _complete_multipart(self, key: str, upload_id: str, etags):
+        body = "<CompleteMultipartUpload>" + "".join(
+            f"<Part><PartNumber>{n}</PartNumber><ETag>{etag}</ETag></Part>" for n, etag in enumerate(etags, 1)
+        ) + "</CompleteMultipartUpload>"
+        response = await self._request("POST", key, params={"uploadId": upload_id}, content=body.encode())
+        # Errors can arrive with 200 once the completion has started
+        if "<Error>" in response.text:
+            raise httpx.HTTPStatusError(response.text, request=response.request, response=response)
+
+    async def _request(self, method: str, key: str, params: Optional[dict] = None, headers: Optional[dict] = None,
+                       content: bytes = b"", ok=(200,)) -> httpx.Response:
+        response = await self._client.send(self._signed(method, key, params or {}, headers or {}, content))
+        if response.status_code not in ok:
+            response.raise_for_status()
+            raise httpx.HTTPStatusError(f"Unexpected status {response.status_code}", request=response.request, response=response)
+        return response
+
+    def _signed(self, method: str, key: str, params: dict, headers: dict, content: bytes) -> httpx.Request:
+        now = datetime.now(timezone.utc)
+        amz_date, day = now.strftime("%Y%m%dT%H%M%SZ"), now.strftime("%Y%m%d")
+        path = f"/{self.bucket}/{quote(key)}"
+        query = "&".join(f"{quote(k, safe='')}={quote(v, safe='')}" for k, v in sorted(params.items()))
+        payload_hash = hashlib.sha256(content).hexdigest()
+
+        headers = {name.lower(): value for name, value in headers.items()}
+        headers.update({"host": self.host, "x-amz-date": amz_date, "x-amz-content-sha256": payload_hash})
+        signed = sorted(headers)
+        canonical_headers = "".join(f"{name}:{headers[name].strip()}\n" for name in signed)
+        canonical_request = "\n".join([method, path, query, canonical_headers, ";".join(signed), payload_hash])
+        scope = f"{day}/{self.region}/s3/aws4_request"
+        string_to_sign = "\n".join([
+            "AWS4-HMAC-SHA256", amz_date, scope, hashlib.sha256(canonical_request.encode()).hexdigest(),
+        ])
+        signing_key = f"AWS4{self.secret_key}".encode()
+        for part in (day, self.region, "s3", "aws4_request"):
+            signing_key = hmac.new(signing_key, part.encode(), hashlib.sha256).digest()
+        signature = hmac.new(signing_key, string_to_sign.encode(), hashlib.sha256).hexdigest()
+        headers["authorization"] = (
+            f"AWS4-HMAC-SHA256 Credential={self.access_key}/{scope}, "
+            f"SignedHeaders={';'.join(signed)}, Signature={signature}"
+        )
+        url = f"{self.endpoint}{path}" + (f"?{query}" if query else "")
+        return self._client.build_request(method, url, headers=headers, content=content or None)
+
+
+def _xml_value(document: str, tag: str) -> str:
+    match = re.search(f"<{tag}>([^<]+)</{tag}>", document)
+    if match is None:
+        raise ValueError(f"No <{tag}> in S3 response")
+    return match.group(1)
+
+
+def create_storage():
+    if STORAGE_BACKEND == "s3":
+        return S3Storage(S3_ENDPOINT_URL, S3_BUCKET, S3_REGION, S3_ACCESS_KEY, S3_SECRET_KEY)
+    if STORAGE_BACKEND == "local":
+        return LocalStorage(STORAGE_LOCAL_DIR)
+    raise ValueError(f"Unknown STORAGE_BACKEND {STORAGE_BACKEND!r}")
+
+
+storage = create_storage()
@@ -0,0 +1,144 @@
+import contextvars
+from typing import Optional
+from urllib.parse import parse_qs
+
+from jose import JWTError, jwt
+from sqlalchemy import event, false
+from sqlalchemy.orm import Session, with_loader_criteria
+
+from app.auth_utils import ALGORITHM, SECRET_KEY
+from app.config import TENANCY_ENABLED
+from app.models import Attachment, Category, Equipment, Job, MaintenanceRequest, RequestEvent, SyncTombstone, Team, User, WorkCenter
+
+# Company (tenant) scoping. auth.login puts the user's company in the JWT
+# "tenant" claim; TenantMiddleware reads it into current_tenant for the whole
+# request, and two Session hooks apply it to every ORM statement:
+#   - do_orm_execute adds "<company column> = :tenant" for each tenant model
+#     (joins, aliases and eager loads included)
+#   - before_flush stamps new and changed rows with the tenant
+# API calls without a claim (anonymous, or a user with no company) fail
+# closed: they run as NO_TENANT, which matches no company's rows, and what
+# they write belongs to no company. Background work outside a request (jobs
+# without a company, the archiver) is not scoped. All of this is off unless
+# TENANCY_ENABLED is set; app/companies.py moves the rows of an existing
+# single-company install into a company before it is.
+#
+# Statements must be ORM-enabled for the filter to apply: select models or
+# model attributes (see orm_columns), not Table columns.
+#
+# The skip_tenant_filter execution option turns the filter off: True for the
+# statement and everything it loads (logins, which look across companies),
+# SKIP_STATEMENT for a statement that carries its own tenant predicate (see
+# app/queries.py) while its eager loads are still filtered here.
+
+SKIP_STATEMENT = "statement"
+
+# Models with a company column, exposed on each as the `tenant_key` synonym
+TENANT_MODELS = (Attachment, Category, Equipment, Job, MaintenanceRequest, RequestEvent, SyncTombstone, Team, User, WorkCenter)
+
+current_tenant = contextvars.ContextVar("current_tenant", default=None)
+
+
+class _NoTenant:
+    def __repr__(self):
+        return "NO_TENANT"
+
+
+# current_tenant of API calls without a company
+NO_TENANT = _NoTenant()
+
+
+def orm_columns(model):
+    # Every mapped column as an ORM attribute; select(*orm_columns(M)) returns
+    # plain rows like select(*M.__table__.columns) but stays tenant-filtered.
+    # Deferred columns (blobs, internal ranges) are left out.
+    return [getattr(model, attr.key) for attr in model.__mapper__.column_attrs if not attr.deferred]
+
+
+def cache_key(*parts) -> str:
+    # Namespace for process caches so one company never gets another's entries
+    tenant = current_tenant.get()
+    if tenant is None:
+        namespace = "*"
+    elif tenant is NO_TENANT:
+        namespace = "!"
+    else:
+        namespace = "=" + tenant
+    return ":".join(["tenant", namespace, *map(str, parts)])
+
+
+def _tenant_from_token(token: str) -> Optional[str]:
+    try:
+        payload = jwt.decode(token, SECRET_KEY, algorithms=[ALGORITHM])
+    except JWTError:
+        return None
+    return payload.get("tenant")
+
+
+class TenantMiddleware:
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http" or not TENANCY_ENABLED:
+            await self.app(scope, receive, send)
+            return
+
+        token = None
+        for name, value in scope["headers"]:
+            if name == b"authorization":
+                scheme, _, credentials = value.decode().partition(" ")
+                if scheme.lower() == "bearer":
+                    token = credentials
+                break
+        if token is None and scope.get("query_string"):
+            # EventSource cannot send headers; /requests/stream passes ?access_token=
+            token = parse_qs(scope["query_string"].decode()).get("access_token", [None])[0]
+
+        tenant = _tenant_from_token(token) if token else None
+        if tenant is None:
+            tenant = NO_TENANT
+        ctx_token = current_tenant.set(tenant)
+        try:
+            await self.app(scope, receive, send)
+        finally:
+            current_tenant.reset(ctx_token)
+
+
+@event.listens_for(Session, "do_orm_execute")
+def _add_tenant_criteria(state):
+    tenant = current_tenant.get()
+    skip = state.execution_options.get("skip_tenant_filter", False)
+    if tenant is None or skip is True:
+        return
+    if not (state.is_select or state.is_update or state.is_delete):
+        return
+    if state.is_column_load:
+        return
+    # Criteria on the parent statement already carry over to its eager loads;
+    # a SKIP_STATEMENT parent has none to pass on
+    if state.is_relationship_load != (skip == SKIP_STATEMENT):
+        return
+    if tenant is NO_TENANT:
+        state.statement = state.statement.options(*(
+            with_loader_criteria(model, lambda cls: false(), include_aliases=True)
+            for model in TENANT_MODELS
+        ))
+        return
+    # The lambda form is adapted to aliases (e.g. two joins to users) and cached
+    state.statement = state.statement.options(*(
+        with_loader_criteria(model, lambda cls: cls.tenant_key == tenant, include_aliases=True)
+        for model in TENANT_MODELS
+    ))
+
+
+@event.listens_for(Session, "before_flush")
+def _stamp_tenant(session, flush_context, instances):
+    tenant = current_tenant.get()
+    if tenant is None:
+        return
+    if tenant is NO_TENANT:
+        tenant = None
+    for obj in (*session.new, *session.dirty):
+        if isinstance(obj, TENANT_MODELS) and obj.tenant_key != tenant:
+            obj.tenant_key = tenant
@@ -0,0 +1,22 @@
+import io
+from typing import Union
+
+# Runs in the thumbnail process pool (app/attachments.py). Kept free of app
+# imports so spawned workers start quickly and never touch the database.
+
+
+def make_thumbnail(source: Union[str, bytes], size: int) -> bytes:
+    # `source` is a file path (local storage) or the image bytes; returns a JPEG
+    from PIL import Image
+
+    try:
+        with Image.open(source if isinstance(source, str) else io.BytesIO(source)) as image:
+            # Decode at reduced scale where the format allows (JPEG), then resample
+            image.draft("RGB", (size, size))
+            image.thumbnail((size, size))
+            out = io.BytesIO()
+            image.convert("RGB").save(out, "JPEG", quality=80)
+    except (OSError, ValueError, Image.DecompressionBombError) as e:
+        # Not an image Pillow can read; re-raised as ValueError so it pickles
+        raise ValueError(f"Cannot make a thumbnail: {e}")
+    return out.getvalue()
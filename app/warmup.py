@@ -0,0 +1,48 @@
+import asyncio
+import importlib
+import logging
+
+from fastapi.routing import APIRoute
+from sqlalchemy.orm import configure_mappers
+
+from app.config import DB_POOL_SIZE
+from app.metrics import flatten_routes
+from app.serialization import adapter_for
+
+# Work done once per process before it takes traffic, so the first requests
+# after a deploy don't pay for connection setup, schema compilation or
+# imports that the routes otherwise do lazily.
+
+logger = logging.getLogger(__name__)
+
+# Imported inside route handlers (e.g. the PDF worksheet)
+LAZY_MODULES = ["reportlab.pdfgen.canvas", "reportlab.lib.pagesizes"]
+
+
+async def _open_connections(engine, count: int):
+    # Hold them all at once so the pool really grows to `count`; asyncpg also
+    # loads its type codecs on the first statement of each connection
+    connections = [engine.connect() for _ in range(count)]
+    try:
+        await asyncio.gather(*(conn.start() for conn in connections))
+        await asyncio.gather(*(conn.exec_driver_sql("SELECT 1") for conn in connections))
+    finally:
+        await asyncio.gather(*(conn.close() for conn in connections), return_exceptions=True)
+
+
+async def warm_up(app, engine):
+    configure_mappers()
+
+    for route in flatten_routes(app.routes):
+        if isinstance(route, APIRoute) and route.response_model is not None:
+            # Same key json_response() uses, e.g. List[MaintenanceRequest]
+            adapter_for(route.response_model)
+    app.openapi()
+
+    for name in LAZY_MODULES:
+        try:
+            importlib.import_module(name)
+        except ImportError:
+            logger.warning("warm-up: optional module %s not installed", name)
+
+    await _open_connections(engine, DB_POOL_SIZE)
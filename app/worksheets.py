@@ -0,0 +1,94 @@
+import asyncio
+import io
+
+from sqlalchemy.future import select
+from sqlalchemy.orm import selectinload
+
+from app.database import new_session
+from app.jobs import JobOutput, PermanentJobError, job_handler
+from app.models import MaintenanceRequest
+
+# Printable PDF worksheet for a maintenance request. Rendering is CPU-bound
+# (reportlab), so it runs in a thread, and clients that can wait for it use
+# the "render_worksheet" job (POST /requests/{id}/worksheet) instead of
+# holding a request open.
+
+
+async def load_worksheet_request(db, request_id: int):
+    result = await db.execute(
+        select(MaintenanceRequest)
+        .options(selectinload(MaintenanceRequest.category))
+        .filter(MaintenanceRequest.id == request_id)
+    )
+    return result.scalar_one_or_none()
+
+
+def worksheet_filename(request) -> str:
+    return f"Worksheet_{request.id}.pdf"
+
+
+def render_worksheet(request) -> bytes:
+    from reportlab.pdfgen import canvas
+    from reportlab.lib.pagesizes import letter
+
+    buffer = io.BytesIO()
+    c = canvas.Canvas(buffer, pagesize=letter)
+
+    # Title
+    c.setFont("Helvetica-Bold", 18)
+    c.drawString(50, 750, f"Maintenance Worksheet #{request.id}")
+
+    # Details
+    c.setFont("Helvetica", 12)
+    y = 700
+    line_height = 20
+
+    c.drawString(50, y, f"Subject: {request.subject}")
+    y -= line_height
+    c.drawString(50, y, f"Date: {request.request_date}")
+    y -= line_height
+    c.drawString(50, y, f"Priority: {request.priority}")
+    y -= line_height
+    c.drawString(50, y, f"Stage: {request.stage}")
+    y -= line_height * 2 # Space
+
+    # Target
+    if request.maintenance_for == "Equipment":
+         c.drawString(50, y, f"Equipment ID: {request.equipment_id}")
+    else:
+         c.drawString(50, y, f"Work Center ID: {request.work_center_id}")
+    y -= line_height
+
+    c.drawString(50, y, f"Category: {request.category.name if request.category else '-'}")
+    y -= line_height * 2
+
+    # Description
+    c.drawString(50, y, "Description:")
+    y -= line_height
+
+    desc = request.description or "No description provided."
+    # Simple word wrap simulation (very basic)
+    words = desc.split()
+    line = ""
+    for word in words:
+        if len(line + word) > 80:
+             c.drawString(70, y, line)
+             line = word + " "
+             y -= line_height
+        else:
+             line += word + " "
+    c.drawString(70, y, line)
+
+    # Footer
+    c.save()
+    return buffer.getvalue()
+
+
+@job_handler("render_worksheet", concurrency=2, max_attempts=3, lane="high")
+async def render_worksheet_job(payload: dict):
+    async with new_session() as db:
+        request = await load_worksheet_request(db, payload["request_id"])
+    if request is None:
+        raise PermanentJobError("Request not found")
+    pdf = await asyncio.to_thread(render_worksheet, request)
+    return JobOutput(pdf, "application/pdf", worksheet_filename(request))
@@ -0,0 +1,6 @@
+# Load-test and benchmark suite for the GearGuard API.
+#
+#   python -m bench seed --yes --equipment 100000 --requests 5000000 --teams 500 --users 5000
+#   python -m bench run --clients 50 --duration 60 --baseline bench/baseline.json
+#
+# See bench/__main__.py for all options.
@@ -0,0 +1,98 @@
+import argparse
+import asyncio
+import os
+import sys
+
+from app.database import asyncpg_dsn, connect_args
+from bench import report
+from bench.pool import run_pool
+from bench.seed import Volumes, seed
+from bench.statements import run_statements
+from bench.workload import run
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(prog="python -m bench", description="GearGuard load test and benchmark suite")
+    sub = parser.add_subparsers(dest="command", required=True)
+
+    p_seed = sub.add_parser("seed", help="Drop, recreate and bulk-load the (empty or bench-only) database at POSTGRES_URL")
+    defaults = Volumes()
+    for field in ("teams", "users", "categories", "workcenters", "equipment", "requests", "years"):
+        p_seed.add_argument(f"--{field}", type=int, default=getattr(defaults, field))
+    p_seed.add_argument("--seed", type=int, default=42, help="Random seed for reproducible data")
+    p_seed.add_argument("--yes", action="store_true", help="Confirm dropping every table at POSTGRES_URL")
+
+    p_run = sub.add_parser("run", help="Drive the mixed workload and report per-endpoint latency")
+    p_run.add_argument("--clients", type=int, default=20)
+    p_run.add_argument("--duration", type=float, default=30.0, help="Seconds")
+    p_run.add_argument("--think-time", type=float, default=0.0, help="Max random pause between calls (s)")
+    p_run.add_argument("--url", help="Benchmark a running server instead of the in-process ASGI app")
+    p_run.add_argument("--equipment", type=int, default=defaults.equipment, help="Seeded equipment count")
+    p_run.add_argument("--requests", type=int, default=defaults.requests, help="Seeded request count")
+    p_run.add_argument("--users", type=int, default=defaults.users, help="Seeded user count")
+    p_run.add_argument("--output", help="Write the summary as JSON")
+    p_run.add_argument("--baseline", help="Compare against this summary JSON and fail on regressions")
+    p_run.add_argument("--save-baseline", action="store_true", help="Write the summary to --baseline instead")
+    p_run.add_argument("--tolerance", type=float, default=0.2, help="Allowed relative regression (0.2 = 20%%)")
+
+    p_stmt = sub.add_parser("statements", help="Compare per-call overhead of ad-hoc and prebuilt hot queries")
+    p_stmt.add_argument("--iterations", type=int, default=2000)
+    p_stmt.add_argument("--request-id", type=int, default=1)
+    p_stmt.add_argument("--equipment-id", type=int, default=1)
+    p_stmt.add_argument("--tenant", help="Run as this company (adds the tenant predicate)")
+
+    p_pool = sub.add_parser("pool", help="Compare list-read throughput with connections held or released before serialization")
+    p_pool.add_argument("--pool-size", type=int, default=1)
+    p_pool.add_argument("--clients", type=int, default=2)
+    p_pool.add_argument("--duration", type=float, default=20.0, help="Seconds per mode")
+    p_pool.add_argument("--users", type=int, default=defaults.users, help="Seeded user count")
+
+    args = parser.parse_args(argv)
+
+    if args.command == "seed":
+        volumes = Volumes(**{f: getattr(args, f) for f in ("teams", "users", "categories", "workcenters", "equipment", "requests", "years")})
+        dsn = asyncpg_dsn()
+        if dsn is None:
+            parser.error("POSTGRES_URL must point at PostgreSQL")
+        if not args.yes:
+            parser.error("seed drops every table at POSTGRES_URL; pass --yes to confirm")
+        print(f"Seeding {volumes}")
+        try:
+            asyncio.run(seed(dsn, volumes, connect_args, seed_value=args.seed))
+        except ValueError as e:
+            parser.error(str(e))
+        return 0
+
+    if args.command == "statements":
+        ctx = {"request_id": args.request_id, "equipment_id": args.equipment_id}
+        asyncio.run(run_statements(ctx, args.iterations, args.tenant))
+        return 0
+
+    if args.command == "pool":
+        asyncio.run(run_pool({"users": args.users}, args.pool_size, args.clients, args.duration))
+        return 0
+
+    ctx = {"equipment": args.equipment, "requests": args.requests, "users": args.users}
+    recorder, elapsed = asyncio.run(run(ctx, args.clients, args.duration, args.url, args.think_time))
+    summary = report.summarize(recorder, elapsed)
+    report.print_summary(summary)
+    if args.output:
+        report.save(summary, args.output)
+
+    if args.baseline:
+        if args.save_baseline or not os.path.exists(args.baseline):
+            report.save(summary, args.baseline)
+            print(f"\nBaseline written to {args.baseline}")
+            return 0
+        regressions = report.compare(summary, args.baseline, args.tolerance)
+        if regressions:
+            print("\nREGRESSIONS:")
+            for line in regressions:
+                print(f"   {line}")
+            return 1
+        print("\nNo regressions against baseline.")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,128 @@
+import asyncio
+import random
+import sys
+import time
+from contextlib import contextmanager, nullcontext
+
+import httpx
+from sqlalchemy import event
+from sqlalchemy.ext.asyncio import AsyncSession, async_sessionmaker, create_async_engine
+
+import app.database as database
+from bench.report import percentile
+from bench.seed import BENCH_PASSWORD
+
+# The large list reads at a fixed pool size, with each request's connection
+# held until get_db exits (after serialization, the old lifecycle) against
+# released once the rows are loaded (app.database.release). Clients outnumber
+# connections, so time a connection sits checked out while the handler only
+# burns CPU is time every other request waits for it.
+#
+# "conn ms/req" is how long a request keeps a connection; pool_size divided
+# by it is the most requests per second the pool can serve. In-process, the
+# single event loop also does the clients' work and is usually saturated
+# first, so req/s moves less than the ceiling; behind python -m app.serve each
+# worker has its own loop and its own share of the connection budget.
+
+LISTS = [
+    ("/requests/", {"limit": 500, "expand": "equipment,category,team"}),
+    ("/requests/", {"limit": 200, "expand": "team.users"}),
+    ("/equipments/", {"limit": 500, "include": "counts"}),
+]
+
+
+async def _keep(session):
+    pass
+
+
+@contextmanager
+def holding_connections():
+    # Routers import release by name; swap it out where they did
+    modules = [
+        module for name, module in list(sys.modules.items())
+        if name.startswith("app.routers.") and getattr(module, "release", None) is database.release
+    ]
+    for module in modules:
+        module.release = _keep
+    try:
+        yield
+    finally:
+        for module in modules:
+            module.release = database.release
+
+
+def _use_pool(pool_size: int):
+    # Fresh engine per mode: pool_size connections and no overflow
+    engine = create_async_engine(
+        database.url, connect_args=database.connect_args,
+        pool_size=pool_size, max_overflow=0, pool_timeout=300,
+    )
+    held = {"seconds": 0.0, "checkouts": 0}
+
+    @event.listens_for(engine.sync_engine, "checkout")
+    def checkout(dbapi_connection, record, proxy):
+        record.info["bench_checkout"] = time.perf_counter()
+
+    @event.listens_for(engine.sync_engine, "checkin")
+    def checkin(dbapi_connection, record):
+        start = record.info.pop("bench_checkout", None)
+        if start is not None:
+            held["seconds"] += time.perf_counter() - start
+            held["checkouts"] += 1
+
+    database.engine = engine
+    database.AsyncSessionLocal = async_sessionmaker(
+        bind=engine, class_=AsyncSession, expire_on_commit=False, autoflush=False,
+    )
+    return engine, held
+
+
+async def _drive(app, ctx: dict, held: dict, clients: int, duration: float, seed_value: int):
+    latencies = []
+    errors = 0
+
+    async def client_loop(i):
+        nonlocal errors
+        rng = random.Random(seed_value + i)
+        async with httpx.AsyncClient(transport=httpx.ASGITransport(app=app), base_url="http://bench", timeout=300) as client:
+            resp = await client.post("/auth/login", json={"email": f"user{i % ctx['users'] + 1}@bench.local", "password": BENCH_PASSWORD})
+            resp.raise_for_status()
+            client.headers["Authorization"] = f"Bearer {resp.json()['access_token']}"
+            await ready.wait()
+            while time.perf_counter() < deadline:
+                path, params = rng.choice(LISTS)
+                start = time.perf_counter()
+                resp = await client.get(path, params=params)
+                latencies.append(time.perf_counter() - start)
+                if resp.status_code >= 400:
+                    errors += 1
+
+    ready = asyncio.Event()
+    tasks = [asyncio.create_task(client_loop(i)) for i in range(clients)]
+    await asyncio.sleep(0.5)
+    # Logins don't count
+    held.update(seconds=0.0, checkouts=0)
+    deadline = time.perf_counter() + duration
+    start = time.perf_counter()
+    ready.set()
+    await asyncio.gather(*tasks)
+    return latencies, errors, time.perf_counter() - start
+
+
+async def run_pool(ctx: dict, pool_size: int, clients: int, duration: float, seed_value: int = 7):
+    from app.app import app
+
+    print(f"List reads, {clients} clients over a pool of {pool_size} connection(s), {duration:.0f}s per mode")
+    print(f"{'mode':<10}{'req/s':>8}{'p50 ms':>9}{'p95 ms':>9}{'conn ms/req':>13}{'pool ceiling req/s':>20}{'errors':>8}")
+    for mode in ("held", "released"):
+        engine, held = _use_pool(pool_size)
+        with holding_connections() if mode == "held" else nullcontext():
+            latencies, errors, elapsed = await _drive(app, ctx, held, clients, duration, seed_value)
+        await engine.dispose()
+        latencies.sort()
+        per_request = held["seconds"] / max(1, len(latencies))
+        print(
+            f"{mode:<10}{len(latencies) / elapsed:>8.1f}{percentile(latencies, 50) * 1000:>9.0f}"
+            f"{percentile(latencies, 95) * 1000:>9.0f}{per_request * 1000:>13.1f}"
+            f"{pool_size / per_request if per_request else 0:>20.1f}{errors:>8}"
+        )
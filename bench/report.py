@@ -0,0 +1,62 @@
+import json
+from typing import Dict, List
+
+# Per-endpoint summary and baseline comparison for bench runs.
+
+
+def percentile(sorted_values: List[float], pct: float) -> float:
+    if not sorted_values:
+        return 0.0
+    # Nearest-rank on the sorted sample
+    index = min(len(sorted_values) - 1, max(0, int(round(pct / 100 * len(sorted_values) + 0.5)) - 1))
+    return sorted_values[index]
+
+
+def summarize(recorder, elapsed: float) -> Dict[str, dict]:
+    summary = {}
+    for label, values in sorted(recorder.latencies.items()):
+        values = sorted(values)
+        summary[label] = {
+            "count": len(values),
+            "errors": recorder.errors.get(label, 0),
+            "throughput": len(values) / elapsed if elapsed else 0.0,
+            "p50_ms": percentile(values, 50) * 1000,
+            "p95_ms": percentile(values, 95) * 1000,
+            "p99_ms": percentile(values, 99) * 1000,
+        }
+    return summary
+
+
+def print_summary(summary: Dict[str, dict]):
+    print(f"{'endpoint':32} {'count':>7} {'err':>5} {'req/s':>8} {'p50 ms':>8} {'p95 ms':>8} {'p99 ms':>8}")
+    for label, s in summary.items():
+        print(
+            f"{label:32} {s['count']:7d} {s['errors']:5d} {s['throughput']:8.1f} "
+            f"{s['p50_ms']:8.1f} {s['p95_ms']:8.1f} {s['p99_ms']:8.1f}"
+        )
+
+
+def save(summary: Dict[str, dict], path: str):
+    with open(path, "w") as f:
+        json.dump(summary, f, indent=2, sort_keys=True)
+
+
+def compare(summary: Dict[str, dict], baseline_path: str, tolerance: float) -> List[str]:
+    # Regressions: p95 slower or throughput lower than baseline by more than tolerance
+    with open(baseline_path) as f:
+        baseline = json.load(f)
+
+    regressions = []
+    for label, base in baseline.items():
+        current = summary.get(label)
+        if current is None:
+            continue
+        if current["p95_ms"] > base["p95_ms"] * (1 + tolerance):
+            regressions.append(f"{label}: p95 {current['p95_ms']:.1f} ms vs baseline {base['p95_ms']:.1f} ms")
+        if current["throughput"] < base["throughput"] * (1 - tolerance):
+            regressions.append(
+                f"{label}: {current['throughput']:.1f} req/s vs baseline {base['throughput']:.1f} req/s"
+            )
+        if current["errors"] > base["errors"]:
+            regressions.append(f"{label}: {current['errors']} errors vs baseline {base['errors']}")
+    return regressions
@@ -0,0 +1,172 @@
+import random
+import time
+from dataclasses import dataclass
+from datetime import date, datetime, time as day_time, timedelta, timezone
+
+import asyncpg
+
+from app.auth_utils import get_password_hash
+from app.config import ARCHIVE_AFTER_DAYS
+from app.database import Base, engine
+
+# Synthetic plant data loaded with COPY. Enum columns hold the enum *names*
+# (SQLAlchemy's default), except equipments.status which stores values.
+# Seeding drops every table, so it refuses databases with users of their own
+# (any email outside @bench.local).
+# Requests closed more than ARCHIVE_AFTER_DAYS ago are loaded archived, as the
+# archiver would have left them, so bench runs cover hot/cold routing.
+
+BENCH_PASSWORD = "bench"
+BENCH_EMAIL_DOMAIN = "@bench.local"
+CHUNK = 50_000
+
+SEEDED_TABLES = ["maintenance_requests", "equipments", "workcenters", "categories", "users", "teams"]
+
+DEPARTMENTS = ["Production", "Assembly", "Packaging", "Utilities", "Warehouse", "Quality", "Maintenance"]
+EQUIPMENT_KINDS = ["Pump", "Compressor", "CNC Mill", "Lathe", "Conveyor", "Press", "Boiler", "Chiller", "Robot Arm", "Forklift"]
+FAULTS = ["Leak", "Noise", "Overheating", "Vibration", "Calibration", "Belt wear", "Sensor fault", "Oil change"]
+
+
+@dataclass
+class Volumes:
+    teams: int = 50
+    users: int = 500
+    categories: int = 40
+    workcenters: int = 20
+    equipment: int = 10_000
+    requests: int = 200_000
+    years: int = 3
+
+
+def _skewed(rng: random.Random, n: int) -> int:
+    # 1..n, heavily biased towards low ids: a few machines break all the time
+    return int(rng.random() ** 3 * n) + 1
+
+
+def _chunks(rows, size=CHUNK):
+    chunk = []
+    for row in rows:
+        chunk.append(row)
+        if len(chunk) == size:
+            yield chunk
+            chunk = []
+    if chunk:
+        yield chunk
+
+
+def _users(v: Volumes, rng: random.Random, password_hash: str):
+    for uid in range(1, v.users + 1):
+        if uid == 1:
+            role = "ADMIN"
+        else:
+            role = rng.choices(["TECHNICIAN", "MANAGER", "USER"], weights=[60, 5, 35])[0]
+        yield (uid, f"user{uid}{BENCH_EMAIL_DOMAIN}", f"Bench User {uid}", password_hash, role, (uid - 1) % v.teams + 1, "Bench Plant")
+
+
+def _team_member(v: Volumes, rng: random.Random, team_id: int) -> int:
+    # Users are spread round-robin over teams (see _users)
+    per_team = max(1, v.users // v.teams)
+    return min(v.users, team_id + rng.randrange(per_team) * v.teams)
+
+
+def _equipments(v: Volumes, rng: random.Random):
+    today = date.today()
+    for eid in range(1, v.equipment + 1):
+        team_id = rng.randint(1, v.teams)
+        kind = rng.choice(EQUIPMENT_KINDS)
+        status = rng.choices(["ACTIVE", "MAINTENANCE", "DECOMMISSIONED"], weights=[88, 7, 5])[0]
+        yield (
+            eid, f"{kind} {eid}", f"SN-{eid:07d}", rng.choice(DEPARTMENTS),
+            _team_member(v, rng, team_id), status, rng.randint(1, v.users),
+            today - timedelta(days=rng.randint(30, 365 * 10)), f"Hall {rng.randint(1, 12)}", "Bench Plant",
+            rng.randint(1, v.categories), team_id, rng.randint(1, v.workcenters) if rng.random() < 0.7 else None,
+        )
+
+
+def _requests(v: Volumes, rng: random.Random):
+    today = date.today()
+    archive_cutoff = datetime.now(timezone.utc) - timedelta(days=ARCHIVE_AFTER_DAYS)
+    span = 365 * v.years
+    for rid in range(1, v.requests + 1):
+        # More recent requests are denser than old ones
+        age = int(rng.random() ** 2 * span)
+        request_date = today - timedelta(days=age)
+        if age > 60:
+            stage = rng.choices(["REPAIRED", "SCRAP", "NEW_REQUEST", "IN_PROGRESS"], weights=[85, 10, 3, 2])[0]
+        else:
+            stage = rng.choices(["NEW_REQUEST", "IN_PROGRESS", "REPAIRED", "SCRAP"], weights=[35, 30, 33, 2])[0]
+        closed_at = None
+        if stage in ("REPAIRED", "SCRAP"):
+            closed_day = min(today, request_date + timedelta(days=rng.randint(0, 30)))
+            closed_at = datetime.combine(closed_day, day_time(rng.randint(6, 18)), timezone.utc)
+        preventive = rng.random() < 0.3
+        equipment_id = _skewed(rng, v.equipment)
+        team_id = rng.randint(1, v.teams)
+        yield (
+            rid, f"{rng.choice(FAULTS)} on asset {equipment_id}", request_date,
+            request_date + timedelta(days=rng.randint(0, 14)), round(rng.uniform(0.5, 8), 1),
+            _team_member(v, rng, team_id) if rng.random() < 0.9 else None,
+            "PREVENTIVE" if preventive else "CORRECTIVE",
+            rng.choices(["LOW", "MEDIUM", "HIGH", "CRITICAL"], weights=[40, 35, 20, 5])[0],
+            stage, closed_at, closed_at is not None and closed_at < archive_cutoff,
+            "Synthetic benchmark request.", "EQUIPMENT", equipment_id, team_id,
+            rng.randint(1, v.categories), rng.randint(1, v.users), "Bench Plant",
+        )
+
+
+async def _foreign_users(conn) -> int:
+    if await conn.fetchval("SELECT to_regclass('users')") is None:
+        return 0
+    return await conn.fetchval("SELECT count(*) FROM users WHERE email NOT LIKE $1", f"%{BENCH_EMAIL_DOMAIN}")
+
+
+async def seed(dsn: str, volumes: Volumes, connect_args=None, reset: bool = True, seed_value: int = 42):
+    conn = await asyncpg.connect(dsn, **(connect_args or {}))
+    try:
+        foreign = await _foreign_users(conn)
+    finally:
+        await conn.close()
+    if foreign:
+        raise ValueError(f"The database has {foreign} users that are not bench users; seed an empty or bench-only database")
+    rng = random.Random(seed_value)
+    # bcrypt is deliberately slow; every bench user shares one hash
+    password_hash = get_password_hash(BENCH_PASSWORD)
+
+    async with engine.begin() as conn:
+        if reset:
+            await conn.run_sync(Base.metadata.drop_all)
+        await conn.run_sync(Base.metadata.create_all)
+
+    conn = await asyncpg.connect(dsn, **(connect_args or {}))
+    try:
+        await conn.execute(f"TRUNCATE {', '.join(SEEDED_TABLES)} RESTART IDENTITY CASCADE")
+        tables = [
+            ("teams", ["id", "name", "company_id"], ((i, f"Team {i}", "Bench Plant") for i in range(1, volumes.teams + 1))),
+            ("users", ["id", "email", "name", "hashed_password", "role", "team_id", "company_id"], _users(volumes, rng, password_hash)),
+            ("categories", ["id", "name", "company_name"],
+             ((i, f"Category {i}", "Bench Plant") for i in range(1, volumes.categories + 1))),
+            ("workcenters", ["id", "name", "code", "capacity", "time_efficiency", "oee_target", "company_id"],
+             ((i, f"Work Center {i}", f"WC-{i:04d}", 1.0, 100.0, 85.0, "Bench Plant") for i in range(1, volumes.workcenters + 1))),
+            ("equipments", ["id", "name", "serial_number", "department", "default_technician_id", "status",
+                            "employee_id", "purchase_date", "location", "company_name", "category_id", "team_id",
+                            "work_center_id"], _equipments(volumes, rng)),
+            ("maintenance_requests", ["id", "subject", "request_date", "scheduled_date", "duration", "technician_id",
+                                      "maintenance_type", "priority", "stage", "closed_at", "archived",
+                                      "description", "maintenance_for",
+                                      "equipment_id", "team_id", "category_id", "created_by_id", "company_id"],
+             _requests(volumes, rng)),
+        ]
+        for table, columns, rows in tables:
+            start = time.perf_counter()
+            count = 0
+            for chunk in _chunks(rows):
+                await conn.copy_records_to_table(table, records=chunk, columns=columns)
+                count += len(chunk)
+            # Ids were supplied explicitly; move the serial sequence past them
+            await conn.execute(
+                f"SELECT setval(pg_get_serial_sequence('{table}', 'id'), (SELECT COALESCE(MAX(id), 1) FROM {table}))"
+            )
+            print(f"   {table}: {count} rows in {time.perf_counter() - start:.1f}s")
+        await conn.execute("ANALYZE")
+    finally:
+        await conn.close()
@@ -0,0 +1,115 @@
+import time
+from datetime import date
+
+from sqlalchemy import func
+from sqlalchemy.future import select
+
+from app import queries
+from app.archive import HOT_REQUESTS
+from app.database import AsyncSessionLocal, engine
+from app.models import Equipment, MaintenanceRequest, MaintenanceType, RequestStage, User
+from app.routers.requests import REQUEST_EXPAND
+from app.tenancy import current_tenant
+
+# Per-call Python overhead of the hot queries: the select() each route used to
+# build on every call ("adhoc") against the prebuilt statements in
+# app/queries.py. Both run the same SQL against the same rows, so the
+# difference is statement construction, tenant criteria and cache key work.
+
+ACTIVE = [RequestStage.NEW_REQUEST, RequestStage.IN_PROGRESS]
+
+
+def _adhoc(ctx):
+    async def read_request(db):
+        result = await db.execute(
+            select(MaintenanceRequest)
+            .options(*REQUEST_EXPAND.options({"equipment"}))
+            .filter(MaintenanceRequest.id == ctx["request_id"])
+        )
+        return result.scalar_one_or_none()
+
+    async def maintenance_count(db):
+        result = await db.execute(
+            select(Equipment.id, func.count(MaintenanceRequest.id),
+                   func.count(MaintenanceRequest.id).filter(MaintenanceRequest.stage.in_(ACTIVE)))
+            .outerjoin(MaintenanceRequest, MaintenanceRequest.equipment_id == Equipment.id)
+            .filter(Equipment.id == ctx["equipment_id"])
+            .group_by(Equipment.id)
+        )
+        return result.first()
+
+    async def dashboard_stats(db):
+        for criteria in (
+            (MaintenanceRequest.maintenance_type == MaintenanceType.CORRECTIVE, MaintenanceRequest.stage.in_(ACTIVE)),
+            (MaintenanceRequest.stage.in_(ACTIVE),),
+            (MaintenanceRequest.scheduled_date < date.today(),
+             MaintenanceRequest.stage.notin_([RequestStage.REPAIRED, RequestStage.SCRAP])),
+        ):
+            await db.execute(select(func.count(MaintenanceRequest.id)).filter(HOT_REQUESTS, *criteria))
+
+    async def user_by_email(db):
+        result = await db.execute(
+            select(User).where(User.email == ctx["email"]).execution_options(skip_tenant_filter=True)
+        )
+        return result.scalar_one_or_none()
+
+    return {"read_request": read_request, "maintenance_count": maintenance_count,
+            "dashboard_stats": dashboard_stats, "user_by_email": user_by_email}
+
+
+def _prebuilt(ctx):
+    expand = frozenset({"equipment"})
+
+    async def read_request(db):
+        result = await queries.execute(db, queries.request_by_id(REQUEST_EXPAND, expand), {"request_id": ctx["request_id"]})
+        return result.scalar_one_or_none()
+
+    async def maintenance_count(db):
+        result = await queries.execute(db, queries.equipment_maintenance_count, {"equipment_id": ctx["equipment_id"]})
+        return result.first()
+
+    async def dashboard_stats(db):
+        await queries.execute(db, queries.critical_equipment_count, {})
+        await queries.execute(db, queries.open_request_count, {})
+        await queries.execute(db, queries.overdue_request_count, {"today": date.today()})
+
+    async def user_by_email(db):
+        result = await db.execute(queries.USER_BY_EMAIL, {"email": ctx["email"]}, execution_options=queries.PREBUILT)
+        return result.scalar_one_or_none()
+
+    return {"read_request": read_request, "maintenance_count": maintenance_count,
+            "dashboard_stats": dashboard_stats, "user_by_email": user_by_email}
+
+
+async def _measure(fn, iterations: int, warmup: int):
+    async with AsyncSessionLocal() as db:
+        for _ in range(warmup):
+            await fn(db)
+            db.expunge_all()
+        cpu, wall = time.process_time(), time.perf_counter()
+        for _ in range(iterations):
+            await fn(db)
+            db.expunge_all()
+        return (
+            (time.process_time() - cpu) / iterations * 1e6,
+            (time.perf_counter() - wall) / iterations * 1e6,
+        )
+
+
+async def run_statements(ctx: dict, iterations: int, tenant=None):
+    # The server logs every statement; that would swamp the measurement
+    engine.echo = False
+    if tenant is not None:
+        current_tenant.set(tenant)
+    async with AsyncSessionLocal() as db:
+        user = (await db.execute(select(User.email).limit(1).execution_options(skip_tenant_filter=True))).scalar()
+    ctx = {**ctx, "email": user or "nobody@example.com"}
+
+    adhoc, prebuilt = _adhoc(ctx), _prebuilt(ctx)
+    warmup = max(1, iterations // 10)
+    print(f"Per-call overhead over {iterations} calls (tenant={tenant}), microseconds")
+    print(f"{'query':<20}{'adhoc cpu':>12}{'prebuilt cpu':>14}{'adhoc wall':>12}{'prebuilt wall':>15}")
+    for name in adhoc:
+        a_cpu, a_wall = await _measure(adhoc[name], iterations, warmup)
+        p_cpu, p_wall = await _measure(prebuilt[name], iterations, warmup)
+        print(f"{name:<20}{a_cpu:>12.0f}{p_cpu:>14.0f}{a_wall:>12.0f}{p_wall:>15.0f}")
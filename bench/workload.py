@@ -0,0 +1,152 @@
+import asyncio
+import random
+import time
+from collections import defaultdict
+from datetime import date
+from typing import Dict, List, Optional
+
+import httpx
+
+from bench.seed import BENCH_PASSWORD
+
+# Mixed workload run by concurrent virtual clients. Every scenario issues one
+# call and reports it under a stable label, so results compare across runs.
+
+STAGES = ["New Request", "In Progress", "Repaired", "Scrap"]
+
+
+class Recorder:
+    def __init__(self):
+        self.latencies: Dict[str, List[float]] = defaultdict(list)
+        self.errors: Dict[str, int] = defaultdict(int)
+
+    async def call(self, label: str, request):
+        start = time.perf_counter()
+        try:
+            resp = await request
+            ok = resp.status_code < 400
+        except httpx.HTTPError:
+            ok = False
+        self.latencies[label].append(time.perf_counter() - start)
+        if not ok:
+            self.errors[label] += 1
+
+
+async def kanban_poll(client, rng, ctx, rec):
+    await rec.call("GET /requests/ (kanban)", client.get("/requests/", params={"expand": "equipment"}))
+
+
+async def request_filter(client, rng, ctx, rec):
+    params = {"stage": rng.choice(STAGES), "equipment_id": rng.randint(1, ctx["equipment"])}
+    await rec.call("GET /requests/ (filtered)", client.get("/requests/", params=params))
+
+
+async def dashboard_poll(client, rng, ctx, rec):
+    await rec.call("GET /dashboard/summary", client.get("/dashboard/summary"))
+
+
+async def equipment_page(client, rng, ctx, rec):
+    skip = rng.randrange(0, max(1, ctx["equipment"] - 100))
+    await rec.call("GET /equipments/ (counts)", client.get("/equipments/", params={"skip": skip, "include": "counts"}))
+
+
+async def equipment_detail(client, rng, ctx, rec):
+    await rec.call("GET /equipments/{id}", client.get(f"/equipments/{rng.randint(1, ctx['equipment'])}"))
+
+
+async def typeahead(client, rng, ctx, rec):
+    q = rng.choice(["pu", "comp", "cnc", "sn-00", "lat", "con", "pre"])
+    await rec.call("GET /equipments/suggest", client.get("/equipments/suggest", params={"q": q}))
+
+
+async def create_burst(client, rng, ctx, rec):
+    for _ in range(rng.randint(1, 5)):
+        body = {
+            "subject": "Bench failure report",
+            "equipment_id": rng.randint(1, ctx["equipment"]),
+            "request_date": str(date.today()),
+            "priority": rng.choice(["Low", "Medium", "High", "Critical"]),
+        }
+        await rec.call("POST /requests/", client.post("/requests/", json=body))
+
+
+async def stage_update(client, rng, ctx, rec):
+    request_id = rng.randint(1, ctx["requests"])
+    await rec.call("PUT /requests/{id}", client.put(f"/requests/{request_id}", json={"stage": rng.choice(STAGES)}))
+
+
+async def login(client, rng, ctx, rec):
+    body = {"email": f"user{rng.randint(1, ctx['users'])}@bench.local", "password": BENCH_PASSWORD}
+    await rec.call("POST /auth/login", client.post("/auth/login", json=body))
+
+
+# (scenario, weight): polling dominates, writes come in bursts
+MIX = [
+    (kanban_poll, 25),
+    (dashboard_poll, 20),
+    (request_filter, 10),
+    (equipment_page, 10),
+    (equipment_detail, 10),
+    (typeahead, 10),
+    (stage_update, 8),
+    (create_burst, 4),
+    (login, 3),
+]
+
+
+async def _client_loop(client, rng, ctx, rec, deadline, think_time):
+    scenarios = [s for s, _ in MIX]
+    weights = [w for _, w in MIX]
+    while time.perf_counter() < deadline:
+        scenario = rng.choices(scenarios, weights=weights)[0]
+        await scenario(client, rng, ctx, rec)
+        if think_time:
+            await asyncio.sleep(rng.uniform(0, think_time))
+
+
+async def run(
+    ctx: dict,
+    clients: int,
+    duration: float,
+    base_url: Optional[str] = None,
+    think_time: float = 0.0,
+    seed_value: int = 7,
+):
+    # In-process against the ASGI app unless a base_url is given
+    app = None
+    if base_url is None:
+        from app.app import app
+        from app.database import engine
+
+        # Statement logging would dominate the measurements
+        engine.echo = False
+
+    rec = Recorder()
+
+    async def make_client():
+        if app is not None:
+            return httpx.AsyncClient(transport=httpx.ASGITransport(app=app), base_url="http://bench", timeout=60)
+        return httpx.AsyncClient(base_url=base_url, timeout=60)
+
+    async def session(i):
+        rng = random.Random(seed_value + i)
+        async with await make_client() as client:
+            resp = await client.post("/auth/login", json={"email": f"user{i % ctx['users'] + 1}@bench.local", "password": BENCH_PASSWORD})
+            resp.raise_for_status()
+            client.headers["Authorization"] = f"Bearer {resp.json()['access_token']}"
+            await _client_loop(client, rng, ctx, rec, deadline, think_time)
+
+    async def run_clients():
+        await asyncio.gather(*(session(i) for i in range(clients)))
+
+    if app is not None:
+        async with app.router.lifespan_context(app):
+            deadline = time.perf_counter() + duration
+            start = time.perf_counter()
+            await run_clients()
+    else:
+        deadline = time.perf_counter() + duration
+        start = time.perf_counter()
+        await run_clients()
+
+    return rec, time.perf_counter() - start
@@ -0,0 +1,84 @@
+import json
+import time
+from datetime import date, timedelta
+from typing import List
+
+from fastapi.encoders import jsonable_encoder
+
+from app.models import MaintenanceRequest, Equipment, Category, Team, User, RequestStage, Priority, UserRole
+from app.schemas import MaintenanceRequest as MaintenanceRequestSchema, Equipment as EquipmentSchema
+from app.serialization import adapter_for
+
+# Compares the default FastAPI response_model path (validate each item, then
+# jsonable_encoder + json.dumps) with app.serialization.json_response
+# (one TypeAdapter validation + pydantic-core dump_json) for the payloads of
+# read_requests and read_equipments. No database needed.
+#
+#   PYTHONPATH=. python test/bench_serialization.py
+
+ROWS = 1000
+REPEAT = 20
+
+
+def build_equipments():
+    return [
+        Equipment(
+            id=i, name=f"Pump {i}", serial_number=f"SN-{i:06d}", department="Plant 1",
+            default_technician_id=1, category_id=1, team_id=1, employee_id=2,
+            purchase_date=date(2023, 1, 1), warranty_date=date(2027, 1, 1), location="Hall B",
+        )
+        for i in range(ROWS)
+    ]
+
+
+def build_requests(equipments):
+    users = [User(id=u, email=f"tech{u}@plant", name=f"Tech {u}", role=UserRole.TECHNICIAN, team_id=1) for u in range(8)]
+    team = Team(id=1, name="Mechanics", users=users)
+    category = Category(id=1, name="Pumps")
+    today = date.today()
+    return [
+        MaintenanceRequest(
+            id=i, subject=f"Leak on pump {i}", request_date=today - timedelta(days=i % 90),
+            scheduled_date=today + timedelta(days=i % 7), duration=2.5, technician_id=1,
+            priority=Priority.HIGH, stage=RequestStage.IN_PROGRESS, description="Seal worn, replace gasket.",
+            equipment_id=i, team_id=1, category_id=1, archived=False,
+            category=category, team=team, equipment=equipments[i],
+        )
+        for i in range(ROWS)
+    ]
+
+
+def response_model_path(schema, objects):
+    validated = [schema.model_validate(o) for o in objects]
+    return json.dumps(jsonable_encoder(validated)).encode("utf-8")
+
+
+def fast_path(schema, objects):
+    adapter = adapter_for(List[schema])
+    return adapter.dump_json(adapter.validate_python(objects, from_attributes=True))
+
+
+def timed(fn, *args):
+    fn(*args)  # warm up
+    start = time.perf_counter()
+    for _ in range(REPEAT):
+        fn(*args)
+    return (time.perf_counter() - start) / REPEAT * 1000
+
+
+def main():
+    equipments = build_equipments()
+    requests = build_requests(equipments)
+
+    for name, schema, objects in (
+        ("read_requests", MaintenanceRequestSchema, requests),
+        ("read_equipments", EquipmentSchema, equipments),
+    ):
+        assert json.loads(response_model_path(schema, objects)) == json.loads(fast_path(schema, objects))
+        before = timed(response_model_path, schema, objects)
+        after = timed(fast_path, schema, objects)
+        print(f"{name:16} {ROWS} rows: response_model {before:7.2f} ms  fast {after:7.2f} ms  ({before / after:.1f}x)")
+
+
+if __name__ == "__main__":
+    main()
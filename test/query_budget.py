@@ -0,0 +1,46 @@
+from contextlib import contextmanager
+
+from sqlalchemy import event
+
+# Counts the SQL statements an engine executes, e.g. during one ASGI call:
+#
+#   with query_budget(engine, 4, "GET /requests/"):
+#       await client.get("/requests/")
+#
+# Fails with the full statement list when the budget is exceeded, so N+1
+# regressions show exactly which query repeats.
+
+
+class QueryCounter:
+    def __init__(self):
+        self.statements = []
+
+    def __len__(self):
+        return len(self.statements)
+
+    def _record(self, conn, cursor, statement, parameters, context, executemany):
+        self.statements.append(" ".join(statement.split()))
+
+    def report(self) -> str:
+        return "\n".join(f"  {i + 1}. {statement}" for i, statement in enumerate(self.statements))
+
+
+@contextmanager
+def count_queries(engine):
+    counter = QueryCounter()
+    sync_engine = getattr(engine, "sync_engine", engine)
+    event.listen(sync_engine, "before_cursor_execute", counter._record)
+    try:
+        yield counter
+    finally:
+        event.remove(sync_engine, "before_cursor_execute", counter._record)
+
+
+@contextmanager
+def query_budget(engine, budget: int, label: str = ""):
+    with count_queries(engine) as counter:
+        yield counter
+    if len(counter) > budget:
+        raise AssertionError(
+            f"{label or 'block'} issued {len(counter)} SQL statements, budget is {budget}:\n{counter.report()}"
+        )
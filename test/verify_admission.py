@@ -0,0 +1,112 @@
+import asyncio
+
+from httpx import AsyncClient, ASGITransport
+from sqlalchemy.pool import NullPool
+from sqlalchemy.ext.asyncio import create_async_engine, async_sessionmaker
+
+from app.admission import BULK, INTERACTIVE, READ_PRIORITY, REPORTING, TRANSFER, WRITE_PRIORITY, Limiter, Rejected, limiters, route_class
+from app.app import app
+from app.auth_utils import get_password_hash
+from app.models import Equipment, User, UserRole
+import app.database as db_module
+import app.tenancy as tenancy
+
+# Per-class concurrency limits, bounded queues and 503 shedding.
+# Run with: PYTHONPATH=. python test/verify_admission.py
+
+
+async def verify_limiter():
+    print("1. Saturated classes queue, then shed...")
+    limiter = Limiter("test", concurrency=1, queue_size=2, timeout=0.2)
+    await limiter.acquire()
+    order = []
+
+    async def wait(name, priority):
+        await limiter.acquire(priority)
+        order.append(name)
+
+    read = asyncio.create_task(wait("read", READ_PRIORITY))
+    await asyncio.sleep(0)
+    write = asyncio.create_task(wait("write", WRITE_PRIORITY))
+    await asyncio.sleep(0)
+    try:
+        await limiter.acquire()
+        raise AssertionError("queue should be full")
+    except Rejected as e:
+        assert e.reason == "queue_full"
+
+    print("2. Writes are admitted before reads...")
+    limiter.release()
+    await write
+    limiter.release()
+    await read
+    assert order == ["write", "read"], order
+
+    print("3. Waiting past the queue timeout sheds...")
+    try:
+        await limiter.acquire()
+        raise AssertionError("should have timed out")
+    except Rejected as e:
+        assert e.reason == "timeout"
+    limiter.release()
+    assert limiter.active == 0 and limiter.queued == 0
+
+
+async def verify_routes():
+    # Reset engine to use NullPool to avoid asyncpg cache issues during test
+    await db_module.engine.dispose()
+    db_module.engine = create_async_engine(db_module.url, connect_args=db_module.connect_args, poolclass=NullPool)
+    db_module.AsyncSessionLocal = async_sessionmaker(bind=db_module.engine, class_=db_module.AsyncSession, expire_on_commit=False, autoflush=False)
+    # Single-company data, anonymous calls
+    tenancy.TENANCY_ENABLED = False
+
+    async with db_module.engine.begin() as conn:
+        await conn.run_sync(db_module.Base.metadata.drop_all)
+        await conn.run_sync(db_module.Base.metadata.create_all)
+    async with db_module.AsyncSessionLocal() as db:
+        db.add(User(email="admin@acme", name="Admin", role=UserRole.ADMIN, hashed_password=get_password_hash("pw")))
+        db.add(Equipment(name="Press", serial_number="SN-A1"))
+        await db.commit()
+
+    limiters[BULK] = Limiter(BULK, concurrency=1, queue_size=0)
+    limiters[REPORTING] = Limiter(REPORTING, concurrency=1, queue_size=0)
+
+    async with AsyncClient(transport=ASGITransport(app=app), base_url="http://test") as ac:
+        print("4. A saturated bulk class sheds with 503 + Retry-After...")
+        responses = await asyncio.gather(*(ac.get("/sync/changes") for _ in range(5)))
+        statuses = sorted(r.status_code for r in responses)
+        assert statuses[0] == 200 and 503 in statuses, statuses
+        shed = next(r for r in responses if r.status_code == 503)
+        assert shed.headers["retry-after"] == "1"
+
+        print("5. ...while interactive calls keep flowing...")
+        bulk = [ac.get("/sync/changes") for _ in range(5)]
+        interactive = [ac.get("/equipments/1") for _ in range(5)]
+        responses = await asyncio.gather(*bulk, *interactive)
+        assert all(r.status_code == 200 for r in responses[5:])
+
+        print("6. Coalesced callers share the one slot...")
+        responses = await asyncio.gather(*(ac.get("/dashboard/stats") for _ in range(10)))
+        assert all(r.status_code == 200 for r in responses), [r.status_code for r in responses]
+
+        print("7. Probes are never limited...")
+        assert (await ac.get("/health/live")).status_code == 200
+
+        metrics = (await ac.get("/metrics")).text
+        assert 'admission_rejected_total{reason="queue_full",route_class="bulk"}' in metrics
+
+        print("8. Attachment transfers never take interactive slots...")
+        assert route_class("POST", "/requests/{request_id}/attachments") == TRANSFER
+        assert route_class("GET", "/attachments/{attachment_id}/content") == TRANSFER
+        assert route_class("GET", "/attachments/{attachment_id}/thumbnail") == TRANSFER
+        assert route_class("GET", "/requests/{request_id}/attachments") == INTERACTIVE
+
+    print("\nADMISSION CONTROL VERIFIED!")
+
+
+async def verify():
+    await verify_limiter()
+    await verify_routes()
+
+if __name__ == "__main__":
+    asyncio.run(verify())
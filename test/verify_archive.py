@@ -0,0 +1,123 @@
+import asyncio
+from datetime import date, datetime, timedelta, timezone
+
+from httpx import AsyncClient, ASGITransport
+from sqlalchemy import text
+from sqlalchemy.pool import NullPool
+from sqlalchemy.ext.asyncio import create_async_engine, async_sessionmaker
+
+from app.app import app
+from app.archive import archive_batch, run_archiver
+from app.auth_utils import get_password_hash
+from app.models import Equipment, User, UserRole
+import app.database as db_module
+import app.tenancy as tenancy
+
+# Closed requests move to the cold partition and come back when reopened.
+# Run with: PYTHONPATH=. python test/verify_archive.py
+
+OLD = date.today() - timedelta(days=200)
+CUTOFF = datetime.now(timezone.utc) - timedelta(days=180)
+
+
+async def partitions():
+    # request id -> partition holding it
+    async with db_module.engine.connect() as conn:
+        rows = await conn.exec_driver_sql("SELECT id, tableoid::regclass::text FROM maintenance_requests")
+        return {row[0]: row[1] for row in rows}
+
+
+async def verify():
+    # Reset engine to use NullPool to avoid asyncpg cache issues during test
+    await db_module.engine.dispose()
+    db_module.engine = create_async_engine(db_module.url, connect_args=db_module.connect_args, poolclass=NullPool)
+    db_module.AsyncSessionLocal = async_sessionmaker(bind=db_module.engine, class_=db_module.AsyncSession, expire_on_commit=False, autoflush=False)
+    # Company-scoped data (scoping is off by default)
+    tenancy.TENANCY_ENABLED = True
+
+    async with db_module.engine.begin() as conn:
+        await conn.run_sync(db_module.Base.metadata.drop_all)
+        await conn.run_sync(db_module.Base.metadata.create_all)
+    async with db_module.AsyncSessionLocal() as db:
+        db.add(User(email="admin@0", name="Admin", role=UserRole.ADMIN,
+                    hashed_password=get_password_hash("pw"), company_id="Acme"))
+        db.add(Equipment(name="Pump", serial_number="SN-A0", company_name="Acme"))
+        await db.commit()
+
+    async with AsyncClient(transport=ASGITransport(app=app), base_url="http://test") as ac:
+        token = (await ac.post("/auth/login", json={"email": "admin@0", "password": "pw"})).json()["access_token"]
+        auth = {"Authorization": f"Bearer {token}"}
+
+        async def create(subject, stage=None, closed_days_ago=0):
+            body = {"subject": subject, "equipment_id": 1, "request_date": str(OLD)}
+            request_id = (await ac.post("/requests/", json=body, headers=auth)).json()["id"]
+            if stage:
+                closed = await ac.put(f"/requests/{request_id}", json={"stage": stage}, headers=auth)
+                assert closed.status_code == 200 and closed.json()["closed_at"], closed.text
+            if closed_days_ago:
+                async with db_module.engine.begin() as conn:
+                    await conn.execute(
+                        text("UPDATE maintenance_requests SET closed_at = closed_at - make_interval(days => :days) WHERE id = :id"),
+                        {"days": closed_days_ago, "id": request_id},
+                    )
+            return request_id
+
+        repaired = [await create(f"Old fix {i}", "Repaired", 200) for i in range(3)]
+        scrapped = await create("Old scrap", "Scrap", 200)
+        old_open = await create("Old open")
+        # Opened long ago, closed today: retention counts from the closing
+        recent = await create("Recent fix", "Repaired")
+
+        print("1. Old closed requests are archived in batches...")
+        moved = []
+        while True:
+            async with db_module.AsyncSessionLocal() as db:
+                moved.append(await archive_batch(db, CUTOFF, batch_size=3))
+            if moved[-1] < 3:
+                break
+        assert moved == [3, 1], moved
+        where = await partitions()
+        archived = {*repaired, scrapped}
+        assert {i for i, table in where.items() if table == "maintenance_requests_cold"} == archived, where
+        assert where[old_open] == where[recent] == "maintenance_requests_hot"
+
+        print("2. The background archiver picks up newly closed ones...")
+        late = await create("Late fix", "Repaired", 200)
+        archiver = asyncio.create_task(run_archiver(interval=60))
+        for _ in range(100):
+            if (await partitions())[late] == "maintenance_requests_cold":
+                break
+            await asyncio.sleep(0.05)
+        archiver.cancel()
+        assert (await partitions())[late] == "maintenance_requests_cold"
+        archived.add(late)
+
+        print("3. Lists skip archived requests unless asked, lookups always find them...")
+        hot = (await ac.get("/requests/", headers=auth)).json()
+        assert {r["id"] for r in hot} == {old_open, recent}
+        everything = (await ac.get("/requests/", params={"include_archived": "true"}, headers=auth)).json()
+        assert {r["id"] for r in everything if r["archived"]} == archived
+        assert len(everything) == len(archived) + 2
+        detail = (await ac.get(f"/requests/{scrapped}", headers=auth)).json()
+        assert detail["archived"] and detail["stage"] == "Scrap"
+
+        print("4. Reopening moves a request back to the hot partition...")
+        edited = await ac.put(f"/requests/{repaired[0]}", json={"subject": "Old fix (noted)"}, headers=auth)
+        assert edited.status_code == 200 and edited.json()["archived"]
+        # Moving between closed stages keeps the original closing time
+        closed_at = (await ac.get(f"/requests/{repaired[2]}", headers=auth)).json()["closed_at"]
+        rescrapped = await ac.put(f"/requests/{repaired[2]}", json={"stage": "Scrap"}, headers=auth)
+        assert rescrapped.status_code == 200 and rescrapped.json()["archived"]
+        assert rescrapped.json()["closed_at"] == closed_at
+        reopened = await ac.put(f"/requests/{repaired[1]}", json={"stage": "In Progress"}, headers=auth)
+        assert reopened.status_code == 200 and not reopened.json()["archived"] and reopened.json()["closed_at"] is None
+        where = await partitions()
+        assert where[repaired[1]] == "maintenance_requests_hot"
+        assert where[repaired[0]] == "maintenance_requests_cold"
+        hot = (await ac.get("/requests/", headers=auth)).json()
+        assert {r["id"] for r in hot} == {old_open, recent, repaired[1]}
+
+    print("\nREQUEST ARCHIVE VERIFIED!")
+
+if __name__ == "__main__":
+    asyncio.run(verify())
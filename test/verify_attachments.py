@@ -0,0 +1,163 @@
+import asyncio
+import hashlib
+import io
+import os
+import shutil
+import tempfile
+import tracemalloc
+from datetime import date
+
+from httpx import AsyncClient, ASGITransport
+from PIL import Image
+from sqlalchemy import func, select
+from sqlalchemy.pool import NullPool
+from sqlalchemy.ext.asyncio import create_async_engine, async_sessionmaker
+
+from app.app import app
+from app.attachments import TooLarge, make_thumbnail_job, shutdown_thumbnail_pool, store_upload
+from app.auth_utils import get_password_hash
+from app.models import AttachmentBlob, Equipment, Job, User, UserRole
+from app.storage import storage
+import app.database as db_module
+import app.tenancy as tenancy
+
+# Streaming uploads/downloads, content-hash dedup, ranges and thumbnails.
+# Run with: PYTHONPATH=. python test/verify_attachments.py
+
+COMPANIES = ["Acme", "Globex"]
+LARGE = 24 * 1024 * 1024
+
+
+async def body(data: bytes, chunk: int = 64 * 1024):
+    for i in range(0, len(data), chunk):
+        yield data[i:i + chunk]
+
+
+def stored_files(prefix: str):
+    root = os.path.join(storage.root, prefix)
+    return [os.path.join(d, f) for d, _, files in os.walk(root) for f in files]
+
+
+async def verify():
+    storage.root = tempfile.mkdtemp(prefix="gearguard-storage-")
+
+    # Reset engine to use NullPool to avoid asyncpg cache issues during test
+    await db_module.engine.dispose()
+    db_module.engine = create_async_engine(db_module.url, connect_args=db_module.connect_args, poolclass=NullPool)
+    db_module.AsyncSessionLocal = async_sessionmaker(bind=db_module.engine, class_=db_module.AsyncSession, expire_on_commit=False, autoflush=False)
+    # Company-scoped data (scoping is off by default)
+    tenancy.TENANCY_ENABLED = True
+
+    async with db_module.engine.begin() as conn:
+        await conn.run_sync(db_module.Base.metadata.drop_all)
+        await conn.run_sync(db_module.Base.metadata.create_all)
+    async with db_module.AsyncSessionLocal() as db:
+        for i, company in enumerate(COMPANIES):
+            db.add(User(email=f"admin@{i}", name="Admin", role=UserRole.ADMIN,
+                        hashed_password=get_password_hash("pw"), company_id=company))
+            db.add(Equipment(name=f"Pump {i}", serial_number=f"SN-F{i}", company_name=company))
+        await db.commit()
+
+    async with AsyncClient(transport=ASGITransport(app=app), base_url="http://test") as ac:
+        headers = []
+        for i in range(len(COMPANIES)):
+            token = (await ac.post("/auth/login", json={"email": f"admin@{i}", "password": "pw"})).json()["access_token"]
+            headers.append({"Authorization": f"Bearer {token}"})
+        auth = headers[0]
+        new_request = {"subject": "Vibration", "equipment_id": 1, "request_date": str(date.today())}
+        request_ids = [(await ac.post("/requests/", json=new_request, headers=auth)).json()["id"] for _ in range(2)]
+
+        print("1. A large upload streams to storage without buffering it...")
+        data = os.urandom(LARGE)
+        tracemalloc.start()
+        resp = await ac.post(
+            f"/requests/{request_ids[0]}/attachments", params={"filename": "vibration log.csv"},
+            content=body(data), headers={**auth, "Content-Type": "text/csv"},
+        )
+        _, peak = tracemalloc.get_traced_memory()
+        tracemalloc.stop()
+        assert resp.status_code == 200, resp.text
+        # The client's copy of the file is allocated before tracing starts
+        assert peak < LARGE // 4, f"upload peaked at {peak / 1e6:.1f} MB"
+        first = resp.json()
+        assert first["size"] == LARGE and first["sha256"] == hashlib.sha256(data).hexdigest()
+
+        print("2. Identical content is stored once...")
+        resp = await ac.post(
+            f"/requests/{request_ids[1]}/attachments", params={"filename": "copy.csv"},
+            content=body(data), headers={**auth, "Content-Type": "text/csv"},
+        )
+        second = resp.json()
+        assert second["id"] != first["id"] and second["sha256"] == first["sha256"]
+        assert len(stored_files("blobs")) == 1 and stored_files("tmp") == []
+        listed = (await ac.get(f"/requests/{request_ids[1]}/attachments", headers=auth)).json()
+        assert [a["filename"] for a in listed] == ["copy.csv"]
+
+        print("3. Downloads serve byte ranges...")
+        url = f"/attachments/{first['id']}/content"
+        full = await ac.get(url, headers=auth)
+        assert full.status_code == 200 and full.content == data
+        assert full.headers["accept-ranges"] == "bytes"
+        part = await ac.get(url, headers={**auth, "Range": "bytes=100-199"})
+        assert part.status_code == 206 and part.content == data[100:200]
+        assert part.headers["content-range"] == f"bytes 100-199/{LARGE}"
+        tail = await ac.get(url, headers={**auth, "Range": "bytes=-10"})
+        assert tail.status_code == 206 and tail.content == data[-10:]
+        rest = await ac.get(url, headers={**auth, "Range": f"bytes={LARGE - 5}-"})
+        assert rest.content == data[-5:]
+        assert (await ac.get(url, headers={**auth, "Range": f"bytes={LARGE}-"})).status_code == 416
+        assert (await ac.get(url, headers={**auth, "If-None-Match": full.headers["etag"]})).status_code == 304
+        assert full.headers["content-disposition"].startswith("attachment;")
+        assert full.headers["x-content-type-options"] == "nosniff"
+
+        print("3b. Uploaded markup is never rendered by the browser...")
+        page = (await ac.post(
+            f"/requests/{request_ids[0]}/attachments", params={"filename": "x.svg"},
+            content=b"<svg xmlns='http://www.w3.org/2000/svg'><script>alert(1)</script></svg>",
+            headers={**auth, "Content-Type": "image/svg+xml"},
+        )).json()
+        served = await ac.get(f"/attachments/{page['id']}/content", headers=auth)
+        assert served.headers["content-disposition"].startswith("attachment;")
+        assert served.headers["x-content-type-options"] == "nosniff"
+        assert "sandbox" in served.headers["content-security-policy"]
+
+        print("4. Oversized uploads are refused and leave nothing behind...")
+        try:
+            await store_upload(body(b"x" * 5000), max_bytes=1000)
+            raise AssertionError("upload should be too large")
+        except TooLarge:
+            pass
+        assert stored_files("tmp") == []
+
+        print("5. Photos get a thumbnail from the process pool...")
+        image = io.BytesIO()
+        Image.new("RGB", (2000, 1500), (200, 40, 40)).save(image, "PNG")
+        photo = (await ac.post(
+            f"/requests/{request_ids[0]}/attachments", params={"filename": "leak.png"},
+            content=image.getvalue(), headers={**auth, "Content-Type": "image/png"},
+        )).json()
+        thumbnail_url = f"/attachments/{photo['id']}/thumbnail"
+        assert (await ac.get(thumbnail_url, headers=auth)).status_code == 404
+        async with db_module.AsyncSessionLocal() as db:
+            jobs = (await db.execute(select(Job).filter(Job.type == "attachment_thumbnail"))).scalars().all()
+        assert [job.payload for job in jobs] == [{"sha256": photo["sha256"]}]
+        await make_thumbnail_job(jobs[0].payload)
+        thumbnail = await ac.get(thumbnail_url, headers=auth)
+        assert thumbnail.status_code == 200 and thumbnail.headers["content-type"] == "image/jpeg"
+        assert thumbnail.headers["x-content-type-options"] == "nosniff"
+        photo_download = await ac.get(f"/attachments/{photo['id']}/content", headers=auth)
+        assert photo_download.headers["content-disposition"].startswith("inline;")
+        assert max(Image.open(io.BytesIO(thumbnail.content)).size) <= 320
+        shutdown_thumbnail_pool()
+
+        print("6. Other companies cannot see or fetch them...")
+        assert (await ac.get(url, headers=headers[1])).status_code == 404
+        assert (await ac.get(f"/requests/{request_ids[0]}/attachments", headers=headers[1])).json() == []
+        async with db_module.AsyncSessionLocal() as db:
+            assert (await db.execute(select(func.count()).select_from(AttachmentBlob))).scalar() == 3
+
+    shutil.rmtree(storage.root)
+    print("\nATTACHMENTS VERIFIED!")
+
+if __name__ == "__main__":
+    asyncio.run(verify())
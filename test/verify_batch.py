@@ -0,0 +1,126 @@
+import asyncio
+from datetime import date
+
+from httpx import AsyncClient, ASGITransport
+from sqlalchemy.pool import NullPool
+from sqlalchemy.ext.asyncio import create_async_engine, async_sessionmaker
+
+from app.app import app
+from app.auth_utils import get_password_hash
+from app.events import request_events
+from app.models import Equipment, User, UserRole
+from query_budget import count_queries
+import app.batch as batch_module
+import app.database as db_module
+import app.tenancy as tenancy
+
+# POST /batch: several GETs in one round trip, authenticated once.
+# Run with: PYTHONPATH=.:test python test/verify_batch.py
+
+COMPANIES = ["Acme", "Globex"]
+
+PAGE = [
+    {"id": "summary", "path": "/dashboard/summary"},
+    {"id": "kanban", "path": "/requests/?expand=equipment,team"},
+    {"id": "members", "path": "/auth/members"},
+    {"id": "equipment", "path": "/equipments/1"},
+    {"id": "counts", "path": "/equipments/1/maintenance-count"},
+]
+
+
+async def verify():
+    # Reset engine to use NullPool to avoid asyncpg cache issues during test
+    await db_module.engine.dispose()
+    db_module.engine = create_async_engine(db_module.url, connect_args=db_module.connect_args, poolclass=NullPool)
+    db_module.AsyncSessionLocal = async_sessionmaker(bind=db_module.engine, class_=db_module.AsyncSession, expire_on_commit=False, autoflush=False)
+    # Company-scoped data (scoping is off by default)
+    tenancy.TENANCY_ENABLED = True
+
+    async with db_module.engine.begin() as conn:
+        await conn.run_sync(db_module.Base.metadata.drop_all)
+        await conn.run_sync(db_module.Base.metadata.create_all)
+    async with db_module.AsyncSessionLocal() as db:
+        for i, company in enumerate(COMPANIES):
+            db.add(User(email=f"admin@{i}", name="Admin", role=UserRole.ADMIN,
+                        hashed_password=get_password_hash("pw"), company_id=company))
+            db.add(Equipment(name=f"Pump {i}", serial_number=f"SN-B{i}", company_name=company))
+        await db.commit()
+
+    async with AsyncClient(transport=ASGITransport(app=app), base_url="http://test") as ac:
+        headers = []
+        for i in range(len(COMPANIES)):
+            token = (await ac.post("/auth/login", json={"email": f"admin@{i}", "password": "pw"})).json()["access_token"]
+            headers.append({"Authorization": f"Bearer {token}"})
+        auth = headers[0]
+        for _ in range(3):
+            await ac.post("/requests/", json={"subject": "Leak", "equipment_id": 1, "request_date": str(date.today())}, headers=auth)
+
+        print("1. A batch returns what the separate calls return, in order...")
+        resp = await ac.post("/batch", json={"requests": PAGE}, headers=auth)
+        assert resp.status_code == 200, resp.text
+        results = resp.json()["responses"]
+        assert [r["id"] for r in results] == [call["id"] for call in PAGE]
+        for call, result in zip(PAGE, results):
+            single = await ac.get(call["path"], headers=auth)
+            assert result["status"] == single.status_code == 200, (call, result)
+            assert result["body"] == single.json(), call["path"]
+
+        print("2. The user is looked up once per batch...")
+        admin_page = {"requests": [{"path": "/admin/jobs"}, {"path": "/admin/slow-queries"}, {"path": "/auth/members"}]}
+        with count_queries(db_module.engine) as counter:
+            resp = await ac.post("/batch", json=admin_page, headers=auth)
+        assert [r["status"] for r in resp.json()["responses"]] == [200, 200, 200]
+        lookups = [s for s in counter.statements if "users.email =" in s]
+        assert len(lookups) == 1, counter.report()
+        assert (await ac.post("/batch", json=admin_page)).status_code == 401
+
+        print("3. Failing calls report their own status...")
+        resp = await ac.post("/batch", json={"requests": [
+            {"id": "missing", "path": "/equipments/999"},
+            {"id": "invalid", "path": "/requests/?limit=many"},
+            {"id": "stream", "path": "/requests/stream"},
+            {"id": "ok", "path": "/equipments/suggest?q=pu"},
+        ]}, headers=auth)
+        statuses = {r["id"]: r["status"] for r in resp.json()["responses"]}
+        assert statuses == {"missing": 404, "invalid": 422, "stream": 406, "ok": 200}, statuses
+        assert resp.json()["responses"][0]["body"] == {"detail": "Equipment not found"}
+        assert request_events._subscribers == set()
+
+        print("4. At most BATCH_CONCURRENCY calls of a batch run at once...")
+        in_flight, peak = 0, 0
+        dispatch = batch_module.dispatch
+
+        async def slow_dispatch(app, scope):
+            nonlocal in_flight, peak
+            in_flight += 1
+            peak = max(peak, in_flight)
+            try:
+                await asyncio.sleep(0.05)
+                return await dispatch(app, scope)
+            finally:
+                in_flight -= 1
+
+        batch_module.dispatch = slow_dispatch
+        batch_module.BATCH_CONCURRENCY = 2
+        try:
+            resp = await ac.post("/batch", json={"requests": [{"path": "/equipments/"}] * 8}, headers=auth)
+        finally:
+            batch_module.dispatch = dispatch
+            batch_module.BATCH_CONCURRENCY = 4
+        assert [r["status"] for r in resp.json()["responses"]] == [200] * 8
+        assert peak == 2, peak
+
+        print("5. Oversized, nested and off-site batches are refused...")
+        assert (await ac.post("/batch", json={"requests": [{"path": "/"}] * 21}, headers=auth)).status_code == 400
+        for path in ("/batch", "/batch/", "//evil.example/x", "http://evil.example/"):
+            assert (await ac.post("/batch", json={"requests": [{"path": path}]}, headers=auth)).status_code == 400, path
+
+        print("6. Calls run as the batch's company...")
+        resp = await ac.post("/batch", json={"requests": [{"path": "/equipments/"}, {"path": "/requests/"}]}, headers=headers[1])
+        equipments, requests = (r["body"] for r in resp.json()["responses"])
+        assert [e["name"] for e in equipments] == ["Pump 1"] and requests == []
+
+    print("\nBATCH CALLS VERIFIED!")
+
+if __name__ == "__main__":
+    asyncio.run(verify())
@@ -0,0 +1,126 @@
+import asyncio
+from datetime import date
+
+from httpx import AsyncClient, ASGITransport
+from sqlalchemy.pool import NullPool
+from sqlalchemy.ext.asyncio import create_async_engine, async_sessionmaker
+
+from app.app import app
+from app.auth_utils import get_password_hash
+from app.coalesce import SingleFlight
+from app.metrics import COALESCED_CALLS
+from app.models import Equipment, MaintenanceRequest, User, UserRole
+import app.database as db_module
+import app.tenancy as tenancy
+from query_budget import count_queries
+
+# Identical dashboard reads that overlap share one execution.
+# Run with: PYTHONPATH=.:test python test/verify_coalescing.py
+
+COMPANIES = ["Acme", "Globex"]
+
+
+def coalesced_count(route, outcome):
+    return COALESCED_CALLS.labels(route, outcome)._value.get()
+
+
+async def verify_single_flight():
+    flight = SingleFlight()
+    calls = []
+
+    async def slow(value, delay=0.05):
+        calls.append(value)
+        await asyncio.sleep(delay)
+        return value
+
+    print("1. Overlapping calls share one execution...")
+    results = await asyncio.gather(*(flight.do("k", lambda: slow("a")) for _ in range(10)))
+    assert calls == ["a"]
+    assert sorted(outcome for _, outcome in results) == ["executed"] + ["joined"] * 9
+
+    print("2. The micro-TTL answers calls right after...")
+    calls.clear()
+    await flight.do("t", lambda: slow("b", 0), ttl=0.2)
+    assert (await flight.do("t", lambda: slow("c", 0), ttl=0.2)) == ("b", "cached")
+    await asyncio.sleep(0.25)
+    assert (await flight.do("t", lambda: slow("d", 0), ttl=0.2)) == ("d", "executed")
+    assert calls == ["b", "d"]
+
+    print("3. Errors reach every waiter and are not kept...")
+    async def failing():
+        await asyncio.sleep(0.05)
+        raise ValueError("boom")
+    results = await asyncio.gather(*(flight.do("e", failing, ttl=1) for _ in range(3)), return_exceptions=True)
+    assert all(isinstance(r, ValueError) for r in results)
+    assert (await flight.do("e", lambda: slow("ok", 0), ttl=1)) == ("ok", "executed")
+
+    print("4. A waiter takes over when the caller running it is cancelled...")
+    leader = asyncio.create_task(flight.do("c", lambda: slow("first", 1)))
+    await asyncio.sleep(0.01)
+    follower = asyncio.create_task(flight.do("c", lambda: slow("second", 0)))
+    await asyncio.sleep(0.01)
+    leader.cancel()
+    assert (await follower) == ("second", "executed")
+
+
+async def verify_routes():
+    # Reset engine to use NullPool to avoid asyncpg cache issues during test
+    await db_module.engine.dispose()
+    db_module.engine = create_async_engine(db_module.url, connect_args=db_module.connect_args, poolclass=NullPool)
+    db_module.AsyncSessionLocal = async_sessionmaker(bind=db_module.engine, class_=db_module.AsyncSession, expire_on_commit=False, autoflush=False)
+    # Company-scoped data (scoping is off by default)
+    tenancy.TENANCY_ENABLED = True
+
+    async with db_module.engine.begin() as conn:
+        await conn.run_sync(db_module.Base.metadata.drop_all)
+        await conn.run_sync(db_module.Base.metadata.create_all)
+    async with db_module.AsyncSessionLocal() as db:
+        for i, company in enumerate(COMPANIES):
+            db.add(User(email=f"admin@{i}", name="Admin", role=UserRole.ADMIN,
+                        hashed_password=get_password_hash("pw"), company_id=company))
+            equipment = Equipment(name=f"Pump {i}", serial_number=f"SN-C{i}", company_name=company)
+            db.add(equipment)
+            await db.flush()
+            db.add_all([
+                MaintenanceRequest(subject=f"Leak {i}.{n}", request_date=date.today(),
+                                   equipment_id=equipment.id, company_id=company)
+                for n in range(i + 1)
+            ])
+        await db.commit()
+
+    async with AsyncClient(transport=ASGITransport(app=app), base_url="http://test") as ac:
+        headers = []
+        for i in range(len(COMPANIES)):
+            token = (await ac.post("/auth/login", json={"email": f"admin@{i}", "password": "pw"})).json()["access_token"]
+            headers.append({"Authorization": f"Bearer {token}"})
+
+        print("5. Twenty screens refreshing /dashboard/stats run its 3 queries once...")
+        joined_before = coalesced_count("/dashboard/stats", "joined")
+        with count_queries(db_module.engine) as counter:
+            responses = await asyncio.gather(*(ac.get("/dashboard/stats", headers=headers[0]) for _ in range(20)))
+        assert len(counter) == 3, counter.report()
+        assert len({r.content for r in responses}) == 1
+        assert responses[0].json()["open_requests_count"] == 1
+        assert coalesced_count("/dashboard/stats", "joined") - joined_before == 19
+
+        print("6. Companies are never coalesced together...")
+        with count_queries(db_module.engine) as counter:
+            responses = await asyncio.gather(*(ac.get("/dashboard/stats", headers=headers[i % 2]) for i in range(10)))
+        assert len(counter) == 6, counter.report()
+        assert {r.json()["open_requests_count"] for r in responses} == {1, 2}
+
+        print("7. /dashboard/summary keeps its Server-Timing header...")
+        with count_queries(db_module.engine) as counter:
+            responses = await asyncio.gather(*(ac.get("/dashboard/summary", headers=headers[1]) for _ in range(10)))
+        assert len(counter) == 6, counter.report()
+        assert all("stats;dur=" in r.headers["server-timing"] for r in responses)
+
+    print("\nREAD COALESCING VERIFIED!")
+
+
+async def verify():
+    await verify_single_flight()
+    await verify_routes()
+
+if __name__ == "__main__":
+    asyncio.run(verify())
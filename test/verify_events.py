@@ -0,0 +1,234 @@
+import asyncio
+from datetime import date
+
+from httpx import AsyncClient, ASGITransport
+from sqlalchemy.pool import NullPool
+from sqlalchemy.ext.asyncio import create_async_engine, async_sessionmaker
+
+from app.app import app
+from app.auth_utils import get_password_hash
+from app.database import asyncpg_dsn
+from app.equipment_index import TenantEquipmentIndex
+from app.events import EventBroker, request_events
+from app.models import Equipment, User, UserRole
+import app.database as db_module
+import app.tenancy as tenancy
+import app.events as events_module
+
+# Live request events: fan-out, slow consumers, the SSE stream and the
+# Postgres NOTIFY path across workers, including lost connections.
+# Run with: PYTHONPATH=. python test/verify_events.py
+
+COMPANIES = ["Acme", "Globex"]
+
+
+def event(i=0):
+    return {"type": "updated", "id": i}
+
+
+async def receive(subscriber, timeout=5.0):
+    return await asyncio.wait_for(subscriber.get(), timeout)
+
+
+class Stream:
+    # GET /requests/stream driven straight through ASGI, chunk by chunk
+    def __init__(self, token):
+        self.scope = {
+            "type": "http", "asgi": {"version": "3.0"}, "http_version": "1.1", "method": "GET",
+            "scheme": "http", "server": ("test", 80), "client": ("test", 1), "root_path": "",
+            "path": "/requests/stream", "raw_path": b"/requests/stream", "query_string": b"",
+            "headers": [(b"authorization", f"Bearer {token}".encode())],
+        }
+        self.chunks: asyncio.Queue = asyncio.Queue()
+        self.gone = asyncio.Event()
+        self.status = None
+
+    async def open(self):
+        sent = False
+
+        async def receive_message():
+            nonlocal sent
+            if not sent:
+                sent = True
+                return {"type": "http.request", "body": b"", "more_body": False}
+            await self.gone.wait()
+            return {"type": "http.disconnect"}
+
+        async def send(message):
+            if message["type"] == "http.response.start":
+                self.status = message["status"]
+            elif message.get("body"):
+                await self.chunks.put(message["body"].decode())
+
+        self.task = asyncio.create_task(app(self.scope, receive_message, send))
+        while self.status is None:
+            await asyncio.sleep(0.01)
+
+    async def next_event(self, timeout=5.0):
+        return await asyncio.wait_for(self.chunks.get(), timeout)
+
+    async def close(self):
+        self.gone.set()
+        await asyncio.wait_for(self.task, 5)
+
+
+async def verify_fan_out():
+    print("1. Events fan out to the subscribers of their company...")
+    broker = EventBroker(queue_size=3)
+    acme, acme_too, globex, everyone = (broker.subscribe(t) for t in ("Acme", "Acme", "Globex", None))
+    broker.publish(event(), "Acme")
+    for subscriber in (acme, acme_too, everyone):
+        # The company only routes the event; clients never see it
+        assert await receive(subscriber) == event()
+    assert globex.queue.empty()
+
+    print("2. A slow consumer is dropped instead of buffered...")
+    for i in range(4):
+        broker.publish(event(i), "Acme")
+        await receive(acme_too)
+    assert await receive(acme) is None and acme.dropped
+    assert acme not in broker._subscribers and acme_too in broker._subscribers
+    broker.close_subscribers()
+    assert len(broker) == 0
+
+
+async def verify_stream():
+    print("3. The SSE stream delivers the company's changes and cleans up...")
+    async with db_module.engine.begin() as conn:
+        await conn.run_sync(db_module.Base.metadata.drop_all)
+        await conn.run_sync(db_module.Base.metadata.create_all)
+    async with db_module.AsyncSessionLocal() as db:
+        for i, company in enumerate(COMPANIES):
+            db.add(User(email=f"admin@{i}", name="Admin", role=UserRole.ADMIN,
+                        hashed_password=get_password_hash("pw"), company_id=company))
+            db.add(Equipment(name=f"Pump {i}", serial_number=f"SN-E{i}", company_name=company))
+        await db.commit()
+
+    async with AsyncClient(transport=ASGITransport(app=app), base_url="http://test") as ac:
+        tokens = [
+            (await ac.post("/auth/login", json={"email": f"admin@{i}", "password": "pw"})).json()["access_token"]
+            for i in range(len(COMPANIES))
+        ]
+        streams = [Stream(token) for token in tokens]
+        for stream in streams:
+            await stream.open()
+            assert stream.status == 200
+        assert len(request_events) == 2
+
+        body = {"subject": "Leak", "equipment_id": 1, "request_date": str(date.today())}
+        created = (await ac.post("/requests/", json=body, headers={"Authorization": f"Bearer {tokens[0]}"})).json()
+        chunk = await streams[0].next_event()
+        assert chunk.startswith("event: created\n") and f'"id": {created["id"]}' in chunk, chunk
+        assert "Acme" not in chunk and "tenant" not in chunk, chunk
+        await asyncio.sleep(0.1)
+        assert streams[1].chunks.empty()
+
+        for stream in streams:
+            await stream.close()
+        assert request_events._subscribers == set()
+
+        print("4. Writes succeed while the broker cannot reach Postgres...")
+        await request_events.start("postgresql://nobody@127.0.0.1:1/none")
+        try:
+            resp = await ac.post("/requests/", json=body, headers={"Authorization": f"Bearer {tokens[0]}"})
+            assert resp.status_code == 200, resp.text
+        finally:
+            await request_events.stop(timeout=0.1)
+
+
+async def verify_notify():
+    print("5. NOTIFY carries events between workers and survives lost connections...")
+    dsn = asyncpg_dsn()
+    events_module.PING_INTERVAL = 0.1
+    brokers = [EventBroker(queue_size=10) for _ in range(2)]
+    for name, broker in zip("ab", brokers):
+        await broker.start(dsn, server_settings={"application_name": f"broker-{name}"}, **db_module.connect_args)
+    publisher, listener = brokers
+
+    async def listening():
+        # A probe event comes back once the LISTEN is up
+        probe = listener.subscribe()
+        while True:
+            publisher.publish(event(-1))
+            try:
+                await receive(probe, 0.2)
+                break
+            except asyncio.TimeoutError:
+                continue
+        listener.unsubscribe(probe)
+
+    async def kill(name):
+        async with db_module.engine.connect() as conn:
+            await conn.exec_driver_sql(
+                f"SELECT pg_terminate_backend(pid) FROM pg_stat_activity WHERE application_name = 'broker-{name}'"
+            )
+
+    try:
+        await listening()
+        board = listener.subscribe("Acme")
+        publisher.publish(event(1), "Acme")
+        assert (await receive(board))["id"] == 1
+
+        # The listener reconnects and ends its streams: they may have missed events
+        await kill("b")
+        assert await receive(board) is None
+        await listening()
+        board = listener.subscribe("Acme")
+
+        # The publisher reconnects and sends what was queued meanwhile
+        await kill("a")
+        publisher.publish(event(2), "Acme")
+        publisher.publish(event(3), "Acme")
+        assert [(await receive(board))["id"] for _ in range(2)] == [2, 3]
+    finally:
+        for broker in brokers:
+            await broker.stop()
+
+
+async def verify_index_sync():
+    print("6. Typeahead index changes reach every worker...")
+    workers = [TenantEquipmentIndex() for _ in range(2)]
+    for index in workers:
+        await index.start(asyncpg_dsn(), **db_module.connect_args)
+    try:
+        async def seen(index, q, expected):
+            for _ in range(50):
+                if [s["name"] for s in index.suggest(q, tenant="Acme")] == expected:
+                    return
+                await asyncio.sleep(0.1)
+            raise AssertionError((q, expected))
+
+        # Until the LISTEN is up, publish again
+        for _ in range(50):
+            workers[0].upsert(1, "Drill press", "SN-D1", "Acme")
+            await asyncio.sleep(0.1)
+            if workers[1].suggest("drill", tenant="Acme"):
+                break
+        await seen(workers[1], "drill", ["Drill press"])
+        workers[0].upsert(1, "Band saw", "SN-D1", "Acme")
+        await seen(workers[1], "band", ["Band saw"])
+        await seen(workers[1], "drill", [])
+        workers[0].remove(1)
+        await seen(workers[1], "band", [])
+    finally:
+        for index in workers:
+            await index.stop()
+
+
+async def verify():
+    # Reset engine to use NullPool to avoid asyncpg cache issues during test
+    await db_module.engine.dispose()
+    db_module.engine = create_async_engine(db_module.url, connect_args=db_module.connect_args, poolclass=NullPool)
+    db_module.AsyncSessionLocal = async_sessionmaker(bind=db_module.engine, class_=db_module.AsyncSession, expire_on_commit=False, autoflush=False)
+    # Company-scoped data (scoping is off by default)
+    tenancy.TENANCY_ENABLED = True
+
+    await verify_fan_out()
+    await verify_stream()
+    await verify_notify()
+    await verify_index_sync()
+
+    print("\nREQUEST EVENTS VERIFIED!")
+
+if __name__ == "__main__":
+    asyncio.run(verify())
@@ -0,0 +1,105 @@
+import asyncio
+from datetime import date, datetime, timezone
+
+from httpx import AsyncClient, ASGITransport
+from sqlalchemy import func, select
+from sqlalchemy.pool import NullPool
+from sqlalchemy.ext.asyncio import create_async_engine, async_sessionmaker
+
+from app.app import app
+from app.auth_utils import get_password_hash
+from app.history import HistoryWriter, history_writer
+from app.models import Equipment, RequestEvent, User, UserRole
+import app.database as db_module
+import app.tenancy as tenancy
+from query_budget import count_queries
+
+# Stage / technician / priority changes land in request_events via the batched writer.
+# Run with: PYTHONPATH=.:test python test/verify_history.py
+
+COMPANIES = ["Acme", "Globex"]
+
+
+async def count_events():
+    async with db_module.AsyncSessionLocal() as db:
+        return (await db.execute(select(func.count(RequestEvent.id)))).scalar()
+
+
+async def verify():
+    # Reset engine to use NullPool to avoid asyncpg cache issues during test
+    await db_module.engine.dispose()
+    db_module.engine = create_async_engine(db_module.url, connect_args=db_module.connect_args, poolclass=NullPool)
+    db_module.AsyncSessionLocal = async_sessionmaker(bind=db_module.engine, class_=db_module.AsyncSession, expire_on_commit=False, autoflush=False)
+    # Company-scoped data (scoping is off by default)
+    tenancy.TENANCY_ENABLED = True
+
+    async with db_module.engine.begin() as conn:
+        await conn.run_sync(db_module.Base.metadata.drop_all)
+        await conn.run_sync(db_module.Base.metadata.create_all)
+    async with db_module.AsyncSessionLocal() as db:
+        for i, company in enumerate(COMPANIES):
+            db.add(User(email=f"admin@{i}", name="Admin", role=UserRole.ADMIN,
+                        hashed_password=get_password_hash("pw"), company_id=company))
+            db.add(Equipment(name=f"Pump {i}", serial_number=f"SN-H{i}", company_name=company))
+        await db.commit()
+
+    print("1. Concurrent changes are written as one multi-row INSERT...")
+    writer = HistoryWriter(flush_interval=0.2)
+    await writer.start()
+    now = datetime.now(timezone.utc)
+    rows = [
+        {"request_id": 1000 + n, "ts": now, "field": "stage", "old_value": "New Request",
+         "new_value": "In Progress", "actor_id": None, "company_id": "Acme"}
+        for n in range(50)
+    ]
+    with count_queries(db_module.engine) as counter:
+        await asyncio.gather(*(writer.record([row]) for row in rows))
+        await writer.flush()
+    inserts = [s for s in counter.statements if s.startswith("INSERT INTO request_events")]
+    assert len(inserts) == 1, counter.report()
+    assert await count_events() == 50
+    await writer.stop()
+
+    await history_writer.start()
+    async with AsyncClient(transport=ASGITransport(app=app), base_url="http://test") as ac:
+        headers = []
+        for i in range(len(COMPANIES)):
+            token = (await ac.post("/auth/login", json={"email": f"admin@{i}", "password": "pw"})).json()["access_token"]
+            headers.append({"Authorization": f"Bearer {token}"})
+
+        print("2. Creating and moving a request records each change with its actor...")
+        body = {"subject": "Leak", "equipment_id": 1, "request_date": str(date.today())}
+        request = (await ac.post("/requests/", json=body, headers=headers[0])).json()
+        url = f"/requests/{request['id']}"
+        await ac.put(url, json={"stage": "In Progress", "priority": "High"}, headers=headers[0])
+        await ac.put(url, json={"subject": "Leak (valve)"}, headers=headers[0])
+        assert (await ac.put(url, json={"stage": "Repaired"})).status_code == 404
+        await ac.put(url, json={"stage": "Repaired"}, headers=headers[0])
+        await history_writer.flush()
+
+        history = (await ac.get(f"{url}/history", headers=headers[0])).json()
+        stages = [(e["old_value"], e["new_value"]) for e in history if e["field"] == "stage"]
+        assert stages == [(None, "New Request"), ("New Request", "In Progress"), ("In Progress", "Repaired")], stages
+        assert [e["new_value"] for e in history if e["field"] == "priority"] == ["Low", "High"]
+        assert all(e["actor_id"] is not None for e in history)
+
+        print("3. Repair time follows from the stage timeline...")
+        entered = {e["new_value"]: datetime.fromisoformat(e["ts"].replace("Z", "+00:00")) for e in history if e["field"] == "stage"}
+        assert entered["Repaired"] >= entered["In Progress"]
+
+        print("4. Other companies see no history...")
+        assert (await ac.get(f"{url}/history", headers=headers[1])).status_code == 404
+        assert (await ac.get("/requests/999999/history", headers=headers[0])).status_code == 404
+    await history_writer.stop()
+
+    print("5. Timelines are served from the (request_id, ts) index...")
+    async with db_module.engine.connect() as conn:
+        indexes = (await conn.exec_driver_sql(
+            "SELECT indexdef FROM pg_indexes WHERE tablename = 'request_events'"
+        )).scalars().all()
+    assert any("(request_id, ts)" in index for index in indexes), indexes
+
+    print("\nREQUEST HISTORY VERIFIED!")
+
+if __name__ == "__main__":
+    asyncio.run(verify())
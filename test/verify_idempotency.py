@@ -0,0 +1,117 @@
+import asyncio
+from datetime import date
+
+from httpx import AsyncClient, ASGITransport
+from sqlalchemy import func
+from sqlalchemy.future import select
+from sqlalchemy.pool import NullPool
+from sqlalchemy.ext.asyncio import create_async_engine, async_sessionmaker
+
+from app.app import app
+from app.auth_utils import get_password_hash
+from app.models import Equipment, MaintenanceRequest, User, UserRole
+import app.database as db_module
+import app.idempotency as idempotency
+import app.tenancy as tenancy
+
+# Retried writes with an Idempotency-Key run once and replay the first response.
+# Run with: PYTHONPATH=. python test/verify_idempotency.py
+
+
+async def count(model):
+    async with db_module.AsyncSessionLocal() as db:
+        return (await db.execute(select(func.count()).select_from(model))).scalar()
+
+
+async def verify():
+    # Reset engine to use NullPool to avoid asyncpg cache issues during test
+    await db_module.engine.dispose()
+    db_module.engine = create_async_engine(db_module.url, connect_args=db_module.connect_args, poolclass=NullPool)
+    db_module.AsyncSessionLocal = async_sessionmaker(bind=db_module.engine, class_=db_module.AsyncSession, expire_on_commit=False, autoflush=False)
+    # Company-scoped data (scoping is off by default)
+    tenancy.TENANCY_ENABLED = True
+
+    async with db_module.engine.begin() as conn:
+        await conn.run_sync(db_module.Base.metadata.drop_all)
+        await conn.run_sync(db_module.Base.metadata.create_all)
+    async with db_module.AsyncSessionLocal() as db:
+        db.add(User(email="admin@acme", name="Admin", role=UserRole.ADMIN,
+                    hashed_password=get_password_hash("pw"), company_id="Acme"))
+        await db.commit()
+
+    async with AsyncClient(transport=ASGITransport(app=app), base_url="http://test") as ac:
+        token = (await ac.post("/auth/login", json={"email": "admin@acme", "password": "pw"})).json()["access_token"]
+        auth = {"Authorization": f"Bearer {token}"}
+
+        print("1. Concurrent duplicates create one equipment...")
+        payload = {"name": "Press", "serial_number": "SN-I1"}
+        headers = {**auth, "Idempotency-Key": "eq-1"}
+        responses = await asyncio.gather(*(ac.post("/equipments/", json=payload, headers=headers) for _ in range(5)))
+        assert all(r.status_code == 200 for r in responses), [r.text for r in responses]
+        assert len({r.json()["id"] for r in responses}) == 1
+        assert sum(r.headers.get("idempotent-replayed") == "true" for r in responses) == 4
+        assert await count(Equipment) == 1
+        equipment_id = responses[0].json()["id"]
+
+        print("2. A later retry replays the stored response...")
+        retry = await ac.post("/equipments/", json=payload, headers=headers)
+        assert retry.json() == responses[0].json()
+        assert retry.headers["idempotent-replayed"] == "true"
+
+        print("3. Reusing a key for a different body is rejected...")
+        other = await ac.post("/equipments/", json={**payload, "name": "Lathe"}, headers=headers)
+        assert other.status_code == 422
+
+        print("4. Request creation and stage transitions...")
+        body = {"subject": "Leak", "equipment_id": equipment_id, "request_date": str(date.today())}
+        created = [await ac.post("/requests/", json=body, headers={**auth, "Idempotency-Key": "req-1"}) for _ in range(2)]
+        assert created[0].json() == created[1].json()
+        assert await count(MaintenanceRequest) == 1
+        request_id = created[0].json()["id"]
+        moves = await asyncio.gather(*(
+            ac.put(f"/requests/{request_id}", json={"stage": "In Progress"}, headers={**auth, "Idempotency-Key": "move-1"})
+            for _ in range(3)
+        ))
+        assert all(r.json() == moves[0].json() for r in moves)
+        assert sum("idempotent-replayed" in r.headers for r in moves) == 2
+
+        print("5. Keys are per caller...")
+        anonymous = [
+            await ac.post("/equipments/", json={**payload, "serial_number": f"SN-I{i}"}, headers={"Idempotency-Key": "eq-1"})
+            for i in (2, 3)
+        ]
+        assert all(r.status_code == 200 and "idempotent-replayed" not in r.headers for r in anonymous)
+        assert anonymous[0].json()["id"] != anonymous[1].json()["id"]
+        assert await count(Equipment) == 3
+
+        print("6. Client errors are replayed too...")
+        missing = [await ac.put("/requests/999999", json={"stage": "Scrap"}, headers={**auth, "Idempotency-Key": "move-2"}) for _ in range(2)]
+        assert [r.status_code for r in missing] == [404, 404]
+        assert missing[1].headers["idempotent-replayed"] == "true"
+
+        print("7. Replays keep headers such as X-Schedule-Conflicts...")
+        booking = {**body, "subject": "Service", "scheduled_date": str(date.today()), "duration": 2}
+        await ac.post("/requests/", json=booking, headers=auth)
+        booked = [await ac.post("/requests/", json=booking, headers={**auth, "Idempotency-Key": "req-2"}) for _ in range(2)]
+        assert booked[1].headers["idempotent-replayed"] == "true"
+        assert booked[0].headers["x-schedule-conflicts"] == booked[1].headers["x-schedule-conflicts"]
+        assert booked[1].headers["content-type"] == "application/json"
+
+        print("8. Responses too large to keep still never run twice...")
+        requests_before = await count(MaintenanceRequest)
+        idempotency.IDEMPOTENCY_MAX_BODY = 10
+        try:
+            large = [await ac.post("/requests/", json=body, headers={**auth, "Idempotency-Key": "req-3"}) for _ in range(2)]
+        finally:
+            idempotency.IDEMPOTENCY_MAX_BODY = 262144
+        assert [r.status_code for r in large] == [200, 409], [r.text for r in large]
+        assert await count(MaintenanceRequest) == requests_before + 1
+
+        print("9. Deletes replay their 204...")
+        deletes = [await ac.delete(f"/equipments/{equipment_id}", headers={**auth, "Idempotency-Key": "del-1"}) for _ in range(2)]
+        assert [r.status_code for r in deletes] == [204, 204]
+
+    print("\nIDEMPOTENT WRITES VERIFIED!")
+
+if __name__ == "__main__":
+    asyncio.run(verify())
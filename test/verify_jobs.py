@@ -0,0 +1,146 @@
+import asyncio
+import os
+from datetime import date
+
+os.environ.setdefault("JOB_RETRY_BASE_SECONDS", "0.05")
+
+from httpx import AsyncClient, ASGITransport
+from sqlalchemy.pool import NullPool
+from sqlalchemy.ext.asyncio import create_async_engine, async_sessionmaker
+
+from app.app import app
+from app.auth_utils import get_password_hash
+from app.jobs import JobWorker, enqueue, job_handler
+from app.models import User, UserRole
+from app.tenancy import current_tenant
+import app.database as db_module
+import app.tenancy as tenancy
+
+# Background jobs: worksheet rendering, retries, lanes and per-type limits.
+# Run with: PYTHONPATH=. python test/verify_jobs.py
+
+calls = {"flaky": 0}
+order = []
+running = {"now": 0, "max": 0}
+
+
+@job_handler("flaky", max_attempts=3)
+async def flaky(payload):
+    calls["flaky"] += 1
+    if calls["flaky"] < 3:
+        raise RuntimeError("temporary outage")
+    return {"ok": True}
+
+
+@job_handler("ordered", lane="low")
+async def ordered(payload):
+    order.append(payload["name"])
+
+
+@job_handler("limited", concurrency=2)
+async def limited(payload):
+    running["now"] += 1
+    running["max"] = max(running["max"], running["now"])
+    await asyncio.sleep(0.1)
+    running["now"] -= 1
+
+
+async def wait_for_job(ac, job_id, headers):
+    for _ in range(200):
+        job = (await ac.get(f"/jobs/{job_id}", headers=headers)).json()
+        if job["status"] in ("succeeded", "failed"):
+            return job
+        await asyncio.sleep(0.05)
+    raise AssertionError(f"job {job_id} did not finish: {job}")
+
+
+async def enqueue_all(*jobs):
+    # As Acme's, so Acme's admin can follow them
+    token = current_tenant.set("Acme")
+    try:
+        async with db_module.AsyncSessionLocal() as db:
+            created = [await enqueue(db, type, payload, lane=lane) for type, payload, lane in jobs]
+            await db.commit()
+    finally:
+        current_tenant.reset(token)
+    return [job.id for job in created]
+
+
+async def verify():
+    # Reset engine to use NullPool to avoid asyncpg cache issues during test
+    await db_module.engine.dispose()
+    db_module.engine = create_async_engine(db_module.url, connect_args=db_module.connect_args, poolclass=NullPool)
+    db_module.AsyncSessionLocal = async_sessionmaker(bind=db_module.engine, class_=db_module.AsyncSession, expire_on_commit=False, autoflush=False)
+    # Company-scoped data (scoping is off by default)
+    tenancy.TENANCY_ENABLED = True
+
+    async with db_module.engine.begin() as conn:
+        await conn.run_sync(db_module.Base.metadata.drop_all)
+        await conn.run_sync(db_module.Base.metadata.create_all)
+    async with db_module.AsyncSessionLocal() as db:
+        db.add_all([
+            User(email=f"admin@{company}", name="Admin", role=UserRole.ADMIN,
+                 hashed_password=get_password_hash("pw"), company_id=company)
+            for company in ("Acme", "Globex")
+        ])
+        await db.commit()
+
+    async with AsyncClient(transport=ASGITransport(app=app), base_url="http://test") as ac:
+        headers = []
+        for company in ("Acme", "Globex"):
+            token = (await ac.post("/auth/login", json={"email": f"admin@{company}", "password": "pw"})).json()["access_token"]
+            headers.append({"Authorization": f"Bearer {token}"})
+        auth = headers[0]
+
+        print("1. Priority lanes: high runs before low...")
+        worker = JobWorker(concurrency=1, poll_interval=0.05)
+        await enqueue_all(("ordered", {"name": "low"}, None), ("ordered", {"name": "high"}, "high"))
+        runner = asyncio.create_task(worker.run())
+        while len(order) < 2:
+            await asyncio.sleep(0.05)
+        assert order == ["high", "low"], order
+        await worker.stop()
+        await runner
+
+        worker = JobWorker(concurrency=4, poll_interval=0.05)
+        runner = asyncio.create_task(worker.run())
+
+        print("2. Worksheets render in the background...")
+        eq = (await ac.post("/equipments/", json={"name": "Press", "serial_number": "SN-J1"}, headers=auth)).json()
+        req = (await ac.post("/requests/", headers=auth, json={
+            "subject": "Leak", "equipment_id": eq["id"], "request_date": str(date.today()),
+        })).json()
+        queued = await ac.post(f"/requests/{req['id']}/worksheet", headers=auth)
+        assert queued.status_code == 202 and queued.json()["status"] == "queued"
+        job = await wait_for_job(ac, queued.json()["id"], auth)
+        assert job["status"] == "succeeded", job
+        output = await ac.get(f"/jobs/{job['id']}/output", headers=auth)
+        assert output.headers["content-type"] == "application/pdf"
+        assert output.content.startswith(b"%PDF")
+        assert (await ac.get(f"/jobs/{job['id']}", headers=headers[1])).status_code == 404
+
+        print("3. Failures retry with backoff, permanent errors do not...")
+        [flaky_id] = await enqueue_all(("flaky", {}, None))
+        job = await wait_for_job(ac, flaky_id, auth)
+        assert job["status"] == "succeeded" and job["attempts"] == 3, job
+        assert (await ac.post("/requests/999999/worksheet", headers=auth)).status_code == 404
+        [orphan_id] = await enqueue_all(("render_worksheet", {"request_id": 999999}, None))
+        job = await wait_for_job(ac, orphan_id, auth)
+        assert job["status"] == "failed" and job["attempts"] == 1, job
+
+        print("4. Per-type concurrency limits...")
+        ids = await enqueue_all(*[("limited", {}, None)] * 5)
+        for job_id in ids:
+            assert (await wait_for_job(ac, job_id, auth))["status"] == "succeeded"
+        assert running["max"] == 2, running
+
+        stats = (await ac.get("/admin/jobs", headers=auth)).json()
+        assert stats["render_worksheet"]["succeeded"] == 1, stats
+
+        await worker.stop()
+        await runner
+
+    print("\nBACKGROUND JOBS VERIFIED!")
+
+if __name__ == "__main__":
+    asyncio.run(verify())
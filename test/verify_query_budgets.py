@@ -0,0 +1,120 @@
+import asyncio
+from datetime import date, timedelta
+
+from httpx import AsyncClient, ASGITransport
+from sqlalchemy.pool import NullPool
+from sqlalchemy.ext.asyncio import create_async_engine, async_sessionmaker
+
+from app.app import app
+from app.auth_utils import get_password_hash
+from app.history import history_writer
+from app.models import Category, Team, User, UserRole, Equipment, MaintenanceRequest, RequestStage
+import app.database as db_module
+import app.tenancy as tenancy
+from query_budget import query_budget
+
+# SQL statement budgets for the key endpoints. Each call must stay within its
+# budget no matter how many rows the page holds, so every list is checked at
+# two page sizes. Run with: PYTHONPATH=. python test/verify_query_budgets.py
+BUDGETS = [
+    # (method, path, budget)
+    ("GET", "/requests/?limit={n}", 1),
+    ("GET", "/requests/?limit={n}&expand=category,team,equipment", 4),
+    ("GET", "/requests/?limit={n}&expand=category,team.users,equipment", 5),
+    ("GET", "/requests/1?expand=category,team.users,equipment", 5),
+    ("GET", "/equipments/?limit={n}", 1),
+    ("GET", "/equipments/?limit={n}&include=counts", 2),
+    ("GET", "/equipments/1/maintenance-count", 1),
+    ("GET", "/equipments/suggest?q=pump", 0),
+    ("GET", "/teams/?expand=users", 2),
+    ("GET", "/auth/members", 1),
+    ("GET", "/dashboard/stats", 3),
+    ("GET", "/dashboard/reports", 2),
+    ("GET", "/dashboard/recent_requests", 1),
+    ("GET", "/dashboard/summary", 6),
+    # The settled-transaction horizon, then one page per source
+    ("GET", "/sync/changes?limit={n}", 4),
+    # Writes include the get_current_user lookup where the route is authenticated
+    ("PUT", "/requests/1", 5),
+    ("POST", "/requests/", 4),
+]
+
+PAGE_SIZES = (10, 100)
+
+
+async def seed(session_factory, rows: int):
+    async with session_factory() as db:
+        category = Category(name="Pumps")
+        team = Team(name="Mechanics")
+        db.add_all([category, team])
+        await db.flush()
+        users = [
+            User(email=f"tech{i}@plant", name=f"Tech {i}", role=UserRole.TECHNICIAN,
+                 hashed_password=get_password_hash("pw"), team_id=team.id)
+            for i in range(5)
+        ]
+        db.add_all(users)
+        await db.flush()
+        equipments = [
+            Equipment(name=f"Pump {i}", serial_number=f"SN-{i:05d}", category_id=category.id, team_id=team.id,
+                      default_technician_id=users[i % 5].id)
+            for i in range(rows)
+        ]
+        db.add_all(equipments)
+        await db.flush()
+        db.add_all([
+            MaintenanceRequest(subject=f"Check pump {i}", request_date=date.today() - timedelta(days=i % 30),
+                               scheduled_date=date.today(), duration=1.0, technician_id=users[i % 5].id,
+                               stage=RequestStage.NEW_REQUEST, equipment_id=equipments[i].id,
+                               team_id=team.id, category_id=category.id, created_by_id=users[0].id)
+            for i in range(rows)
+        ])
+        await db.commit()
+
+
+async def verify():
+    # Reset engine to use NullPool to avoid asyncpg cache issues during test
+    await db_module.engine.dispose()
+    db_module.engine = create_async_engine(db_module.url, connect_args=db_module.connect_args, poolclass=NullPool)
+    db_module.AsyncSessionLocal = async_sessionmaker(bind=db_module.engine, class_=db_module.AsyncSession, expire_on_commit=False, autoflush=False)
+    # Single-company data, anonymous calls
+    tenancy.TENANCY_ENABLED = False
+    engine = db_module.engine
+
+    async with engine.begin() as conn:
+        await conn.run_sync(db_module.Base.metadata.drop_all)
+        await conn.run_sync(db_module.Base.metadata.create_all)
+    await seed(db_module.AsyncSessionLocal, max(PAGE_SIZES))
+    # As in the app lifespan, request history is written off the request path
+    await history_writer.start()
+
+    async with AsyncClient(transport=ASGITransport(app=app), base_url="http://test") as ac:
+        resp = await ac.post("/auth/login", json={"email": "tech0@plant", "password": "pw"})
+        assert resp.status_code == 200
+        ac.headers["Authorization"] = f"Bearer {resp.json()['access_token']}"
+
+        failures = []
+        for method, path, budget in BUDGETS:
+            for n in PAGE_SIZES if "{n}" in path else (None,):
+                url = path.format(n=n)
+                body = None
+                if method == "POST":
+                    body = {"subject": "Budget check", "equipment_id": 1, "request_date": str(date.today())}
+                elif method == "PUT":
+                    body = {"stage": "In Progress"}
+                try:
+                    with query_budget(engine, budget, f"{method} {url}") as counter:
+                        resp = await ac.request(method, url, json=body)
+                    await history_writer.flush()
+                    assert resp.status_code == 200, f"{method} {url} returned {resp.status_code}"
+                    print(f"   {method} {url}: {len(counter)}/{budget} queries")
+                except AssertionError as e:
+                    failures.append(str(e))
+                    print(f"   FAILED {e}")
+
+        await history_writer.stop()
+        assert not failures, "\n\n".join(failures)
+        print("\nALL QUERY BUDGETS MET!")
+
+if __name__ == "__main__":
+    asyncio.run(verify())
@@ -0,0 +1,88 @@
+import asyncio
+from datetime import date
+
+from httpx import AsyncClient, ASGITransport
+from sqlalchemy.ext.asyncio import create_async_engine, async_sessionmaker
+
+from app.app import app
+from app.auth_utils import get_password_hash
+from app.models import Category, Equipment, Team, User, UserRole
+import app.database as db_module
+import app.tenancy as tenancy
+import app.routers.equipment as equipment_router
+import app.routers.requests as requests_router
+
+# Read handlers hand their connection back before serializing the response.
+# Run with: PYTHONPATH=. python test/verify_release.py
+
+
+async def verify():
+    # A real pool this time: checked-out connections are what is being measured
+    await db_module.engine.dispose()
+    db_module.engine = create_async_engine(db_module.url, connect_args=db_module.connect_args, pool_size=2, max_overflow=0)
+    db_module.AsyncSessionLocal = async_sessionmaker(bind=db_module.engine, class_=db_module.AsyncSession, expire_on_commit=False, autoflush=False)
+    # Company-scoped data (scoping is off by default)
+    tenancy.TENANCY_ENABLED = True
+    pool = db_module.engine.sync_engine.pool
+
+    async with db_module.engine.begin() as conn:
+        await conn.run_sync(db_module.Base.metadata.drop_all)
+        await conn.run_sync(db_module.Base.metadata.create_all)
+    async with db_module.AsyncSessionLocal() as db:
+        team = Team(name="Mechanics", company_id="Acme")
+        category = Category(name="Pumps", company_name="Acme")
+        db.add_all([team, category])
+        await db.flush()
+        db.add(User(email="admin@0", name="Admin", role=UserRole.ADMIN, team_id=team.id,
+                    hashed_password=get_password_hash("pw"), company_id="Acme"))
+        for i in range(20):
+            db.add(Equipment(name=f"Pump {i}", serial_number=f"SN-R{i}", company_name="Acme",
+                             team_id=team.id, category_id=category.id))
+        await db.commit()
+
+    # Pool usage at the moment each handler starts serializing
+    checked_out = []
+
+    def watch(module):
+        serialize = module.json_response
+
+        def json_response(tp, data, status_code=200):
+            checked_out.append(pool.checkedout())
+            return serialize(tp, data, status_code)
+        module.json_response = json_response
+
+    watch(requests_router)
+    watch(equipment_router)
+
+    async with AsyncClient(transport=ASGITransport(app=app), base_url="http://test") as ac:
+        token = (await ac.post("/auth/login", json={"email": "admin@0", "password": "pw"})).json()["access_token"]
+        auth = {"Authorization": f"Bearer {token}"}
+        for i in range(20):
+            await ac.post("/requests/", json={"subject": f"Leak {i}", "equipment_id": i + 1, "request_date": str(date.today())}, headers=auth)
+
+        print("1. List reads serialize with no connection checked out...")
+        checked_out.clear()
+        requests = await ac.get("/requests/", params={"expand": "equipment,category,team.users"}, headers=auth)
+        equipments = await ac.get("/equipments/", params={"include": "counts"}, headers=auth)
+        assert requests.status_code == equipments.status_code == 200
+        assert checked_out == [0, 0], checked_out
+
+        print("2. Released objects still serialize everything that was loaded...")
+        first = requests.json()[0]
+        assert first["equipment"]["name"] == "Pump 0" and first["category"]["name"] == "Pumps"
+        assert [u["email"] for u in first["team"]["users"]] == ["admin@0"]
+        assert equipments.json()[0]["maintenance_count"]["total"] == 1
+        detail = await ac.get(f"/requests/{first['id']}", params={"expand": "equipment"}, headers=auth)
+        assert detail.json()["equipment"]["name"] == "Pump 0" and detail.json()["team"] is None
+
+        print("3. Concurrent reads get by on a pool smaller than the crowd...")
+        results = await asyncio.gather(*[
+            ac.get("/requests/", params={"expand": "equipment"}, headers=auth) for _ in range(12)
+        ])
+        assert all(r.status_code == 200 and len(r.json()) == 20 for r in results)
+        assert pool.checkedout() == 0
+
+    print("\nCONNECTION RELEASE VERIFIED!")
+
+if __name__ == "__main__":
+    asyncio.run(verify())
@@ -0,0 +1,187 @@
+import asyncio
+import random
+import time
+from collections import defaultdict
+from datetime import date, datetime, timedelta
+
+from httpx import AsyncClient, ASGITransport
+from sqlalchemy import insert
+from sqlalchemy.pool import NullPool
+from sqlalchemy.ext.asyncio import create_async_engine, async_sessionmaker
+
+from app.app import app
+from app.auth_utils import get_password_hash
+from app.models import Equipment, MaintenanceRequest, RequestStage, User, UserRole
+from app.tenancy import current_tenant
+import app.database as db_module
+import app.tenancy as tenancy
+import app.schedule as schedule
+
+# Double-booking warnings/rejections on write and the /schedule/conflicts sweep.
+# Run with: PYTHONPATH=. python test/verify_schedule.py
+
+COMPANIES = ["Acme", "Globex"]
+TECHNICIANS = 300
+BULK_REQUESTS = 30000
+DAYS = 90
+
+
+def brute_force(rows, start, end):
+    # Every overlapping pair per technician, the slow way
+    by_technician = defaultdict(list)
+    for row in rows:
+        by_technician[row["technician_id"]].append(row)
+    pairs = set()
+    for bookings in by_technician.values():
+        for i, a in enumerate(bookings):
+            for b in bookings[i + 1:]:
+                if max(a["start"], b["start"], start) < min(a["end"], b["end"], end):
+                    pairs.add(frozenset((a["id"], b["id"])))
+    return pairs
+
+
+async def verify():
+    # Reset engine to use NullPool to avoid asyncpg cache issues during test
+    await db_module.engine.dispose()
+    db_module.engine = create_async_engine(db_module.url, connect_args=db_module.connect_args, poolclass=NullPool)
+    db_module.AsyncSessionLocal = async_sessionmaker(bind=db_module.engine, class_=db_module.AsyncSession, expire_on_commit=False, autoflush=False)
+    # Company-scoped data (scoping is off by default)
+    tenancy.TENANCY_ENABLED = True
+
+    async with db_module.engine.begin() as conn:
+        await conn.run_sync(db_module.Base.metadata.drop_all)
+        await conn.run_sync(db_module.Base.metadata.create_all)
+    async with db_module.AsyncSessionLocal() as db:
+        for i, company in enumerate(COMPANIES):
+            db.add(User(email=f"admin@{i}", name="Admin", role=UserRole.ADMIN,
+                        hashed_password=get_password_hash("pw"), company_id=company))
+            db.add(Equipment(name=f"Pump {i}", serial_number=f"SN-S{i}", company_name=company))
+        db.add(Equipment(name="Press", serial_number="SN-S2", company_name="Acme"))
+        await db.commit()
+
+    day = date.today() + timedelta(days=7)
+    async with AsyncClient(transport=ASGITransport(app=app), base_url="http://test") as ac:
+        headers = []
+        for i in range(len(COMPANIES)):
+            token = (await ac.post("/auth/login", json={"email": f"admin@{i}", "password": "pw"})).json()["access_token"]
+            headers.append({"Authorization": f"Bearer {token}"})
+        auth = headers[0]
+
+        def booking(**fields):
+            return {"subject": "Overhaul", "request_date": str(date.today()), "scheduled_date": str(day),
+                    "duration": 4, "technician_id": 1, "equipment_id": 1, **fields}
+
+        print("1. Overlapping bookings of a technician are flagged...")
+        first = await ac.post("/requests/", json=booking(), headers=auth)
+        assert first.status_code == 200 and "x-schedule-conflicts" not in first.headers
+        first_id = first.json()["id"]
+        second = await ac.post("/requests/", json=booking(equipment_id=3), headers=auth)
+        assert second.status_code == 200, second.text
+        assert second.headers["x-schedule-conflicts"] == f"technician={first_id}"
+        second_id = second.json()["id"]
+
+        print("2. Other days, other resources, undated and closed requests are not...")
+        other_day = await ac.post("/requests/", json=booking(scheduled_date=str(day + timedelta(days=1))), headers=auth)
+        assert "x-schedule-conflicts" not in other_day.headers
+        unscheduled = await ac.post("/requests/", json=booking(duration=0, technician_id=None, equipment_id=3), headers=auth)
+        assert "x-schedule-conflicts" not in unscheduled.headers
+        undated = await ac.post("/requests/", json=booking(scheduled_date=None, equipment_id=3), headers=auth)
+        assert undated.status_code == 200 and "x-schedule-conflicts" not in undated.headers
+        later = await ac.post("/requests/", json=booking(scheduled_date=str(day + timedelta(days=2)), equipment_id=3), headers=auth)
+        assert later.status_code == 200 and "x-schedule-conflicts" not in later.headers, later.headers
+        edited = await ac.put(f"/requests/{undated.json()['id']}", json={"duration": 2}, headers=auth)
+        assert edited.status_code == 200 and "x-schedule-conflicts" not in edited.headers
+        await ac.put(f"/requests/{other_day.json()['id']}", json={"stage": RequestStage.REPAIRED.value}, headers=auth)
+        reused = await ac.post("/requests/", json=booking(scheduled_date=str(day + timedelta(days=1)), equipment_id=3), headers=auth)
+        assert "x-schedule-conflicts" not in reused.headers
+
+        print("3. Kanban moves do not re-check, reschedules do...")
+        moved = await ac.put(f"/requests/{second_id}", json={"stage": RequestStage.IN_PROGRESS.value}, headers=auth)
+        assert moved.status_code == 200 and "x-schedule-conflicts" not in moved.headers
+        rescheduled = await ac.put(f"/requests/{reused.json()['id']}", json={"scheduled_date": str(day)}, headers=auth)
+        assert rescheduled.headers["x-schedule-conflicts"].startswith("technician=")
+
+        print("4. Reject mode returns 409, also for concurrent bookings...")
+        schedule.SCHEDULE_CONFLICT_MODE = "reject"
+        try:
+            rejected = await ac.post("/requests/", json=booking(equipment_id=3), headers=auth)
+            assert rejected.status_code == 409, rejected.text
+            assert {c["conflicting_request_id"] for c in rejected.json()["detail"]["conflicts"]} >= {first_id, second_id}
+            free_day = str(day + timedelta(days=5))
+            assert (await ac.post("/requests/", json=booking(scheduled_date=free_day), headers=auth)).status_code == 200
+            race_day = str(day + timedelta(days=3))
+            results = await asyncio.gather(*[
+                ac.post("/requests/", json=booking(scheduled_date=race_day, technician_id=None, equipment_id=3), headers=auth)
+                for _ in range(5)
+            ])
+            assert sorted(r.status_code for r in results) == [200, 409, 409, 409, 409]
+        finally:
+            schedule.SCHEDULE_CONFLICT_MODE = "warn"
+
+        print("5. The sweep matches a brute-force check on 30k bookings...")
+        random.seed(48)
+        start = date.today()
+        async with db_module.engine.begin() as conn:
+            await conn.execute(insert(User), [
+                {"email": f"tech{i}@acme", "name": f"Tech {i}", "role": UserRole.TECHNICIAN, "company_id": "Acme"}
+                for i in range(TECHNICIANS)
+            ])
+        async with db_module.engine.begin() as conn:
+            technician_ids = [row.id for row in (await conn.exec_driver_sql(
+                "SELECT id FROM users WHERE email LIKE 'tech%@acme'"
+            ))]
+            await conn.execute(insert(MaintenanceRequest), [
+                {
+                    "subject": f"Check {i}", "request_date": start, "company_id": "Acme",
+                    "scheduled_date": start + timedelta(days=random.randrange(DAYS)),
+                    "duration": random.choice([1, 2, 4, 8, 30]),
+                    "technician_id": random.choice(technician_ids),
+                    "stage": random.choice([RequestStage.NEW_REQUEST, RequestStage.IN_PROGRESS, RequestStage.REPAIRED]),
+                }
+                for i in range(BULK_REQUESTS)
+            ])
+            rows = [dict(row._mapping) for row in await conn.exec_driver_sql(
+                "SELECT id, technician_id, lower(schedule_window) AS start, upper(schedule_window) AS end "
+                "FROM maintenance_requests WHERE stage IN ('NEW_REQUEST', 'IN_PROGRESS') AND technician_id IS NOT NULL "
+                "AND NOT isempty(schedule_window)"
+            )]
+
+        span_from, span_to = start + timedelta(days=10), start + timedelta(days=39)
+        expected = brute_force(
+            rows, datetime.combine(span_from, datetime.min.time()),
+            datetime.combine(span_to + timedelta(days=1), datetime.min.time()),
+        )
+        token = current_tenant.set("Acme")
+        try:
+            async with db_module.AsyncSessionLocal() as db:
+                conflicts, truncated = await schedule.sweep(db, span_from, span_to, "technician", limit=10 ** 6)
+        finally:
+            current_tenant.reset(token)
+        found = {frozenset((c.request_id, c.conflicting_request_id)) for c in conflicts}
+        assert not truncated and found == expected and len(conflicts) == len(found), (len(found), len(expected))
+        print(f"   {len(found)} conflicting pairs")
+
+        print("6. /schedule/conflicts answers quickly and honours its filters...")
+        params = {"from": str(start), "to": str(start + timedelta(days=DAYS)), "resource": "technician", "limit": 10000}
+        began = time.perf_counter()
+        report = await ac.get("/schedule/conflicts", params=params, headers=auth)
+        elapsed = time.perf_counter() - began
+        assert report.status_code == 200, report.text
+        print(f"   {DAYS}-day sweep over {BULK_REQUESTS} requests: {elapsed * 1000:.0f} ms")
+        assert elapsed < 5, elapsed
+        limited = (await ac.get("/schedule/conflicts", params={**params, "limit": 10}, headers=auth)).json()
+        assert len(limited["conflicts"]) == 10 and limited["truncated"]
+        equipment_only = (await ac.get("/schedule/conflicts", params={**params, "resource": "equipment"}, headers=auth)).json()
+        assert {c["resource"] for c in equipment_only["conflicts"]} == {"equipment"}
+        assert (await ac.get("/schedule/conflicts", params={"from": str(day), "to": str(start)}, headers=auth)).status_code == 400
+
+        print("7. Other companies see none of it...")
+        other = (await ac.get("/schedule/conflicts", params=params, headers=headers[1])).json()
+        assert other == {"conflicts": [], "truncated": False}
+        clash = await ac.post("/requests/", json=booking(equipment_id=2, technician_id=None), headers=headers[1])
+        assert clash.status_code == 200 and "x-schedule-conflicts" not in clash.headers
+
+    print("\nSCHEDULE VERIFIED!")
+
+if __name__ == "__main__":
+    asyncio.run(verify())
@@ -0,0 +1,97 @@
+import asyncio
+from datetime import date
+
+from httpx import AsyncClient, ASGITransport
+from sqlalchemy import update
+from sqlalchemy.pool import NullPool
+from sqlalchemy.ext.asyncio import create_async_engine, async_sessionmaker
+
+from app.app import app
+from app.auth_utils import get_password_hash
+from app.models import Equipment, User, UserRole
+import app.database as db_module
+import app.tenancy as tenancy
+
+# Delta sync: pages, tombstones, and writers committing out of order.
+# Run with: PYTHONPATH=. python test/verify_sync.py
+
+
+async def sync_all(ac, auth, token=None, limit=500):
+    # Follow has_more to the end; (equipment names, request subjects, deleted, token)
+    equipments, requests, deleted = {}, {}, []
+    while True:
+        params = {"limit": limit, **({"since": token} if token else {})}
+        page = (await ac.get("/sync/changes", params=params, headers=auth)).json()
+        equipments.update({e["id"]: e["name"] for e in page["equipments"]})
+        requests.update({r["id"]: r["subject"] for r in page["requests"]})
+        deleted += page["deleted"]["equipments"]
+        token = page["token"]
+        if not page["has_more"]:
+            return equipments, requests, deleted, token
+
+
+async def verify():
+    # Reset engine to use NullPool to avoid asyncpg cache issues during test
+    await db_module.engine.dispose()
+    db_module.engine = create_async_engine(db_module.url, connect_args=db_module.connect_args, poolclass=NullPool)
+    db_module.AsyncSessionLocal = async_sessionmaker(bind=db_module.engine, class_=db_module.AsyncSession, expire_on_commit=False, autoflush=False)
+    # Company-scoped data (scoping is off by default)
+    tenancy.TENANCY_ENABLED = True
+
+    async with db_module.engine.begin() as conn:
+        await conn.run_sync(db_module.Base.metadata.drop_all)
+        await conn.run_sync(db_module.Base.metadata.create_all)
+    async with db_module.AsyncSessionLocal() as db:
+        db.add(User(email="admin@0", name="Admin", role=UserRole.ADMIN,
+                    hashed_password=get_password_hash("pw"), company_id="Acme"))
+        db.add_all([Equipment(name=f"Pump {i}", serial_number=f"SN-Y{i}", company_name="Acme") for i in range(12)])
+        await db.commit()
+
+    async with AsyncClient(transport=ASGITransport(app=app), base_url="http://test") as ac:
+        token = (await ac.post("/auth/login", json={"email": "admin@0", "password": "pw"})).json()["access_token"]
+        auth = {"Authorization": f"Bearer {token}"}
+        for i in range(5):
+            body = {"subject": f"Leak {i}", "equipment_id": i + 1, "request_date": str(date.today())}
+            assert (await ac.post("/requests/", json=body, headers=auth)).status_code == 200
+
+        print("1. Small pages add up to a full sync...")
+        equipments, requests, _, token = await sync_all(ac, auth, limit=4)
+        assert len(equipments) == 12 and len(requests) == 5
+        again = (await ac.get("/sync/changes", params={"since": token}, headers=auth)).json()
+        assert again["equipments"] == again["requests"] == [] and again["token"] == token
+
+        print("2. Edits and deletions come through as deltas...")
+        assert (await ac.put("/equipments/3", json={"name": "Pump 2 (rebuilt)", "serial_number": "SN-Y2"}, headers=auth)).status_code == 200
+        assert (await ac.delete("/equipments/12", headers=auth)).status_code in (200, 204)
+        equipments, requests, deleted, token = await sync_all(ac, auth, token)
+        assert equipments == {3: "Pump 2 (rebuilt)"} and requests == {} and deleted == [12], (equipments, deleted)
+
+        print("3. A slow writer's change is not skipped by a later, faster one...")
+        slow = db_module.AsyncSessionLocal()
+        fast = db_module.AsyncSessionLocal()
+        try:
+            # The slow transaction draws its version first...
+            await slow.execute(update(Equipment).where(Equipment.id == 1).values(name="Pump 0 (slow)"))
+            await fast.execute(update(Equipment).where(Equipment.id == 2).values(name="Pump 1 (fast)"))
+            await fast.commit()
+            early, _, _, token = await sync_all(ac, auth, token)
+            assert 1 not in early, early
+            # ...and commits after a token covering the faster one was handed out
+            await slow.commit()
+        finally:
+            await slow.close()
+            await fast.close()
+        late, _, _, token = await sync_all(ac, auth, token)
+        assert {**early, **late} == {1: "Pump 0 (slow)", 2: "Pump 1 (fast)"}, (early, late)
+        assert 1 in late
+
+        print("4. Bad tokens are refused, old-style ones start over...")
+        for bad in ("x", "1.2.3", "-1.5", "5."):
+            assert (await ac.get("/sync/changes", params={"since": bad}, headers=auth)).status_code == 400, bad
+        legacy = (await ac.get("/sync/changes", params={"since": "40"}, headers=auth)).json()
+        assert len(legacy["equipments"]) == 11
+
+    print("\nDELTA SYNC VERIFIED!")
+
+if __name__ == "__main__":
+    asyncio.run(verify())
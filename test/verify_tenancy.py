@@ -0,0 +1,211 @@
+import asyncio
+from datetime import date
+
+from httpx import AsyncClient, ASGITransport
+from sqlalchemy import text, update
+from sqlalchemy.pool import NullPool
+from sqlalchemy.ext.asyncio import create_async_engine, async_sessionmaker
+
+from app.app import app
+from app.auth_utils import get_password_hash
+from app.companies import bootstrap_company, upgrade_schema
+from app.equipment_index import equipment_index
+from app.models import Equipment, MaintenanceRequest, User, UserRole
+import app.database as db_module
+import app.tenancy as tenancy
+
+# Two companies share one database; each must only see its own rows.
+# Run with: PYTHONPATH=. python test/verify_tenancy.py
+
+COMPANIES = ["Acme Plant", "Globex Works"]
+
+
+async def login(ac, email):
+    resp = await ac.post("/auth/login", json={"email": email, "password": "pw"})
+    assert resp.status_code == 200
+    return {"Authorization": f"Bearer {resp.json()['access_token']}"}
+
+
+async def verify():
+    # Reset engine to use NullPool to avoid asyncpg cache issues during test
+    await db_module.engine.dispose()
+    db_module.engine = create_async_engine(db_module.url, connect_args=db_module.connect_args, poolclass=NullPool)
+    db_module.AsyncSessionLocal = async_sessionmaker(bind=db_module.engine, class_=db_module.AsyncSession, expire_on_commit=False, autoflush=False)
+    # Company-scoped data (scoping is off by default)
+    tenancy.TENANCY_ENABLED = True
+
+    async with db_module.engine.begin() as conn:
+        await conn.run_sync(db_module.Base.metadata.drop_all)
+        await conn.run_sync(db_module.Base.metadata.create_all)
+    async with db_module.AsyncSessionLocal() as db:
+        db.add_all([
+            User(email=f"admin@{i}", name=f"Admin {company}", role=UserRole.ADMIN,
+                 hashed_password=get_password_hash("pw"), company_id=company)
+            for i, company in enumerate(COMPANIES)
+        ])
+        await db.commit()
+    equipment_index.rebuild([])
+
+    async with AsyncClient(transport=ASGITransport(app=app), base_url="http://test") as ac:
+        headers = [await login(ac, f"admin@{i}") for i in range(len(COMPANIES))]
+
+        print("1. Each company creates its own data...")
+        ids = []
+        for i, h in enumerate(headers):
+            cat = (await ac.post("/categories/", json={"name": f"Pumps {i}"}, headers=h)).json()
+            team = (await ac.post("/teams/", json={"name": f"Crew {i}"}, headers=h)).json()
+            eq = await ac.post("/equipments/", headers=h, json={
+                "name": f"Pump {i}", "serial_number": f"SN-T{i}", "category_id": cat["id"], "team_id": team["id"],
+                # Clients cannot write into another company
+                "company_name": COMPANIES[1 - i],
+            })
+            assert eq.status_code == 200
+            assert eq.json()["company_name"] == COMPANIES[i]
+            req = await ac.post("/requests/", headers=h, json={
+                "subject": f"Leak {i}", "equipment_id": eq.json()["id"], "request_date": str(date.today()),
+            })
+            assert req.status_code == 200
+            assert req.json()["company_id"] == COMPANIES[i]
+            ids.append((eq.json()["id"], req.json()["id"]))
+
+        print("2. Lists, lookups and aggregates are scoped...")
+        for i, h in enumerate(headers):
+            other_eq, other_req = ids[1 - i]
+            requests = (await ac.get("/requests/", headers=h)).json()
+            assert [r["subject"] for r in requests] == [f"Leak {i}"]
+            assert [e["name"] for e in (await ac.get("/equipments/", headers=h)).json()] == [f"Pump {i}"]
+            assert [t["name"] for t in (await ac.get("/teams/?expand=users", headers=h)).json()] == [f"Crew {i}"]
+            assert [m["email"] for m in (await ac.get("/auth/members", headers=h)).json()] == [f"admin@{i}"]
+            assert (await ac.get(f"/requests/{other_req}", headers=h)).status_code == 404
+            assert (await ac.get(f"/equipments/{other_eq}", headers=h)).status_code == 404
+            put = await ac.put(f"/requests/{other_req}", json={"stage": "Scrap"}, headers=h)
+            assert put.status_code == 404
+
+            stats = (await ac.get("/dashboard/stats", headers=h)).json()
+            assert stats["open_requests_count"] == 1, stats
+            summary = (await ac.get("/dashboard/summary", headers=h)).json()
+            assert [r["subject"] for r in summary["recent_requests"]] == [f"Leak {i}"]
+            assert summary["reports"]["requests_per_team"] == [{"name": f"Crew {i}", "count": 1}]
+
+            changes = (await ac.get("/sync/changes", headers=h)).json()
+            assert [e["name"] for e in changes["equipments"]] == [f"Pump {i}"]
+            assert [r["subject"] for r in changes["requests"]] == [f"Leak {i}"]
+
+        print("3. Expanded relations stay within the company...")
+        # Cross-company links that only direct database writes can make
+        acme_req, globex_eq = ids[0][1], ids[1][0]
+        acme_team = (await ac.get("/teams/", headers=headers[0])).json()[0]["id"]
+        async with db_module.AsyncSessionLocal() as db:
+            await db.execute(update(User).where(User.email.in_(["admin@0", "admin@1"])).values(team_id=acme_team))
+            await db.execute(update(MaintenanceRequest).where(MaintenanceRequest.id == acme_req).values(equipment_id=globex_eq))
+            await db.commit()
+        for url in (f"/requests/{acme_req}", "/requests/"):
+            body = (await ac.get(url, params={"expand": "team.users,equipment"}, headers=headers[0])).json()
+            request = body if isinstance(body, dict) else body[0]
+            assert [u["email"] for u in request["team"]["users"]] == ["admin@0"], (url, request["team"])
+            assert request["equipment"] is None, url
+
+        print("4. Per-company typeahead namespaces...")
+        for i, h in enumerate(headers):
+            names = [s["name"] for s in (await ac.get("/equipments/suggest?q=pump", headers=h)).json()]
+            assert names == [f"Pump {i}"], names
+
+        print("5. Login still finds users of every company...")
+        other = await ac.post("/auth/login", json={"email": "admin@1", "password": "pw"}, headers=headers[0])
+        assert other.status_code == 200
+
+        print("6. Calls without a company see nothing...")
+        for path in ("/requests/", "/equipments/", "/equipments/suggest?q=pu", "/teams/", "/auth/members"):
+            resp = await ac.get(path)
+            assert resp.status_code == 200 and resp.json() == [], (path, resp.text)
+        assert (await ac.get(f"/requests/{ids[0][1]}")).status_code == 404
+        assert (await ac.get("/dashboard/stats")).json()["open_requests_count"] == 0
+        assert (await ac.get("/sync/changes")).json()["requests"] == []
+
+        print("7. Registering cannot pick a company or a role...")
+        resp = await ac.post("/auth/register", json={
+            "email": "mallory@x", "name": "Mallory", "password": "pw", "company_id": COMPANIES[0], "role": "Admin",
+        })
+        assert resp.status_code == 200
+        assert resp.json()["role"] == "User" and resp.json().get("company_id") is None, resp.json()
+        mallory = await login(ac, "mallory@x")
+        assert (await ac.get("/requests/", headers=mallory)).json() == []
+        assert (await ac.get("/equipments/suggest?q=pu", headers=mallory)).json() == []
+        resp = await ac.post("/auth/register", headers=headers[1], json={
+            "email": "tech@1", "name": "Tech", "password": "pw", "role": "Technician", "company_id": COMPANIES[0],
+        })
+        assert resp.json()["role"] == "Technician"
+        tech = await login(ac, "tech@1")
+        assert [r["subject"] for r in (await ac.get("/requests/", headers=tech)).json()] == ["Leak 1"]
+
+        print("8. Names, serials and codes only need to be unique within a company...")
+        for h in headers:
+            assert (await ac.post("/workcenters/", json={"name": "Line", "code": "WC-1"}, headers=h)).status_code == 200
+        # Company 1 reuses company 0's names and serial
+        assert (await ac.post("/categories/", json={"name": "Pumps 0"}, headers=headers[1])).status_code == 200
+        assert (await ac.post("/teams/", json={"name": "Crew 0"}, headers=headers[1])).status_code == 200
+        eq = await ac.post("/equipments/", headers=headers[1], json={"name": "Pump 0", "serial_number": "SN-T0"})
+        assert eq.status_code == 200 and eq.json()["company_name"] == COMPANIES[1], eq.text
+
+    print("\nTENANT ISOLATION VERIFIED!")
+
+
+async def verify_upgrade():
+    # An install from before companies: nobody has one, and scoping is off
+    tenancy.TENANCY_ENABLED = False
+    async with db_module.engine.begin() as conn:
+        await conn.run_sync(db_module.Base.metadata.drop_all)
+        await conn.run_sync(db_module.Base.metadata.create_all)
+        # Its tables have no company columns and globally unique names
+        for table in ("users", "teams", "workcenters"):
+            await conn.execute(text(f"ALTER TABLE {table} DROP COLUMN company_id"))
+        await conn.execute(text("DROP INDEX ix_teams_name"))
+        await conn.execute(text("CREATE UNIQUE INDEX ix_teams_name ON teams (name)"))
+    print("9. The schema upgrade adds the company columns and per-company uniques...")
+    for _ in range(2):
+        async with db_module.engine.begin() as conn:
+            await conn.run_sync(upgrade_schema)
+    async with db_module.engine.begin() as conn:
+        await conn.execute(text("INSERT INTO teams (name, company_id) VALUES ('Crew', 'A'), ('Crew', 'B')"))
+        await conn.execute(text("DELETE FROM teams"))
+    async with db_module.AsyncSessionLocal() as db:
+        db.add(User(email="admin@old", name="Admin", role=UserRole.ADMIN, hashed_password=get_password_hash("pw")))
+        db.add(Equipment(name="Lathe", serial_number="SN-U0", company_name="My Company (San Francisco)"))
+        await db.commit()
+    equipment_index.rebuild([])
+
+    async with AsyncClient(transport=ASGITransport(app=app), base_url="http://test") as ac:
+        print("10. A company-less install keeps working by default...")
+        admin = await login(ac, "admin@old")
+        req = await ac.post("/requests/", headers=admin, json={
+            "subject": "Squeal", "equipment_id": 1, "request_date": str(date.today()),
+        })
+        assert req.status_code == 200 and req.json()["company_id"] is None
+        assert [r["subject"] for r in (await ac.get("/requests/", headers=admin)).json()] == ["Squeal"]
+        assert [e["name"] for e in (await ac.get("/equipments/", headers=admin)).json()] == ["Lathe"]
+        assert (await ac.post("/auth/register", json={"email": "new@old", "name": "New", "password": "pw"})).status_code == 200
+        newcomer = await login(ac, "new@old")
+        assert [r["subject"] for r in (await ac.get("/requests/", headers=newcomer)).json()] == ["Squeal"]
+
+        print("11. Bootstrapping a company keeps its rows visible with scoping on...")
+        async with db_module.AsyncSessionLocal() as db:
+            moved = await bootstrap_company(db, "Old Plant", "admin@old")
+            await db.commit()
+        assert moved["maintenance_requests"] == 1 and moved["equipments"] == 1 and moved["users"] == 2, moved
+        tenancy.TENANCY_ENABLED = True
+        admin = await login(ac, "admin@old")
+        assert [r["subject"] for r in (await ac.get("/requests/", headers=admin)).json()] == ["Squeal"]
+        assert [e["name"] for e in (await ac.get("/equipments/", headers=admin)).json()] == ["Lathe"]
+        # Later sign-ups wait for an admin again
+        assert (await ac.post("/auth/register", json={"email": "late@old", "name": "Late", "password": "pw"})).status_code == 200
+        assert (await ac.get("/requests/", headers=await login(ac, "late@old"))).json() == []
+
+    print("\nCOMPANY-LESS UPGRADE VERIFIED!")
+
+
+async def main():
+    await verify()
+    await verify_upgrade()
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -36,14 +36,10 @@ export default function Dashboard() {
     const fetchData = async () => {
         setLoading(true);
         try {
-            const [statsRes, reqRes, repRes] = await Promise.all([
-                api.get('/dashboard/stats'),
-                api.get('/dashboard/recent_requests'),
-                api.get('/dashboard/reports')
-            ]);
-            setStats(statsRes.data);
-            setRecentRequests(reqRes.data);
-            setReports(repRes.data);
+            const res = await api.get('/dashboard/summary');
+            setStats(res.data.stats);
+            setRecentRequests(res.data.recent_requests);
+            setReports(res.data.reports);
         } catch (error) {
             console.error(error);
         } finally {
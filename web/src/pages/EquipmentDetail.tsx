@@ -111,7 +111,7 @@ export default function EquipmentDetailPage() {
         try {
             const [cats, tms, wcs, usrs] = await Promise.all([
                 api.get('/categories/'),
-                api.get('/teams/'), // Teams now include users
+                api.get('/teams/', { params: { expand: 'users' } }),
                 api.get('/workcenters/'),
                 api.get('/auth/members')
             ]);
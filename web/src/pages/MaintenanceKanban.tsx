@@ -37,11 +37,38 @@ export default function MaintenanceKanban() {
         fetchData();
     }, []);
 
+    // Live updates from other boards; EventSource reconnects on its own
+    // (e.g. after the server dropped us as a slow consumer) and we reload then.
+    useEffect(() => {
+        // EventSource can't set headers; the token scopes the stream to our company
+        const token = localStorage.getItem('token');
+        const query = token ? `?access_token=${encodeURIComponent(token)}` : '';
+        const source = new EventSource(`${api.defaults.baseURL}/requests/stream${query}`);
+        source.addEventListener('updated', (e) => {
+            const change = JSON.parse((e as MessageEvent).data);
+            setRequests(prev => prev.map(r => r.id === change.id
+                ? { ...r, stage: change.stage, technician_id: change.technician_id, priority: change.priority }
+                : r));
+        });
+        source.addEventListener('created', (e) => {
+            const change = JSON.parse((e as MessageEvent).data);
+            api.get(`/requests/${change.id}`, { params: { expand: 'equipment' } })
+                .then(res => setRequests(prev => prev.some(r => r.id === change.id) ? prev : [...prev, res.data]))
+                .catch(err => console.error(err));
+        });
+        let opened = false;
+        source.onopen = () => {
+            if (opened) fetchRequests();
+            opened = true;
+        };
+        return () => source.close();
+    }, []);
+
     const fetchData = async () => {
         setLoading(true);
         try {
             const [reqRes, userRes] = await Promise.all([
-                api.get('/requests/'),
+                api.get('/requests/', { params: { expand: 'equipment' } }),
                 api.get('/auth/members')
             ]);
             setRequests(reqRes.data);
@@ -54,8 +81,8 @@ export default function MaintenanceKanban() {
     };
 
     const fetchRequests = () => {
-        // Silent refresh after stage update
-        api.get('/requests/')
+        // Silent refresh after a stream reconnect
+        api.get('/requests/', { params: { expand: 'equipment' } })
             .then(res => setRequests(res.data))
             .catch(err => console.error(err));
     };
@@ -63,7 +90,8 @@ export default function MaintenanceKanban() {
     const handleStageChange = async (req: MaintenanceRequest, newStage: string) => {
         try {
             await api.put(`/requests/${req.id}`, { stage: newStage });
-            fetchRequests(); // Refresh
+            // Optimistic local update; the stream event confirms it
+            setRequests(prev => prev.map(r => r.id === req.id ? { ...r, stage: newStage } : r));
         } catch (err) {
             console.error("Failed to update stage", err);
         }
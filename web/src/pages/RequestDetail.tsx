@@ -121,7 +121,7 @@ export default function RequestDetailPage({ isNew }: { isNew?: boolean }) {
     const fetchDropdowns = async () => {
         try {
             const [tms, eqs, wcs, cats] = await Promise.all([
-                api.get('/teams/'),
+                api.get('/teams/', { params: { expand: 'users' } }),
                 api.get('/equipments/'),
                 api.get('/workcenters/'),
                 api.get('/categories/')
@@ -226,9 +226,19 @@ export default function RequestDetailPage({ isNew }: { isNew?: boolean }) {
                     <div className="flex gap-2">
                         {/* Placeholder Smart Button */}
                         <button
-                            onClick={() => {
-                                // Trigger download in new tab
-                                window.open(`http://127.0.0.1:8000/requests/${id}/worksheet`, '_blank');
+                            onClick={async () => {
+                                // Rendered by a background job; poll it, then download the PDF
+                                let { data: job } = await api.post(`/requests/${id}/worksheet`);
+                                while (job.status === 'queued' || job.status === 'running') {
+                                    await new Promise(resolve => setTimeout(resolve, 500));
+                                    ({ data: job } = await api.get(`/jobs/${job.id}`));
+                                }
+                                if (job.status !== 'succeeded') {
+                                    alert('Could not generate the worksheet');
+                                    return;
+                                }
+                                const { data: pdf } = await api.get(`/jobs/${job.id}/output`, { responseType: 'blob' });
+                                window.open(URL.createObjectURL(pdf), '_blank');
                             }}
                             className="flex flex-col items-center justify-center border border-gray-300 bg-white px-3 py-1 rounded hover:bg-gray-50"
                         >
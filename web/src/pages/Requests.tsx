@@ -38,7 +38,7 @@ export default function RequestsPage() {
 
     const fetchData = async () => {
         setLoading(true);
-        const params: any = {};
+        const params: any = { expand: 'category' };
         if (equipmentId) params.equipment_id = equipmentId;
 
         try {